@@ -1,15 +1,20 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
+import uuid
 from datetime import datetime
 import json
 import pandas as pd
 from typing import Dict
 from models.profile_manager import ExpertProfileManager
-from models.product_catalog import ProductCatalog
+from models.catalog_service import get_catalog_service
+from models.catalog_index import fold_accents
 from models.ai_assistant import AIAssistant
 from utils.pdf_processor import PDFProcessor
 from utils.measurement_tools import MeasurementTools
 from utils.project_manager import ProjectManager
+from utils.project_store import ProjectStore
+from utils.lazy_project import hydrate_all, measurement_count, unloaded_aggregates
 from components.simple_reactive_viewer import SimpleReactiveViewer
 from components.measurement_panel import MeasurementPanel
 from components.catalog_panel import CatalogPanel
@@ -105,17 +110,54 @@ def load_css():
 # Charger les styles
 load_css()
 
+# Cookie qui garde le jeton du client d'un onglet à l'autre (un an)
+CLIENT_COOKIE = "takeoff_client"
+CLIENT_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+def get_client_token() -> str:
+    """Identité du client (autosauvegardes, projets récents)
+
+    Compte connecté si l'authentification Streamlit est configurée, sinon
+    jeton anonyme pris dans l'URL ou dans un cookie du navigateur : il
+    survit au rafraîchissement, aux nouveaux onglets et aux favoris, mais
+    n'est pas partagé avec les autres utilisateurs du serveur.
+    """
+    try:
+        if st.user.is_logged_in and st.user.get('email'):
+            return f"user:{st.user.email}"
+    except Exception:
+        pass
+    cookie = st.context.cookies.get(CLIENT_COOKIE)
+    token = st.query_params.get('client') or cookie
+    if not token or not token.isalnum():
+        token = uuid.uuid4().hex
+    if st.query_params.get('client') != token:
+        st.query_params['client'] = token
+    if cookie != token:
+        # Streamlit ne pose pas de cookie : le composant HTML partage l'origine de l'application
+        components.html(
+            f"<script>document.cookie = '{CLIENT_COOKIE}={token}; path=/; "
+            f"max-age={CLIENT_COOKIE_MAX_AGE}; SameSite=Lax';</script>",
+            height=0
+        )
+    return token
+
 # Initialisation de l'état de session
 def init_session_state():
     """Initialise les variables de session Streamlit"""
     if 'initialized' not in st.session_state:
         st.session_state.initialized = True
         st.session_state.profile_manager = ExpertProfileManager()
-        st.session_state.product_catalog = ProductCatalog()
+        # Catalogue partagé par toutes les sessions (chargé une seule fois)
+        st.session_state.product_catalog = get_catalog_service()
+        st.session_state.catalog_version = st.session_state.product_catalog.version
         st.session_state.ai_assistant = None  # Initialisé avec la clé API
         st.session_state.pdf_processor = PDFProcessor()
         st.session_state.measurement_tools = MeasurementTools()
-        st.session_state.project_manager = ProjectManager()
+        client_token = get_client_token()
+        st.session_state.project_manager = ProjectManager(user=client_token)
+        st.session_state.project_store = ProjectStore(client_token)
+        st.session_state.project_manager.attach_store(st.session_state.project_store)
         
         # État du projet
         st.session_state.current_project = {
@@ -124,9 +166,17 @@ def init_session_state():
             'measurements': [],
             'calibration': {'value': 1.0, 'unit': 'cm'},
             'current_page': 0,
-            'total_pages': 0
+            'total_pages': 0,
+            'coordinate_space': 'pdf_points'
         }
         
+        # Autosauvegarde d'une session précédente de ce client (rafraîchissement,
+        # redémarrage) : proposée dans la barre latérale, pas appliquée d'office
+        recovery = st.session_state.project_store.find_recovery()
+        if recovery:
+            st.session_state.pending_recovery = recovery
+        st.session_state.project_store.start(st.session_state.current_project)
+        
         # État de l'interface
         st.session_state.selected_tool = 'distance'
         st.session_state.selected_product = None
@@ -140,14 +190,61 @@ def init_session_state():
         st.session_state.snap_threshold = 10
         st.session_state.show_grid = False
 
+def sync_catalog_version():
+    """Rafraîchit la sélection si le catalogue partagé a changé depuis le dernier rerun"""
+    catalog = st.session_state.product_catalog
+    if not catalog.changed_since(st.session_state.get('catalog_version')):
+        return
+    category = st.session_state.get('selected_category')
+    product = st.session_state.get('selected_product')
+    if category and category not in catalog.get_categories():
+        st.session_state.selected_category = None
+        st.session_state.selected_product = None
+    elif category and product and catalog.get_product(category, product) is None:
+        st.session_state.selected_product = None
+    st.session_state.catalog_version = catalog.version
+
+def restore_autosave(recovery):
+    """Restaure le projet d'une autosauvegarde acceptée par l'utilisateur"""
+    snapshot_path, recovered = recovery
+    recovered = st.session_state.project_manager.migrate_to_page_coordinates(recovered)
+    st.session_state.current_project.pop('lazy', None)
+    st.session_state.current_project.update(recovered)
+    st.session_state.project_manager.active_journal = None
+    pdf_path = st.session_state.current_project.get('pdf_path')
+    if pdf_path and os.path.exists(pdf_path):
+        st.session_state.pdf_processor.load_pdf(pdf_path)
+    else:
+        st.session_state.current_project['pdf_path'] = None
+    st.session_state.project_store.start(st.session_state.current_project)
+    st.session_state.project_store.discard(snapshot_path)
+
 def main():
     """Fonction principale de l'application"""
     init_session_state()
+    st.session_state.project_store.heartbeat()
+    sync_catalog_version()
     
     # Menu principal dans la barre latérale
     with st.sidebar:
         st.header("📁 Menu Fichier")
         
+        recovery = st.session_state.get('pending_recovery')
+        if recovery:
+            count = len(recovery[1].get('measurements', []))
+            st.info(f"♻️ Une sauvegarde automatique de votre session précédente ({count} mesures) est disponible")
+            col_restore, col_ignore = st.columns(2)
+            with col_restore:
+                if st.button("Restaurer", key="restore_autosave", use_container_width=True):
+                    restore_autosave(recovery)
+                    del st.session_state.pending_recovery
+                    st.rerun()
+            with col_ignore:
+                if st.button("Ignorer", key="ignore_autosave", use_container_width=True):
+                    st.session_state.project_store.discard(recovery[0])
+                    del st.session_state.pending_recovery
+                    st.rerun()
+        
         # Nouveau projet
         if st.button("🆕 Nouveau projet", use_container_width=True):
             st.session_state.current_project = {
@@ -156,15 +253,19 @@ def main():
                 'measurements': [],
                 'calibration': {'value': 1.0, 'unit': 'cm'},
                 'current_page': 0,
-                'total_pages': 0
+                'total_pages': 0,
+                'coordinate_space': 'pdf_points'
             }
+            # Le nouveau projet n'a pas encore de fichier : plus de journal actif
+            st.session_state.project_manager.active_journal = None
+            st.session_state.project_store.start(st.session_state.current_project)
             st.success("Nouveau projet créé")
             st.rerun()
         
         # Ouvrir projet
         uploaded_project = st.file_uploader(
-            "Ouvrir un projet (.tak)",
-            type=['tak'],
+            "Ouvrir un projet (.tak, .takdb)",
+            type=['tak', 'takdb'],
             key='project_upload'
         )
         
@@ -176,10 +277,15 @@ def main():
             with open(temp_path, "wb") as f:
                 f.write(uploaded_project.getbuffer())
             
+            # Le fichier téléversé remplace l'instantané : l'ancien journal est obsolète
+            st.session_state.project_manager.discard_journal(temp_path)
+            
             # Charger le projet
-            project_data = st.session_state.project_manager.load_project(temp_path)
+            project_data = st.session_state.project_manager.load_project(temp_path, lazy=True)
             if project_data:
+                st.session_state.current_project.pop('lazy', None)
                 st.session_state.current_project.update(project_data)
+                st.session_state.project_store.start(st.session_state.current_project)
                 st.success(f"Projet {uploaded_project.name} chargé")
                 st.rerun()
         
@@ -193,15 +299,15 @@ def main():
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = f"projet_{timestamp}.tak"
                 
-                # Convertir en JSON
-                json_str = json.dumps(save_data, indent=2, ensure_ascii=False)
+                # Encoder au format .tak (binaire compressé)
+                project_bytes = st.session_state.project_manager.encode_project(save_data)
                 
                 # Bouton de téléchargement
                 st.download_button(
                     label="📥 Télécharger le projet",
-                    data=json_str,
+                    data=project_bytes,
                     file_name=filename,
-                    mime="application/json"
+                    mime="application/octet-stream"
                 )
             else:
                 st.warning("Aucun projet actif à sauvegarder")
@@ -216,9 +322,11 @@ def main():
             for project_path in recent_projects[:5]:
                 project_name = os.path.basename(project_path)
                 if st.button(f"📄 {project_name}", key=f"recent_{project_path}"):
-                    project_data = st.session_state.project_manager.load_project(project_path)
+                    project_data = st.session_state.project_manager.load_project(project_path, lazy=True)
                     if project_data:
+                        st.session_state.current_project.pop('lazy', None)
                         st.session_state.current_project.update(project_data)
+                        st.session_state.project_store.start(st.session_state.current_project)
                         st.success(f"Projet {project_name} chargé")
                         st.rerun()
         else:
@@ -261,7 +369,11 @@ def main():
         )
         
         if api_key and not st.session_state.ai_assistant:
-            st.session_state.ai_assistant = AIAssistant(api_key)
+            st.session_state.ai_assistant = AIAssistant(
+                api_key,
+                context_builder=st.session_state.project_manager.context_builder,
+                catalog=st.session_state.product_catalog
+            )
             st.success("✅ Assistant IA connecté")
         
         st.divider()
@@ -269,22 +381,10 @@ def main():
         # Profil expert
         st.subheader("👤 Profil Expert")
         profiles = st.session_state.profile_manager.get_profiles()
-        # Trier les profils par ordre alphabétique français des noms (avec support des accents)
-        import locale
-        import unicodedata
-        
-        def normalize_for_sorting(text):
-            """Normalise le texte pour le tri alphabétique français"""
-            # Convertir en majuscules et normaliser les accents pour le tri
-            # NFD décompose les caractères accentués, puis on garde juste les caractères de base
-            return ''.join(
-                c for c in unicodedata.normalize('NFD', text.upper())
-                if unicodedata.category(c) != 'Mn'  # Mn = Mark, Nonspacing (accents)
-            )
-        
+        # Trier les profils par ordre alphabétique français des noms (sans tenir compte des accents)
         sorted_profile_keys = sorted(
             profiles.keys(), 
-            key=lambda x: normalize_for_sorting(profiles[x]['name'])
+            key=lambda x: fold_accents(profiles[x]['name'])
         )
         selected_profile = st.selectbox(
             "Sélectionner un profil",
@@ -326,7 +426,11 @@ def main():
             st.subheader("📄 Projet actuel")
             st.text(f"Fichier: {st.session_state.current_project['filename']}")
             st.text(f"Page: {st.session_state.current_project['current_page'] + 1}/{st.session_state.current_project['total_pages']}")
-            st.text(f"Mesures: {len(st.session_state.current_project['measurements'])}")
+            st.text(f"Mesures: {measurement_count(st.session_state.current_project)}")
+            if st.session_state.project_store.is_dirty:
+                st.caption("💾 Sauvegarde automatique en cours...")
+            else:
+                st.caption("💾 Sauvegarde automatique à jour")
     
     # Section supérieure avec outils et assistant IA
     col_tools, col_ai = st.columns([5, 4])
@@ -358,29 +462,26 @@ def main():
         
         with tab_totals:
             st.subheader("📊 Totaux par Produit")
-            if st.session_state.current_project['measurements']:
-                # Calculer les totaux
-                totals = st.session_state.measurement_tools.calculate_totals(
+            if measurement_count(st.session_state.current_project):
+                # Date des prix : aujourd'hui par défaut, ou une date passée pour rechiffrer
+                price_date = st.date_input("Prix en date du", value=datetime.now().date())
+                
+                # Calculer les totaux (agrégats précalculés pour les pages non chargées)
+                tools = st.session_state.measurement_tools
+                product_totals = tools.product_totals(
                     st.session_state.current_project['measurements'],
-                    st.session_state.product_catalog
+                    st.session_state.product_catalog,
+                    page_aggregates=unloaded_aggregates(st.session_state.current_project),
+                    as_of=price_date if price_date != datetime.now().date() else None
                 )
                 
                 # Afficher le tableau
-                if totals:
-                    df = pd.DataFrame(totals)
+                if product_totals:
+                    df = pd.DataFrame(tools.format_totals(product_totals))
                     st.dataframe(df, use_container_width=True)
                     
-                    # Calculer et afficher le total général
-                    grand_total = 0.0
-                    for row in totals:
-                        # Extraire le montant du prix total (format: "123.45$")
-                        prix_total_str = row.get('Prix total', 'N/D')
-                        if prix_total_str != 'N/D' and '$' in prix_total_str:
-                            try:
-                                montant = float(prix_total_str.replace('$', '').strip())
-                                grand_total += montant
-                            except:
-                                pass
+                    # Total général à partir des montants numériques
+                    grand_total = tools.grand_total(product_totals)
                     
                     # Afficher le total général avec style
                     st.divider()
@@ -452,39 +553,69 @@ def main():
             
             export_format = st.selectbox(
                 "Format d'export",
-                options=['CSV', 'TXT', 'JSON'],
+                options=['CSV', 'CSV (gzip)', 'XLSX', 'PDF annoté', 'Rapport PDF', 'TXT', 'JSON'],
                 key='export_format'
             )
             
             if st.button("📥 Exporter les données", use_container_width=True):
+                # L'export porte sur toutes les pages
+                hydrate_all(st.session_state.current_project)
                 if st.session_state.current_project['measurements']:
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     
-                    if export_format == 'CSV':
-                        # Export CSV
-                        csv_data = []
-                        for m in st.session_state.current_project['measurements']:
-                            product = m.get('product', {})
-                            csv_data.append({
-                                'Type': m.get('type', ''),
-                                'Nom': m.get('label', ''),
-                                'Valeur': f"{m.get('value', 0):.2f}",
-                                'Unité': m.get('unit', ''),
-                                'Page': m.get('page', 0) + 1,
-                                'Produit': product.get('name', ''),
-                                'Catégorie': product.get('category', ''),
-                                'Prix unitaire': f"{product.get('price', 0):.2f}"
-                            })
+                    if export_format in ('CSV', 'CSV (gzip)', 'XLSX', 'PDF annoté', 'Rapport PDF'):
+                        # Écriture en continu dans un fichier propre à cet export, supprimé
+                        # dès que son contenu est remis au bouton de téléchargement.
+                        # Limite : st.download_button garde le contenu en mémoire dans son
+                        # gestionnaire de médias, quelle que soit la forme de data ; on lui
+                        # passe le fichier ouvert pour éviter une seconde copie côté app.
+                        export_dir = os.path.join("temp", "exports")
+                        os.makedirs(export_dir, exist_ok=True)
+                        export_prefix = os.path.join(export_dir, uuid.uuid4().hex + "_")
+                        measurements = st.session_state.current_project['measurements']
+                        manager = st.session_state.project_manager
                         
-                        df = pd.DataFrame(csv_data)
-                        csv = df.to_csv(index=False)
+                        if export_format == 'PDF annoté':
+                            filename = f"plans_annotes_{timestamp}.pdf"
+                            mime = "application/pdf"
+                            ok = manager.export_annotated_pdf(
+                                st.session_state.current_project, export_prefix + filename
+                            )
+                        elif export_format == 'Rapport PDF':
+                            filename = f"rapport_{timestamp}.pdf"
+                            mime = "application/pdf"
+                            totals = st.session_state.measurement_tools.product_totals(
+                                measurements, st.session_state.product_catalog
+                            )
+                            ok = manager.export_pdf_report(
+                                st.session_state.current_project, export_prefix + filename, totals
+                            )
+                        elif export_format == 'XLSX':
+                            filename = f"mesures_{timestamp}.xlsx"
+                            mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            totals = st.session_state.measurement_tools.calculate_totals(
+                                measurements, st.session_state.product_catalog
+                            )
+                            ok = manager.export_to_xlsx(measurements, export_prefix + filename, totals)
+                        else:
+                            compress = export_format == 'CSV (gzip)'
+                            filename = f"mesures_{timestamp}.csv" + (".gz" if compress else "")
+                            mime = "application/gzip" if compress else "text/csv"
+                            ok = manager.export_to_csv(measurements, export_prefix + filename, compress)
                         
-                        st.download_button(
-                            "📥 Télécharger CSV",
-                            csv,
-                            f"mesures_{timestamp}.csv",
-                            "text/csv"
-                        )
+                        export_path = export_prefix + filename
+                        try:
+                            if ok:
+                                with open(export_path, "rb") as export_file:
+                                    st.download_button(
+                                        f"📥 Télécharger {export_format}",
+                                        export_file,
+                                        filename,
+                                        mime
+                                    )
+                        finally:
+                            if os.path.exists(export_path):
+                                os.remove(export_path)
                     
                     elif export_format == 'TXT':
                         # Export TXT
@@ -656,6 +787,10 @@ Pour obtenir une clé API, contactez-nous :
             st.session_state.pdf_processor.load_pdf(temp_path)
             st.session_state.current_project['total_pages'] = st.session_state.pdf_processor.get_page_count()
             st.session_state.current_project['current_page'] = 0
+            st.session_state.project_manager.log_project_change({
+                key: st.session_state.current_project[key]
+                for key in ('pdf_path', 'filename', 'total_pages', 'current_page')
+            })
     
     # Afficher le PDF si chargé
     if st.session_state.current_project['pdf_path']:
@@ -666,6 +801,12 @@ Pour obtenir une clé API, contactez-nous :
                 st.session_state.current_project['current_page']
             )
         
+        # Charger les mesures de la page affichée (projet ouvert paresseusement)
+        st.session_state.project_manager.hydrate_page(
+            st.session_state.current_project,
+            st.session_state.current_project['current_page']
+        )
+        
         # Visualiseur PDF simplifié et réactif
         SimpleReactiveViewer(
             pdf_processor=st.session_state.pdf_processor,
@@ -690,8 +831,8 @@ Pour obtenir une clé API, contactez-nous :
         if st.session_state.get('show_calibration_dialog', False):
             @st.dialog("🎯 Calibration")
             def calibration_dialog():
-                pixel_dist = st.session_state.get('calibration_distance', 0)
-                st.info(f"Distance mesurée: {pixel_dist:.2f} pixels")
+                point_dist = st.session_state.get('calibration_distance', 0)
+                st.info(f"Distance mesurée: {point_dist:.2f} points PDF")
                 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -700,12 +841,15 @@ Pour obtenir une clé API, contactez-nous :
                     unit = st.selectbox("Unité", ['mm', 'cm', 'm', 'in', 'ft'])
                 
                 if st.button("Appliquer", type="primary"):
-                    cal_factor = real_value / pixel_dist
+                    cal_factor = real_value / point_dist
                     st.session_state.current_project['calibration'] = {
                         'value': cal_factor,
                         'unit': unit
                     }
-                    st.success(f"✅ Calibration: 1 pixel = {cal_factor:.4f} {unit}")
+                    st.session_state.project_manager.log_project_change({
+                        'calibration': st.session_state.current_project['calibration']
+                    })
+                    st.success(f"✅ Calibration: 1 point PDF = {cal_factor:.4f} {unit}")
                     st.session_state.show_calibration_dialog = False
                     st.rerun()
             
@@ -773,6 +917,7 @@ def show_product_association_dialog(measurement: Dict, measurement_index: int):
                         }
                         measurement['color'] = product_data.get('color', measurement['color'])
                         st.session_state.current_project['measurements'][measurement_index] = measurement
+                        st.session_state.project_manager.log_measurement_change('update', measurement)
                     st.rerun()
             
             st.caption("Ou choisir un autre produit ci-dessous")
@@ -820,6 +965,7 @@ def show_product_association_dialog(measurement: Dict, measurement_index: int):
                             st.session_state.selected_category = selected_category
                             st.session_state.selected_product = product_name
                             st.session_state.current_project['measurements'][measurement_index] = measurement
+                            st.session_state.project_manager.log_measurement_change('update', measurement)
                             st.rerun()
         
         st.divider()
@@ -0,0 +1,53 @@
+"""Latence de la recherche du catalogue pendant la saisie (CatalogIndex)
+
+Utilisation : python benchmarks/bench_catalog_search.py [nombre_de_produits]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.catalog_index import CatalogIndex
+
+MATERIALS = ['Gypse', 'Béton', 'Épinette', 'Contreplaqué', 'Isolant', 'Vis', 'Clou',
+             'Bardeau', 'Membrane', 'Tuyau', 'Câble', 'Brique']
+SIZES = ['2x4', '2x6', '1/2', '5/8', '3/4']
+
+# Requêtes de saisie, dont des termes trop courts pour les trigrammes
+QUERIES = ['x4', 'pi', 'e', 'q', 'zz', '4 pi', 'ton', 'beton 2x', 'gypse 5/8', 'epinette 12pi']
+
+def make_catalog(count: int) -> dict:
+    """Génère un catalogue synthétique de count produits"""
+    random.seed(42)
+    catalog = {}
+    for i in range(count):
+        name = (f"{random.choice(MATERIALS)} {random.choice(SIZES)} "
+                f"{random.randint(1, 20)}pi réf {random.randint(0, 99999):05d} #{i}")
+        catalog.setdefault(f"Catégorie {i % 30}", {})[name] = {}
+    return catalog
+
+def timed(func, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    catalog = make_catalog(count)
+
+    index = CatalogIndex()
+    build = timed(lambda: index.rebuild(catalog), repeat=1)
+
+    print(f"{count} produits, index construit en {build * 1000:.0f} ms")
+    print(f"{'Requête':18}{'Résultats':>10}{'ms':>10}")
+    for query in QUERIES:
+        elapsed = timed(lambda: index.search(query, 20))
+        print(f"{query:18}{len(index.search(query, 20)):10}{elapsed * 1000:10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare le format .tak JSON (indent=2) et le format binaire compressé
+
+Utilisation : python benchmarks/bench_tak_format.py [nombre_de_mesures] [pages]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tak_format import read_header, read_page, load_snapshot, write_snapshot
+
+def make_project(count: int, pages: int) -> dict:
+    """Génère un projet synthétique réaliste"""
+    random.seed(42)
+    types = ['distance', 'area', 'perimeter', 'angle']
+    measurements = []
+    for i in range(count):
+        m_type = types[i % len(types)]
+        n_points = {'distance': 2, 'angle': 3}.get(m_type, random.randint(4, 12))
+        measurements.append({
+            'id': uuid.uuid4().hex,
+            'type': m_type,
+            'points': [(random.uniform(0, 2448), random.uniform(0, 1584)) for _ in range(n_points)],
+            'page': random.randrange(pages),
+            'value': random.uniform(0, 500),
+            'unit': 'm',
+            'label': f"{m_type}_{i}",
+            'color': '#FF0000',
+            'draw_order': i,
+            'product': {'name': f"Produit {i % 40}", 'category': 'Gypse',
+                        'price': 12.0, 'price_unit': 'feuille', 'color': '#F5F5F5'}
+        })
+    return {
+        'filename': 'plans.pdf',
+        'pdf_path': 'temp/plans.pdf',
+        'calibration': {'value': 0.0353, 'unit': 'm'},
+        'current_page': 0,
+        'total_pages': pages,
+        'coordinate_space': 'pdf_points',
+        'measurements': measurements
+    }
+
+def timed(func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    project = make_project(count, pages)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'projet_json.tak')
+        bin_path = os.path.join(tmp, 'projet_bin.tak')
+
+        json_save = timed(lambda: write_snapshot(json_path, project, binary=False))
+        bin_save = timed(lambda: write_snapshot(bin_path, project, binary=True))
+        json_load = timed(lambda: load_snapshot(json_path))
+        bin_load = timed(lambda: load_snapshot(bin_path))
+        # Temps jusqu'à la première page : en-tête + une page en accès direct
+        first_page = timed(lambda: (read_header(bin_path), read_page(bin_path, pages // 2)))
+
+        # Vérifier l'aller-retour sans perte
+        decoded = load_snapshot(bin_path)
+        expected = json.loads(json.dumps(project))
+        actual = json.loads(json.dumps(decoded))
+        assert actual == expected, "Le format binaire doit être sans perte"
+
+        json_size = os.path.getsize(json_path)
+        bin_size = os.path.getsize(bin_path)
+
+    print(f"{count} mesures sur {pages} pages")
+    print(f"{'':22}{'JSON':>12}{'Binaire':>12}{'Gain':>8}")
+    print(f"{'Taille (Ko)':22}{json_size / 1024:12.0f}{bin_size / 1024:12.0f}{json_size / bin_size:7.1f}x")
+    print(f"{'Sauvegarde (ms)':22}{json_save * 1000:12.1f}{bin_save * 1000:12.1f}{json_save / bin_save:7.1f}x")
+    print(f"{'Chargement (ms)':22}{json_load * 1000:12.1f}{bin_load * 1000:12.1f}{json_load / bin_load:7.1f}x")
+    print(f"{'Première page (ms)':22}{'':12}{first_page * 1000:12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Serveur local imitant l'API Messages pour tester la limitation du client IA
+
+Le serveur applique sa propre limite de débit (429 avec retry-after),
+renvoie une part d'erreurs 529 (surcharge) et simule la latence du modèle ;
+les réponses en continu (stream) sont envoyées en SSE comme l'API réelle.
+Il imite aussi l'API Message Batches (création, état, résultats JSONL),
+avec une part de requêtes en erreur.
+
+Par défaut, le script lance des requêtes simultanées depuis plusieurs
+threads, comme plusieurs sessions Streamlit, et affiche ce que le serveur a
+vu. Avec « batch », il crée des PDF de test, soumet un travail de
+models.batch_analysis, l'interrompt, le reprend et vérifie les résultats.
+
+Utilisation :
+    python benchmarks/fake_ai_server.py [requêtes] [limite_serveur_par_minute] [taux_erreurs]
+    python benchmarks/fake_ai_server.py batch [documents] [pages] [taux_erreurs]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class FakeAIServer(ThreadingHTTPServer):
+    """POST /v1/messages avec limite de débit, erreurs et latence configurables
+
+    Les lots (/v1/messages/batches) sont terminés batch_delay secondes
+    après leur création ; error_rate s'applique aussi à leurs requêtes.
+    Les codes ajoutés à scripted ((code, retry-after)) sont renvoyés aux
+    prochaines requêtes avant toute autre règle (tests).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, requests_per_minute: float = 60, error_rate: float = 0.1,
+                 latency: float = 0.2, batch_delay: float = 1.0, port: int = 0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.latency = latency
+        self.batch_delay = batch_delay
+        self.batches = {}
+        self.scripted = deque()
+        self.lock = threading.Lock()
+        self.accepted = deque()
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'overloaded': 0, 'max_in_flight': 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def admit(self):
+        """Retourne (code HTTP, retry-after) ; 200 si la requête est acceptée"""
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.scripted:
+                status, retry_after = self.scripted.popleft()
+                self.stats['rate_limited' if status == 429 else 'overloaded'] += 1
+                return status, retry_after
+            now = time.monotonic()
+            while self.accepted and now - self.accepted[0] > 60:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.requests_per_minute:
+                self.stats['rate_limited'] += 1
+                return 429, max(1, int(60 - (now - self.accepted[0])) + 1)
+            if random.random() < self.error_rate:
+                self.stats['overloaded'] += 1
+                return 529, None
+            self.accepted.append(now)
+            self.in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+            return 200, None
+
+    def release(self, ok: bool):
+        with self.lock:
+            self.in_flight -= 1
+            if ok:
+                self.stats['ok'] += 1
+
+    def create_batch(self, requests: list) -> dict:
+        with self.lock:
+            batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+            self.batches[batch_id] = {
+                'created': datetime.now(timezone.utc),
+                # Issue de chaque requête tirée dès la création : les résultats restent stables
+                'results': [(r['custom_id'], r['params'], random.random() >= self.error_rate)
+                            for r in requests]
+            }
+            return self.batch_object(batch_id)
+
+    def batch_object(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        created = batch['created']
+        ended = datetime.now(timezone.utc) >= created + timedelta(seconds=self.batch_delay)
+        succeeded = sum(1 for _id, _params, ok in batch['results'] if ok)
+        total = len(batch['results'])
+        iso = lambda moment: moment.isoformat().replace('+00:00', 'Z')
+        return {
+            'id': batch_id, 'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {'processing': 0 if ended else total,
+                               'succeeded': succeeded if ended else 0,
+                               'errored': total - succeeded if ended else 0,
+                               'canceled': 0, 'expired': 0},
+            'created_at': iso(created), 'expires_at': iso(created + timedelta(days=1)),
+            'ended_at': iso(created + timedelta(seconds=self.batch_delay)) if ended else None,
+            'cancel_initiated_at': None, 'archived_at': None,
+            'results_url': f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None
+        }
+
+    def batch_results(self, batch_id: str) -> str:
+        lines = []
+        for custom_id, params, ok in self.batches[batch_id]['results']:
+            if ok:
+                text = params['messages'][-1]['content']
+                analysis = {'resume': f"Page analysée ({len(text)} caractères)",
+                            'elements': [{'categorie': 'Gypse', 'description': 'Mur intérieur',
+                                          'quantite': 12, 'unite': 'feuille'}]}
+                result = {'type': 'succeeded', 'message': {
+                    'id': f"msg_{uuid.uuid4().hex[:24]}", 'type': 'message', 'role': 'assistant',
+                    'model': params.get('model', 'fake'), 'stop_reason': 'end_turn', 'stop_sequence': None,
+                    'content': [{'type': 'text', 'text': json.dumps(analysis, ensure_ascii=False)}],
+                    'usage': {'input_tokens': 10, 'output_tokens': 20}
+                }}
+            else:
+                result = {'type': 'errored', 'error': {'type': 'error', 'error': {
+                    'type': 'api_error', 'message': 'Internal server error'
+                }}}
+            lines.append(json.dumps({'custom_id': custom_id, 'result': result}, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def start(self) -> 'FakeAIServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if parts[:3] != ['v1', 'messages', 'batches'] or len(parts) < 4 or parts[3] not in self.server.batches:
+            self._json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': 'Not found'}})
+        elif len(parts) == 5 and parts[4] == 'results':
+            body = self.server.batch_results(parts[3]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/binary')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._json(200, self.server.batch_object(parts[3]))
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path.split('?')[0].rstrip('/') == '/v1/messages/batches':
+            self._json(200, self.server.create_batch(request.get('requests', [])))
+            return
+        status, retry_after = self.server.admit()
+        if status == 429:
+            self._json(429, {'type': 'error', 'error': {'type': 'rate_limit_error',
+                                                         'message': 'Rate limit exceeded'}},
+                       {'retry-after': retry_after})
+            return
+        if status == 529:
+            self._json(529, {'type': 'error', 'error': {'type': 'overloaded_error',
+                                                         'message': 'Overloaded'}})
+            return
+
+        ok = False
+        try:
+            time.sleep(self.server.latency)
+            words = ["Réponse", "simulée", "du", "serveur", "local."]
+            message = {
+                'id': f"msg_{random.getrandbits(32):08x}", 'type': 'message', 'role': 'assistant',
+                'model': request.get('model', 'fake'), 'stop_reason': 'end_turn', 'stop_sequence': None,
+                'usage': {'input_tokens': 10, 'output_tokens': len(words)}
+            }
+            if request.get('stream'):
+                self._stream(message, words)
+            else:
+                message['content'] = [{'type': 'text', 'text': ' '.join(words)}]
+                self._json(200, message)
+            ok = True
+        finally:
+            self.server.release(ok)
+
+    def _stream(self, message: dict, words: list):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(name: str, data: dict):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event('message_start', {'type': 'message_start', 'message': dict(
+            message, content=[], stop_reason=None, usage={'input_tokens': 10, 'output_tokens': 0}
+        )})
+        event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                      'content_block': {'type': 'text', 'text': ''}})
+        for i, word in enumerate(words):
+            event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': 'text_delta', 'text': (' ' if i else '') + word}})
+        event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        event('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                'usage': {'output_tokens': len(words)}})
+        event('message_stop', {'type': 'message_stop'})
+
+def throttle_demo():
+    from anthropic import AsyncAnthropic
+    from models.ai_client import AsyncAIClient, SyncAIClient
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    server_rpm = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+
+    server = FakeAIServer(requests_per_minute=server_rpm, error_rate=error_rate).start()
+    # Client réglé au-dessus de la limite du serveur pour provoquer des 429
+    client = SyncAIClient(AsyncAIClient(
+        AsyncAnthropic(api_key='fake', base_url=server.base_url, max_retries=0),
+        max_concurrency=4, requests_per_minute=server_rpm * 2
+    ))
+
+    def ask(i: int) -> str:
+        params = {'model': 'fake', 'max_tokens': 50,
+                  'messages': [{'role': 'user', 'content': f"Question {i}"}]}
+        try:
+            if i % 2:
+                with client.messages.stream(**params) as stream:
+                    return ''.join(stream.text_stream)
+            return client.messages.create(**params).content[0].text
+        except Exception as e:
+            return f"ERREUR: {e}"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        answers = list(pool.map(ask, range(count)))
+    elapsed = time.perf_counter() - start
+
+    failures = [a for a in answers if a.startswith("ERREUR")]
+    print(f"{count} requêtes en {elapsed:.1f} s, {len(failures)} en échec")
+    print(f"Serveur : {server.stats}")
+    print(f"Client  : {client.stats}")
+    server.shutdown()
+
+def make_pdf(path: str, pages: int):
+    """PDF de test : une ligne de texte par page"""
+    import fitz
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 72), f"{os.path.basename(path)} page {number + 1} : mur de gypse, 12 feuilles")
+    document.save(path)
+    document.close()
+
+def batch_demo():
+    from anthropic import Anthropic
+    from models.batch_analysis import BatchAnalysisJob
+
+    documents = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    pages = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    error_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+
+    server = FakeAIServer(error_rate=error_rate, batch_delay=0.5).start()
+    client = Anthropic(api_key='fake', base_url=server.base_url, max_retries=0)
+    work_dir = tempfile.mkdtemp()
+    state_file = os.path.join(work_dir, 'travail.json')
+    pdfs = []
+    for i in range(documents):
+        pdfs.append(os.path.join(work_dir, f"plans_{i + 1}.pdf"))
+        make_pdf(pdfs[-1], pages)
+
+    # Première exécution interrompue juste après la soumission
+    job = BatchAnalysisJob.load(client, state_file, "Profil de test")
+    for pdf in pdfs:
+        job.add_document(pdf)
+    first_batches = job.submit()
+    del job
+
+    # Reprise : aucun lot n'est soumis deux fois, les pages en erreur repartent
+    start = time.perf_counter()
+    job = BatchAnalysisJob.load(client, state_file, "Profil de test")
+    for pdf in pdfs:
+        job.add_document(pdf)
+    job.run(poll_interval=0.2)
+    elapsed = time.perf_counter() - start
+
+    summary = job.summary()
+    project = job.apply_to_project({'measurements': []})
+    stored = sum(len(d['pages']) for d in project['ai_page_analyses'].values())
+    print(f"{summary['pages']} pages, {summary['succeeded']} analysées, {summary['failed']} en échec, "
+          f"{summary['batches']} lots ({len(first_batches)} avant l'interruption) en {elapsed:.1f} s")
+    print(f"{stored} résultats écrits dans le projet")
+    assert summary['pending'] == 0 and stored == summary['pages']
+    assert summary['batches'] == len(server.batches)
+    server.shutdown()
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        batch_demo()
+    else:
+        throttle_demo()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import streamlit as st
 from typing import List, Dict
 import time
+from models.document_index import get_document_index
 
 def AIChat(ai_assistant, profile_manager, selected_profile: str, 
           current_project: Dict, chat_history: List[Dict]):
@@ -58,31 +59,35 @@ def AIChat(ai_assistant, profile_manager, selected_profile: str,
         with st.chat_message("user"):
             st.write(user_input)
         
-        # Obtenir la réponse de l'IA
+        # Obtenir la réponse de l'IA, affichée au fil de la génération
         with st.chat_message("assistant"):
-            with st.spinner("Réflexion en cours..."):
-                try:
-                    # Obtenir le profil complet
-                    expert_profile = profile['content'] if profile else ""
-                    
-                    # Obtenir la réponse
-                    response = ai_assistant.get_contextual_response(
-                        user_message=user_input,
-                        expert_profile=expert_profile,
-                        project_context=current_project,
-                        max_history=10
-                    )
-                    
-                    # Afficher la réponse
-                    st.write(response)
-                    
-                    # Ajouter à l'historique
-                    chat_history.append({'role': 'assistant', 'content': response})
-                    
-                except Exception as e:
-                    error_msg = f"Erreur: {str(e)}"
-                    st.error(error_msg)
-                    chat_history.append({'role': 'assistant', 'content': error_msg})
+            try:
+                # Obtenir le profil complet
+                expert_profile = profile['content'] if profile else ""
+                
+                # Index local du PDF chargé (construit au premier usage)
+                document_index = None
+                if current_project.get('pdf_path'):
+                    with st.spinner("Indexation du document..."):
+                        document_index = get_document_index(
+                            current_project['pdf_path'], st.session_state.pdf_processor
+                        )
+                
+                response = st.write_stream(ai_assistant.stream_contextual_response(
+                    user_message=user_input,
+                    expert_profile=expert_profile,
+                    project_context=current_project,
+                    max_history=10,
+                    document_index=document_index
+                ))
+                
+                # Ajouter à l'historique une fois la réponse complète
+                chat_history.append({'role': 'assistant', 'content': response})
+                
+            except Exception as e:
+                error_msg = f"Erreur: {str(e)}"
+                st.error(error_msg)
+                chat_history.append({'role': 'assistant', 'content': error_msg})
         
         # Forcer le rafraîchissement
         st.rerun()
@@ -90,6 +95,10 @@ def AIChat(ai_assistant, profile_manager, selected_profile: str,
     # Actions supplémentaires
     st.divider()
     
+    # Les analyses et suggestions déjà obtenues sont reprises du cache
+    refresh = st.checkbox("🔄 Nouvelle réponse (ignorer le cache)", value=False,
+                          help="Relance l'analyse même si une réponse identique est en cache")
+    
     # Boutons d'action
     col1, col2, col3 = st.columns(3)
     
@@ -97,21 +106,24 @@ def AIChat(ai_assistant, profile_manager, selected_profile: str,
         if st.button("📄 Analyser PDF", use_container_width=True):
             if current_project.get('pdf_path'):
                 with st.spinner("Analyse en cours..."):
-                    # Extraire le texte du PDF
-                    pdf_text = st.session_state.pdf_processor.get_all_text()
+                    # Extraire le texte de chaque page
+                    pdf_processor = st.session_state.pdf_processor
+                    pages = [pdf_processor.get_page_text(i) for i in range(pdf_processor.get_page_count())]
                     
-                    if pdf_text:
-                        # Limiter la taille
-                        if len(pdf_text) > 10000:
-                            pdf_text = pdf_text[:10000] + "... [texte tronqué]"
-                        
-                        # Analyser
+                    if any(page.strip() for page in pages):
+                        # Analyser tout le document, par morceaux
                         expert_profile = profile['content'] if profile else ""
-                        analysis = ai_assistant.analyze_pdf_content(
-                            pdf_text=pdf_text,
+                        progress_bar = st.progress(0.0, text="Analyse du document...")
+                        analysis = ai_assistant.analyze_document(
+                            pages=pages,
                             expert_profile=expert_profile,
-                            analysis_type="general"
+                            analysis_type="general",
+                            use_cache=not refresh,
+                            progress=lambda done, total: progress_bar.progress(
+                                done / total, text=f"Analyse du document... {done}/{total} parties"
+                            )
                         )
+                        progress_bar.empty()
                         
                         # Ajouter à l'historique
                         chat_history.append({
@@ -141,7 +153,8 @@ def AIChat(ai_assistant, profile_manager, selected_profile: str,
                 suggestions = ai_assistant.suggest_measurements(
                     project_description=project_desc,
                     expert_profile=expert_profile,
-                    existing_measurements=current_project.get('measurements', [])
+                    existing_measurements=current_project.get('measurements', []),
+                    use_cache=not refresh
                 )
                 
                 # Ajouter à l'historique
@@ -178,6 +191,36 @@ def AIChat(ai_assistant, profile_manager, selected_profile: str,
         with col2:
             st.metric("Réponses", ai_messages)
         
+        # Cache de prompt (profil et document réutilisés d'une requête à l'autre)
+        usage = ai_assistant.usage_stats
+        if usage['requests']:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Jetons lus du cache", usage['cache_read_input_tokens'])
+            with col2:
+                st.metric("Taux de cache", f"{ai_assistant.cache_hit_ratio():.0%}")
+        if usage.get('response_cache_hits'):
+            st.write(f"Réponses reprises du cache: {usage['response_cache_hits']}")
+        
+        # Jetons de la dernière question, par partie du prompt (estimation locale)
+        last_chat = next((entry for entry in reversed(ai_assistant.request_log)
+                          if 'total' in entry['estimate']), None)
+        if last_chat:
+            estimate = last_chat['estimate']
+            actual = sum(last_chat[field] for field in (
+                'input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'
+            ))
+            st.write(f"**Dernière question:** {actual} jetons d'entrée "
+                     f"(estimé {estimate['total']} / budget {ai_assistant.input_budget})")
+            labels = {'profile': "Profil", 'instructions': "Instructions", 'summary': "Résumé",
+                      'history': "Historique", 'context': "Contexte", 'documents': "Extraits PDF",
+                      'question': "Question"}
+            st.caption(" · ".join(f"{label}: {estimate.get(key, 0)}" for key, label in labels.items()))
+        
+        if ai_assistant.history_summary:
+            st.write(f"**Résumé des {ai_assistant.summarized_count} premiers messages:**")
+            st.text(ai_assistant.history_summary)
+        
         # Résumé de la conversation
         if chat_history:
             st.write("**Derniers échanges:**")
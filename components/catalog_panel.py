@@ -1,5 +1,9 @@
 import streamlit as st
 from typing import Optional
+from models.catalog_import import SupplierImport, detect_format
+
+# Résultats de recherche affichés sous le champ de saisie
+SEARCH_DISPLAY_LIMIT = 20
 
 def CatalogPanel(catalog, selected_category: Optional[str], selected_product: Optional[str]):
     """Panneau pour gérer le catalogue de produits"""
@@ -23,6 +27,27 @@ def CatalogPanel(catalog, selected_category: Optional[str], selected_product: Op
                     st.rerun()
         return
     
+    # Recherche dans tout le catalogue
+    query = st.text_input("🔍 Rechercher un produit", key="catalog_search")
+    if query:
+        # Un résultat de plus que la limite affichée pour signaler la troncature
+        results = catalog.search_products(query, limit=SEARCH_DISPLAY_LIMIT + 1)
+        if not results:
+            st.caption("Aucun produit trouvé")
+        elif len(results) > SEARCH_DISPLAY_LIMIT:
+            results = results[:SEARCH_DISPLAY_LIMIT]
+            st.caption(f"{SEARCH_DISPLAY_LIMIT} premiers résultats affichés : précisez la recherche")
+        for result_category, product_name, product_data in results:
+            if st.button(
+                f"{product_name} — {result_category}",
+                key=f"search_{result_category}_{product_name}",
+                use_container_width=True
+            ):
+                st.session_state.selected_category = result_category
+                st.session_state.selected_product = product_name
+                st.rerun()
+        st.divider()
+    
     # Sélection de catégorie
     category = st.selectbox(
         "Catégorie",
@@ -166,6 +191,34 @@ def CatalogPanel(catalog, selected_category: Optional[str], selected_product: Op
         if st.button("➕ Nouvelle catégorie", use_container_width=True):
             st.session_state.show_add_category = True
     
+    # Liste de prix fournisseur (CSV ou JSON lines, éventuellement en gzip)
+    with st.expander("🚚 Importer une liste de prix fournisseur"):
+        supplier_file = st.file_uploader(
+            "Fichier fournisseur",
+            type=['csv', 'jsonl', 'ndjson', 'gz'],
+            key="supplier_upload",
+            help="Colonnes : catégorie, nom, prix, unité, sku, dimensions, couleur, date d'effet"
+        )
+        only_changed = st.checkbox("Appliquer seulement les changements", value=True)
+        if supplier_file and st.button("Importer la liste de prix", use_container_width=True):
+            progress_bar = st.progress(0.0, text="Import en cours...")
+            
+            def show_progress(position, total, report):
+                fraction = min(position / total, 1.0) if total else 0.0
+                progress_bar.progress(fraction, text=f"{report['rows']} lignes traitées")
+            
+            report = SupplierImport(catalog, only_changed, progress=show_progress).run(
+                supplier_file, detect_format(supplier_file.name), supplier_file.size
+            )
+            st.success(
+                f"{report['added']} produits ajoutés, {report['updated']} mis à jour, "
+                f"{report['unchanged']} inchangés"
+            )
+            if report['invalid']:
+                st.warning(f"{report['invalid']} lignes ignorées")
+                for error in report['errors']:
+                    st.caption(error)
+    
     # Dialogue pour ajouter une catégorie
     if st.session_state.get('show_add_category'):
         with st.form("new_category_form"):
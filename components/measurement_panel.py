@@ -1,5 +1,12 @@
 import streamlit as st
 from typing import List, Dict, Optional
+from utils.lazy_project import discard_unloaded
+
+def log_change(op: str, measurement: Optional[Dict] = None):
+    """Journalise une modification de mesure dans le projet actif"""
+    project_manager = st.session_state.get('project_manager')
+    if project_manager:
+        project_manager.log_measurement_change(op, measurement)
 
 def MeasurementPanel(measurements: List[Dict], selected_tool: str, 
                     selected_product: Optional[str], calibration: Dict,
@@ -64,6 +71,7 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                     # Réinitialiser l'ordre selon l'ordre de création
                     for i, m in enumerate(measurements):
                         m['draw_order'] = i
+                        log_change('update', m)
                     st.success("Ordre réinitialisé")
                     st.rerun()
             
@@ -74,6 +82,7 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                     orders.reverse()
                     for i, m in enumerate(measurements):
                         m['draw_order'] = orders[i]
+                        log_change('update', m)
                     st.success("Ordre inversé")
                     st.rerun()
             
@@ -83,6 +92,7 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                     sorted_measurements = sorted(measurements, key=lambda m: m.get('draw_order', 0))
                     for i, m in enumerate(sorted_measurements):
                         m['draw_order'] = i
+                        log_change('update', m)
                     st.success("Ordre optimisé")
                     st.rerun()
         
@@ -104,6 +114,7 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                         )
                         if new_label != measurement.get('label'):
                             measurement['label'] = new_label
+                            log_change('update', measurement)
                     
                     with col2:
                         # Valeur et unité
@@ -151,11 +162,13 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                                         if m.get('draw_order', 0) == next_order:
                                             m['draw_order'] = current_order
                                             measurement['draw_order'] = next_order
+                                            log_change('update', m)
                                             break
                                 else:
                                     # Créer un nouveau niveau au-dessus
                                     max_order = max([m.get('draw_order', 0) for m in measurements], default=0)
                                     measurement['draw_order'] = max_order + 1
+                                log_change('update', measurement)
                                 st.rerun()
                         
                         with col4b:
@@ -177,11 +190,13 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                                         if m.get('draw_order', 0) == prev_order:
                                             m['draw_order'] = current_order
                                             measurement['draw_order'] = prev_order
+                                            log_change('update', m)
                                             break
                                 else:
                                     # Créer un nouveau niveau en-dessous
                                     min_order = min([m.get('draw_order', 0) for m in measurements], default=0)
                                     measurement['draw_order'] = min_order - 1
+                                log_change('update', measurement)
                                 st.rerun()
                         
                         with col4c:
@@ -196,17 +211,20 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
                                 # Envoyer au premier plan
                                 max_order = max([m.get('draw_order', 0) for m in measurements], default=0)
                                 measurement['draw_order'] = max_order + 1
+                                log_change('update', measurement)
                                 st.rerun()
                             elif action == "⬇️ Dernier":
                                 # Envoyer au dernier plan
                                 min_order = min([m.get('draw_order', 0) for m in measurements], default=0)
                                 measurement['draw_order'] = min_order - 1
+                                log_change('update', measurement)
                                 st.rerun()
                     
                     with col5:
                         # Bouton supprimer
                         if st.button("🗑️", key=f"del_{m_type}_{i}"):
                             measurements.remove(measurement)
+                            log_change('delete', measurement)
                             st.rerun()
     
     st.divider()
@@ -239,6 +257,9 @@ def MeasurementPanel(measurements: List[Dict], selected_tool: str,
         if st.button("🗑️ Effacer tout", type="secondary", use_container_width=True):
             if st.session_state.get('confirm_clear'):
                 measurements.clear()
+                # Les pages non encore chargées sont aussi vidées
+                discard_unloaded(st.session_state.current_project)
+                log_change('clear')
                 st.session_state.confirm_clear = False
                 st.success("Toutes les mesures ont été effacées")
                 st.rerun()
@@ -319,6 +340,7 @@ def show_product_selection_dialog(measurement, measurement_index, measurement_ty
                                 'color': color
                             }
                             measurement['color'] = color
+                            log_change('update', measurement)
                             
                             # Fermer le dialogue
                             st.session_state[f'editing_product_{measurement_type}_{measurement_index}'] = False
@@ -338,6 +360,7 @@ def show_product_selection_dialog(measurement, measurement_index, measurement_ty
             if st.button("❌ Retirer le produit", use_container_width=True):
                 measurement['product'] = {}
                 measurement['color'] = measurement.get('default_color', '#FF0000')
+                log_change('update', measurement)
                 st.session_state[f'editing_product_{measurement_type}_{measurement_index}'] = False
                 st.success("Produit retiré de la mesure")
                 st.rerun()
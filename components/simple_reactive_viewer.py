@@ -2,7 +2,9 @@ import streamlit as st
 from streamlit_image_coordinates import streamlit_image_coordinates
 from PIL import Image, ImageDraw, ImageFont
 import math
+import uuid
 from typing import List, Dict, Optional, Tuple
+from utils.measurement_tools import MeasurementTools
 
 def SimpleReactiveViewer(pdf_processor, current_page: int, measurements: List[Dict],
                         selected_tool: str, calibration: Dict, detected_lines: Optional[List[Dict]] = None):
@@ -52,7 +54,7 @@ def SimpleReactiveViewer(pdf_processor, current_page: int, measurements: List[Di
     with col2:
         if st.button("Valider", type="primary") and len(state['points']) >= 2:
             # Traiter la mesure
-            save_measurement(selected_tool, state['points'], measurements, current_page, calibration, state['zoom'])
+            save_measurement(selected_tool, state['points'], measurements, current_page, calibration)
             state['points'] = []
             st.rerun()
     
@@ -100,20 +102,23 @@ def SimpleReactiveViewer(pdf_processor, current_page: int, measurements: List[Di
     for m in sorted_measurements:
         draw_saved_measurement(draw, m, state['zoom'])
     
+    # Les points en cours sont stockés en points PDF, convertis à l'écran pour le dessin
+    screen_points = MeasurementTools.page_to_screen(state['points'], state['zoom'])
+    
     # Points en cours avec transparence
-    if state['points']:
+    if screen_points:
         color = config['color']
         rgb = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
         # Transparence pour les points en cours (semi-transparent)
         rgba = rgb + (150,)
         
         # Lignes avec transparence
-        for i in range(len(state['points']) - 1):
-            draw.line([state['points'][i], state['points'][i+1]], fill=rgba, width=3)
+        for i in range(len(screen_points) - 1):
+            draw.line([screen_points[i], screen_points[i+1]], fill=rgba, width=3)
         
         # Mode ortho : afficher les lignes guides si actif
-        if state.get('ortho_active', False) and len(state['points']) > 0:
-            last_point = state['points'][-1]
+        if state.get('ortho_active', False) and len(screen_points) > 0:
+            last_point = screen_points[-1]
             # Dessiner les lignes guides orthogonales
             guide_color = (128, 128, 128, 80)  # Gris semi-transparent
             highlight_color = (255, 165, 0, 120)  # Orange pour la direction active
@@ -134,11 +139,11 @@ def SimpleReactiveViewer(pdf_processor, current_page: int, measurements: List[Di
                 draw.text((text_x-10, text_y-10), f"{angle}°", fill=(128, 128, 128, 200))
         
         # Ligne pointillée pour fermer les polygones (seulement pour les surfaces)
-        if selected_tool == 'area' and len(state['points']) >= 3:
-            draw_dashed_line(draw, state['points'][-1], state['points'][0], rgba)
+        if selected_tool == 'area' and len(screen_points) >= 3:
+            draw_dashed_line(draw, screen_points[-1], screen_points[0], rgba)
         
         # Points avec transparence
-        for i, p in enumerate(state['points']):
+        for i, p in enumerate(screen_points):
             # Cercle blanc semi-transparent en fond
             draw.ellipse([p[0]-8, p[1]-8, p[0]+8, p[1]+8], fill=(255, 255, 255, 180), outline=(255, 255, 255, 220), width=2)
             # Point coloré transparent
@@ -164,12 +169,15 @@ def SimpleReactiveViewer(pdf_processor, current_page: int, measurements: List[Di
     
     # Traiter le clic
     if clicked:
-        x, y = clicked["x"], clicked["y"]
+        # Conversion unique des pixels écran vers les points PDF
+        zoom = state['zoom']
+        x, y = MeasurementTools.screen_to_page([(clicked["x"], clicked["y"])], zoom)[0]
         
-        # Éviter les doublons
+        # Éviter les doublons (10 pixels à l'écran)
+        tolerance = 10 / zoom
         is_new = True
         for p in state['points']:
-            if abs(p[0] - x) < 10 and abs(p[1] - y) < 10:
+            if abs(p[0] - x) < tolerance and abs(p[1] - y) < tolerance:
                 is_new = False
                 break
         
@@ -177,12 +185,20 @@ def SimpleReactiveViewer(pdf_processor, current_page: int, measurements: List[Di
             # Appliquer le mode ortho si actif et qu'il y a déjà un point
             if state.get('ortho_active', False) and len(state['points']) > 0:
                 x, y = calculate_ortho_point(state['points'][-1], (x, y))
+            elif st.session_state.get('snap_enabled', False) and detected_lines:
+                # Accrochage directement sur la géométrie vectorielle (points PDF)
+                tools = st.session_state.get('measurement_tools')
+                if tools:
+                    threshold = st.session_state.get('snap_threshold', 10) / zoom
+                    snap = tools.find_snap_point((x, y), state['points'], detected_lines, threshold)
+                    if snap:
+                        x, y = snap
             
             state['points'].append((x, y))
             
             # Auto-complétion pour distance/angle/calibration
             if selected_tool in ['distance', 'angle', 'calibration'] and len(state['points']) >= config['max']:
-                save_measurement(selected_tool, state['points'], measurements, current_page, calibration, state['zoom'])
+                save_measurement(selected_tool, state['points'], measurements, current_page, calibration)
                 state['points'] = []
                 st.rerun()
             else:
@@ -248,10 +264,8 @@ def draw_saved_measurement(draw, measurement, current_zoom):
     if not points:
         return
     
-    # Ajuster au zoom
-    saved_zoom = measurement.get('zoom_level', 1.0)
-    ratio = current_zoom / saved_zoom
-    adjusted = [(p[0] * ratio, p[1] * ratio) for p in points]
+    # Les points sont en coordonnées PDF : conversion vers l'écran au zoom courant
+    adjusted = MeasurementTools.page_to_screen(points, current_zoom)
     
     color = measurement.get('color', '#000000')
     rgb = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
@@ -494,8 +508,8 @@ def draw_saved_measurement(draw, measurement, current_zoom):
             else:
                 draw.text((text_x, text_y), display_text, fill=(0, 0, 0, 255), anchor="mm")
 
-def save_measurement(tool, points, measurements, page, calibration, zoom):
-    """Sauvegarde une mesure"""
+def save_measurement(tool, points, measurements, page, calibration):
+    """Sauvegarde une mesure (points en coordonnées PDF)"""
     if not points:
         return
     
@@ -510,6 +524,7 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
     if tool == 'distance' and len(points) >= 2:
         dist = math.sqrt((points[1][0] - points[0][0])**2 + (points[1][1] - points[0][1])**2)
         measurement = {
+            'id': uuid.uuid4().hex,
             'type': 'distance',
             'points': points[:2],
             'page': page,
@@ -517,7 +532,6 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
             'unit': cal_unit,
             'label': f"Distance_{len([m for m in measurements if m['type'] == 'distance']) + 1}",
             'color': '#FF0000',
-            'zoom_level': zoom,
             'draw_order': new_draw_order
         }
     
@@ -532,6 +546,7 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
         area = abs(area) / 2.0
         
         measurement = {
+            'id': uuid.uuid4().hex,
             'type': 'area',
             'points': points[:],
             'page': page,
@@ -539,7 +554,6 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
             'unit': f"{cal_unit}²",
             'label': f"Surface_{len([m for m in measurements if m['type'] == 'area']) + 1}",
             'color': '#00FF00',
-            'zoom_level': zoom,
             'draw_order': new_draw_order
         }
     
@@ -551,6 +565,7 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
             perim += math.sqrt((points[j][0] - points[i][0])**2 + (points[j][1] - points[i][1])**2)
         
         measurement = {
+            'id': uuid.uuid4().hex,
             'type': 'perimeter',
             'points': points[:],
             'page': page,
@@ -558,7 +573,6 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
             'unit': cal_unit,
             'label': f"Périmètre_{len([m for m in measurements if m['type'] == 'perimeter']) + 1}",
             'color': '#0000FF',
-            'zoom_level': zoom,
             'draw_order': new_draw_order
         }
     
@@ -570,6 +584,7 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
         angle = abs(math.degrees(math.atan2(det, dot)))
         
         measurement = {
+            'id': uuid.uuid4().hex,
             'type': 'angle',
             'points': points[:3],
             'page': page,
@@ -577,7 +592,6 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
             'unit': '°',
             'label': f"Angle_{len([m for m in measurements if m['type'] == 'angle']) + 1}",
             'color': '#FF00FF',
-            'zoom_level': zoom,
             'draw_order': new_draw_order
         }
     
@@ -590,6 +604,9 @@ def save_measurement(tool, points, measurements, page, calibration, zoom):
     # Ajouter la mesure et déclencher le dialogue produit
     if measurement:
         measurements.append(measurement)
+        project_manager = st.session_state.get('project_manager')
+        if project_manager:
+            project_manager.log_measurement_change('add', measurement)
         # Déclencher le dialogue d'association de produit
         st.session_state.temp_measurement = measurement
         st.session_state.temp_measurement_index = len(measurements) - 1
@@ -1,30 +1,148 @@
 import os
-from typing import List, Dict, Optional
-from anthropic import Anthropic
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+from models.ai_client import get_ai_client
 import json
+from models.document_analysis import DocumentAnalyzer, pages_from_text, ProgressCallback
+from models.document_index import RETRIEVAL_TOP_K, format_passages
+from models.response_cache import ResponseCache, get_response_cache, make_key, text_hash
+from models.project_context import ProjectContextBuilder
+from models.token_budget import (CHAT_INPUT_BUDGET, MESSAGE_OVERHEAD, SUMMARY_MAX_TOKENS,
+                                 estimate_tokens, format_transcript, message_tokens, split_history)
+
+# Marque la fin d'un préfixe stable à mettre en cache par l'API
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+DEFAULT_MODEL = "claude-opus-4-20250514"
+
+# Nombre de requêtes conservées dans AIAssistant.request_log
+REQUEST_LOG_SIZE = 50
+
+CHAT_INSTRUCTIONS = """INSTRUCTIONS:
+- Réponds de manière professionnelle et précise
+- Utilise le contexte du projet pour des réponses pertinentes
+- Reste dans ton domaine d'expertise
+- Fournis des conseils pratiques et applicables
+- Si tu as besoin de plus d'informations, demande-les clairement
+"""
 
 class AIAssistant:
-    """Assistant IA utilisant l'API Claude d'Anthropic"""
+    """Assistant IA utilisant l'API Claude d'Anthropic
+    
+    Les requêtes sont ordonnées du plus stable au plus variable : profil
+    d'expert et document (préfixes mis en cache par l'API), puis historique,
+    puis contexte du projet et question en fin de dernier message. Les
+    compteurs de cache renvoyés par l'API sont cumulés dans usage_stats.
+    
+    Les analyses de documents et les suggestions sont en plus conservées
+    dans un cache disque (response_cache) : une même requête n'est payée
+    qu'une fois, sauf si use_cache=False force un nouvel appel.
+    """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, client=None,
+                 response_cache: Optional[ResponseCache] = None,
+                 context_builder: Optional[ProjectContextBuilder] = None,
+                 catalog=None):
         """
         Initialise l'assistant avec une clé API
         
         Args:
             api_key: Clé API Anthropic (si None, cherche dans les variables d'environnement)
+            client: Client compatible avec l'API Messages (par ex. un simulateur
+                local) ; remplace le client partagé du processus, qui
+                limite le débit et retente les erreurs passagères
+            response_cache: Cache des réponses (par défaut le cache partagé
+                du processus)
+            context_builder: Résumé du projet mis à jour à chaque mesure
+                (celui du ProjectManager, pour éviter de le recalculer)
+            catalog: Catalogue de produits, pour les coûts du contexte
         """
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
         
-        if not self.api_key:
+        if client is None and not self.api_key:
             raise ValueError("Clé API Anthropic requise. Définissez ANTHROPIC_API_KEY ou passez la clé en paramètre.")
         
-        self.client = Anthropic(api_key=self.api_key)
-        self.model = "claude-opus-4-20250514"
+        self.client = client or get_ai_client(self.api_key)
+        self.model = DEFAULT_MODEL
         self.conversation_history = []
+        self.context_builder = context_builder or ProjectContextBuilder()
+        self.catalog = catalog
+        self.response_cache = response_cache or get_response_cache()
+        self._usage_lock = threading.Lock()
+        self.usage_stats = {
+            'requests': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_creation_input_tokens': 0,
+            'cache_read_input_tokens': 0,
+            'response_cache_hits': 0
+        }
+        # Dernières requêtes : jetons réels et estimation par partie
+        self.request_log = deque(maxlen=REQUEST_LOG_SIZE)
+        
+        # Budget d'entrée du chat et résumé glissant des échanges écartés,
+        # mis à jour en arrière-plan (summarized_count : messages résumés,
+        # _fold_end : messages écartés, résumés ou en cours de résumé)
+        self.input_budget = CHAT_INPUT_BUDGET
+        self.history_summary = ""
+        self.summarized_count = 0
+        self._fold_end = 0
+        self._fold_thread = None
+        self._history_generation = 0
+        self._summary_lock = threading.Lock()
+    
+    def _record_usage(self, usage, estimate: Optional[Dict] = None):
+        """Cumule les compteurs de jetons d'une réponse (champs usage de l'API)
+        
+        Chaque requête est aussi ajoutée à request_log, avec l'estimation
+        par partie du prompt quand elle est fournie.
+        """
+        if usage is None:
+            return
+        fields = ('input_tokens', 'output_tokens',
+                  'cache_creation_input_tokens', 'cache_read_input_tokens')
+        entry = {field: getattr(usage, field, 0) or 0 for field in fields}
+        entry['estimate'] = estimate or {}
+        with self._usage_lock:
+            self.usage_stats['requests'] += 1
+            for field in fields:
+                self.usage_stats[field] += entry[field]
+            self.request_log.append(entry)
+    
+    def cache_hit_ratio(self) -> float:
+        """Part des jetons d'entrée lus depuis le cache"""
+        stats = self.usage_stats
+        total = (stats['input_tokens'] + stats['cache_creation_input_tokens']
+                 + stats['cache_read_input_tokens'])
+        return stats['cache_read_input_tokens'] / total if total else 0.0
+    
+    def _cached_response(self, key: str, use_cache: bool) -> Optional[str]:
+        """Réponse du cache disque (None si absente ou si use_cache est faux)"""
+        if not use_cache:
+            return None
+        response = self.response_cache.get(key)
+        if response is not None:
+            with self._usage_lock:
+                self.usage_stats['response_cache_hits'] += 1
+        return response
+    
+    @staticmethod
+    def _system_blocks(*parts: str) -> List[Dict]:
+        """Blocs du prompt système ; le dernier ferme le préfixe mis en cache"""
+        blocks = [{'type': 'text', 'text': part} for part in parts if part]
+        if blocks:
+            blocks[-1]['cache_control'] = CACHE_CONTROL
+        return blocks
     
     def clear_history(self):
-        """Efface l'historique de conversation"""
-        self.conversation_history = []
+        """Efface l'historique de conversation (un résumé en cours est abandonné)"""
+        with self._summary_lock:
+            self.conversation_history = []
+            self.history_summary = ""
+            self.summarized_count = 0
+            self._fold_end = 0
+            self._history_generation += 1
     
     def add_to_history(self, role: str, content: str):
         """Ajoute un message à l'historique"""
@@ -33,11 +151,169 @@ class AIAssistant:
             'content': content
         })
     
+    def _build_chat_request(self,
+                            user_message: str,
+                            expert_profile: str,
+                            project_context: Dict,
+                            max_history: int,
+                            document_index=None) -> Tuple[List[Dict], List[Dict], Dict]:
+        """Construit le prompt système et les messages d'une question de chat
+        
+        Le profil et les instructions forment le préfixe en cache ; le
+        contexte du projet, qui change à chaque mesure, et les passages du
+        document retrouvés pour la question sont placés dans le dernier
+        message, juste avant la question.
+        
+        L'historique reçoit le budget d'entrée restant (input_budget moins
+        les autres parties) : les échanges qui n'y tiennent plus sont
+        repliés dans le résumé glissant plutôt qu'oubliés. Le résumé est
+        calculé en arrière-plan : la requête part sans l'attendre, avec le
+        résumé précédent. Retourne aussi l'estimation des jetons par partie.
+        """
+        # Préparer le contexte du projet
+        context_info = f"CONTEXTE DU PROJET ACTUEL:\n{self._prepare_project_context(project_context)}"
+        passages = document_index.search(user_message, RETRIEVAL_TOP_K) if document_index else []
+        documents = ("EXTRAITS PERTINENTS DU DOCUMENT (cite les numéros de page):\n"
+                     + format_passages(passages)) if passages else ""
+        
+        estimate = {
+            'profile': estimate_tokens(expert_profile),
+            'instructions': estimate_tokens(CHAT_INSTRUCTIONS),
+            'context': estimate_tokens(context_info),
+            'documents': estimate_tokens(documents),
+            'question': estimate_tokens(user_message) + MESSAGE_OVERHEAD
+        }
+        
+        # Budget de l'historique : ce qui reste une fois le reste compté,
+        # en réservant la place du résumé dès qu'il existe ou doit être créé
+        with self._summary_lock:
+            history_start = self._fold_end
+            history_summary = self.history_summary
+        history = self.conversation_history[history_start:]
+        history_budget = max(0, self.input_budget - sum(estimate.values()))
+        if history_summary or history_start or len(history) > max_history or \
+                sum(message_tokens(m) for m in history) > history_budget:
+            history_budget = max(0, history_budget - SUMMARY_MAX_TOKENS)
+        keep_start, history_tokens = split_history(history, history_budget, max_history)
+        if keep_start:
+            self._fold_in_background(history_start + keep_start)
+            history = history[keep_start:]
+        estimate['summary'] = estimate_tokens(history_summary)
+        estimate['history'] = history_tokens
+        estimate['total'] = sum(estimate.values())
+        
+        # Prompt système stable (profil + instructions), puis résumé des
+        # échanges anciens, qui ne change qu'au repliement
+        system_prompt = self._system_blocks(expert_profile, CHAT_INSTRUCTIONS)
+        if history_summary:
+            system_prompt.append({
+                'type': 'text',
+                'text': f"RÉSUMÉ DES ÉCHANGES PRÉCÉDENTS:\n{history_summary}",
+                'cache_control': CACHE_CONTROL
+            })
+        
+        # Ajouter l'historique récent
+        messages = [{'role': msg['role'], 'content': msg['content']} for msg in history]
+        
+        # Deuxième point de cache : la fin de l'historique, réutilisée au tour suivant
+        if messages:
+            last = messages[-1]
+            last['content'] = [{'type': 'text', 'text': last['content'], 'cache_control': CACHE_CONTROL}]
+        
+        # Ajouter le nouveau message (contexte variable puis question)
+        content = [{'type': 'text', 'text': context_info}]
+        if documents:
+            content.append({'type': 'text', 'text': documents})
+        content.append({'type': 'text', 'text': user_message})
+        messages.append({'role': 'user', 'content': content})
+        
+        return system_prompt, messages, estimate
+    
+    def _fold_in_background(self, fold_end: int):
+        """Écarte les messages avant fold_end et les résume dans un thread
+        
+        Les messages écartés ne sont plus envoyés, pour respecter le budget ;
+        ils ne comptent comme résumés (summarized_count) qu'une fois le
+        résumé réussi. Un seul résumé à la fois : le thread en cours reprend
+        les messages écartés entre-temps.
+        """
+        with self._summary_lock:
+            self._fold_end = max(self._fold_end, fold_end)
+            if self._fold_thread is not None:
+                return
+            self._fold_thread = threading.Thread(target=self._fold_worker, name="chat-summary", daemon=True)
+            self._fold_thread.start()
+    
+    def _fold_worker(self):
+        """Boucle du thread de résumé"""
+        while True:
+            with self._summary_lock:
+                start, end = self.summarized_count, self._fold_end
+                generation = self._history_generation
+                if start >= end:
+                    self._fold_thread = None
+                    return
+                messages = self.conversation_history[start:end]
+                previous = self.history_summary
+            summary = self._summarize(previous, messages)
+            with self._summary_lock:
+                if generation != self._history_generation:
+                    # Historique effacé pendant le résumé
+                    continue
+                if summary is None:
+                    # Échec : les messages reviennent dans l'historique et
+                    # seront repliés à nouveau à la prochaine question
+                    self._fold_end = self.summarized_count
+                    self._fold_thread = None
+                    return
+                self.history_summary = summary
+                self.summarized_count = end
+    
+    def wait_for_summary(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin du résumé en cours ; retourne False si le délai expire"""
+        thread = self._fold_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+    
+    def _summarize(self, previous: str, messages: List[Dict]) -> Optional[str]:
+        """Résumé glissant mis à jour avec des échanges anciens (None si échec)
+        
+        Le résumé conserve les décisions, hypothèses, quantités et prix
+        convenus.
+        """
+        try:
+            previous = previous or "(aucun)"
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                temperature=0.2,
+                system="Tu tiens le résumé d'une conversation d'estimation de construction.",
+                messages=[{
+                    'role': 'user',
+                    'content': f"""RÉSUMÉ ACTUEL:
+{previous}
+
+NOUVEAUX ÉCHANGES:
+{format_transcript(messages)}
+
+INSTRUCTION:
+Mets le résumé à jour avec les nouveaux échanges. Conserve toutes les décisions, hypothèses, quantités, prix et choix de produits convenus, ainsi que les questions restées ouvertes. Réponds uniquement par le résumé, en liste concise."""
+                }]
+            )
+            self._record_usage(getattr(response, 'usage', None), {'kind': 'summary'})
+            return response.content[0].text
+        except Exception as e:
+            print(f"Erreur lors du résumé de la conversation: {str(e)}")
+            return None
+    
     def get_contextual_response(self, 
                               user_message: str,
                               expert_profile: str,
                               project_context: Dict,
-                              max_history: int = 10) -> str:
+                              max_history: int = 10,
+                              document_index=None) -> str:
         """
         Obtient une réponse contextuelle de l'IA
         
@@ -46,44 +322,17 @@ class AIAssistant:
             expert_profile: Profil d'expert à utiliser
             project_context: Contexte du projet (mesures, etc.)
             max_history: Nombre maximum de messages d'historique à inclure
+                (les plus anciens sont repliés dans le résumé glissant)
+            document_index: Index du PDF chargé (DocumentIndex), pour joindre
+                les passages pertinents
         
         Returns:
             Réponse de l'IA
         """
         try:
-            # Préparer le contexte du projet
-            context_info = self._prepare_project_context(project_context)
-            
-            # Construire le prompt système
-            system_prompt = f"""{expert_profile}
-
-CONTEXTE DU PROJET ACTUEL:
-{context_info}
-
-INSTRUCTIONS:
-- Réponds de manière professionnelle et précise
-- Utilise le contexte du projet pour des réponses pertinentes
-- Reste dans ton domaine d'expertise
-- Fournis des conseils pratiques et applicables
-- Si tu as besoin de plus d'informations, demande-les clairement
-"""
-            
-            # Préparer les messages
-            messages = []
-            
-            # Ajouter l'historique récent
-            history_start = max(0, len(self.conversation_history) - max_history)
-            for msg in self.conversation_history[history_start:]:
-                messages.append({
-                    'role': msg['role'],
-                    'content': msg['content']
-                })
-            
-            # Ajouter le nouveau message
-            messages.append({
-                'role': 'user',
-                'content': user_message
-            })
+            system_prompt, messages, estimate = self._build_chat_request(
+                user_message, expert_profile, project_context, max_history, document_index
+            )
             
             # Appeler l'API Claude
             response = self.client.messages.create(
@@ -94,6 +343,8 @@ INSTRUCTIONS:
                 messages=messages
             )
             
+            self._record_usage(getattr(response, 'usage', None), estimate)
+            
             # Extraire la réponse
             ai_response = response.content[0].text
             
@@ -106,10 +357,53 @@ INSTRUCTIONS:
         except Exception as e:
             return f"Erreur lors de la communication avec l'assistant IA: {str(e)}"
     
+    def stream_contextual_response(self,
+                                   user_message: str,
+                                   expert_profile: str,
+                                   project_context: Dict,
+                                   max_history: int = 10,
+                                   document_index=None) -> Iterator[str]:
+        """
+        Comme get_contextual_response, mais génère le texte au fur et à mesure
+        
+        Les fragments sont produits dès leur réception ; l'échange n'est
+        ajouté à l'historique qu'une fois la réponse complète. En cas
+        d'erreur, le message d'erreur est produit comme dernier fragment.
+        
+        Returns:
+            Générateur de fragments de texte
+        """
+        parts = []
+        try:
+            system_prompt, messages, estimate = self._build_chat_request(
+                user_message, expert_profile, project_context, max_history, document_index
+            )
+            
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=1500,
+                temperature=0.7,
+                system=system_prompt,
+                messages=messages
+            ) as stream:
+                for text in stream.text_stream:
+                    parts.append(text)
+                    yield text
+                self._record_usage(getattr(stream.get_final_message(), 'usage', None), estimate)
+            
+            # Ajouter à l'historique
+            self.add_to_history('user', user_message)
+            self.add_to_history('assistant', ''.join(parts))
+            
+        except Exception as e:
+            separator = "\n\n" if parts else ""
+            yield f"{separator}Erreur lors de la communication avec l'assistant IA: {str(e)}"
+    
     def analyze_pdf_content(self, 
                           pdf_text: str,
                           expert_profile: str,
-                          analysis_type: str = "general") -> str:
+                          analysis_type: str = "general",
+                          use_cache: bool = True) -> str:
         """
         Analyse le contenu textuel d'un PDF
         
@@ -117,15 +411,23 @@ INSTRUCTIONS:
             pdf_text: Texte extrait du PDF
             expert_profile: Profil d'expert à utiliser
             analysis_type: Type d'analyse (general, measurements, materials, etc.)
+            use_cache: Si False, ignore la réponse en cache et la remplace
         
         Returns:
             Analyse de l'IA
         """
         try:
-            # Limiter la taille du texte si nécessaire
+            # Un long document est analysé par morceaux plutôt que tronqué
             max_chars = 10000
             if len(pdf_text) > max_chars:
-                pdf_text = pdf_text[:max_chars] + "... [texte tronqué]"
+                return self.analyze_document(pages_from_text(pdf_text), expert_profile,
+                                             analysis_type, use_cache=use_cache)
+            
+            key = make_key('analysis', self.model, text_hash(expert_profile),
+                           analysis_type, text_hash(pdf_text), 2000, 0.5)
+            cached = self._cached_response(key, use_cache)
+            if cached is not None:
+                return cached
             
             # Construire le prompt selon le type d'analyse
             analysis_prompts = {
@@ -135,37 +437,75 @@ INSTRUCTIONS:
                 "costs": "Extrais toutes les informations de coûts, prix et budget présentes dans le document."
             }
             
-            prompt = f"""{expert_profile}
-
-DOCUMENT À ANALYSER:
-{pdf_text}
-
-INSTRUCTION:
+            # Profil et document en cache : chaque type d'analyse du même
+            # document ne paie que l'instruction
+            system_prompt = self._system_blocks(expert_profile, f"DOCUMENT À ANALYSER:\n{pdf_text}")
+            instruction = f"""INSTRUCTION:
 {analysis_prompts.get(analysis_type, analysis_prompts['general'])}
 
 Fournis une analyse structurée et professionnelle.
-"""
+
+Analyse le document ci-dessus selon les instructions."""
             
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=2000,
                 temperature=0.5,
-                system=prompt,
+                system=system_prompt,
                 messages=[{
                     'role': 'user',
-                    'content': 'Analyse le document ci-dessus selon les instructions.'
+                    'content': instruction
                 }]
             )
+            self._record_usage(getattr(response, 'usage', None))
             
-            return response.content[0].text
+            analysis = response.content[0].text
+            self.response_cache.put(key, analysis, kind='analysis', analysis_type=analysis_type)
+            return analysis
+            
+        except Exception as e:
+            return f"Erreur lors de l'analyse du PDF: {str(e)}"
+    
+    def analyze_document(self,
+                         pages: List[str],
+                         expert_profile: str,
+                         analysis_type: str = "general",
+                         progress: Optional[ProgressCallback] = None,
+                         use_cache: bool = True) -> str:
+        """
+        Analyse un document complet page par page (map-reduce)
+        
+        Args:
+            pages: Texte de chaque page
+            expert_profile: Profil d'expert à utiliser
+            analysis_type: Type d'analyse (general, measurements, materials, etc.)
+            progress: Appelé avec (morceaux analysés, total)
+            use_cache: Si False, ignore les réponses en cache et les remplace
+        
+        Returns:
+            Analyse fusionnée de l'IA
+        """
+        try:
+            key = make_key('document', self.model, text_hash(expert_profile), analysis_type,
+                           [text_hash(page or "") for page in pages])
+            cached = self._cached_response(key, use_cache)
+            if cached is not None:
+                return cached
             
+            analyzer = DocumentAnalyzer(self, expert_profile, analysis_type, use_cache=use_cache)
+            analysis = analyzer.analyze(pages, progress)
+            # Une analyse incomplète n'est pas conservée
+            if not analyzer.missing:
+                self.response_cache.put(key, analysis, kind='document', analysis_type=analysis_type)
+            return analysis
         except Exception as e:
             return f"Erreur lors de l'analyse du PDF: {str(e)}"
     
     def suggest_measurements(self,
                            project_description: str,
                            expert_profile: str,
-                           existing_measurements: List[Dict]) -> str:
+                           existing_measurements: List[Dict],
+                           use_cache: bool = True) -> str:
         """
         Suggère des mesures pertinentes pour le projet
         
@@ -173,6 +513,7 @@ Fournis une analyse structurée et professionnelle.
             project_description: Description du projet
             expert_profile: Profil d'expert à utiliser
             existing_measurements: Mesures déjà effectuées
+            use_cache: Si False, ignore la réponse en cache et la remplace
         
         Returns:
             Suggestions de l'IA
@@ -187,81 +528,45 @@ Fournis une analyse structurée et professionnelle.
                     measurements_text += f"Type: {m.get('type', 'inconnu')} - "
                     measurements_text += f"Valeur: {m.get('value', 0):.2f} {m.get('unit', '')}\n"
             
-            prompt = f"""{expert_profile}
-
-DESCRIPTION DU PROJET:
-{project_description}
-
-{measurements_text}
-
-INSTRUCTION:
+            instruction = """INSTRUCTION:
 En te basant sur la description du projet et les mesures existantes, suggère les mesures supplémentaires qui seraient nécessaires pour compléter l'estimation. Pour chaque suggestion, explique pourquoi elle est importante et comment l'effectuer correctement.
 
 Organise tes suggestions par priorité et par type de travaux.
 """
+            key = make_key('suggestions', self.model, text_hash(expert_profile),
+                           project_description, measurements_text, 1500, 0.6)
+            cached = self._cached_response(key, use_cache)
+            if cached is not None:
+                return cached
             
+            # Profil et instruction en cache ; description et mesures à la fin
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=1500,
                 temperature=0.6,
-                system=prompt,
+                system=self._system_blocks(expert_profile, instruction),
                 messages=[{
                     'role': 'user',
-                    'content': 'Quelles mesures supplémentaires recommandes-tu?'
+                    'content': f"""DESCRIPTION DU PROJET:
+{project_description}
+
+{measurements_text}
+
+Quelles mesures supplémentaires recommandes-tu?"""
                 }]
             )
+            self._record_usage(getattr(response, 'usage', None))
             
-            return response.content[0].text
+            suggestions = response.content[0].text
+            self.response_cache.put(key, suggestions, kind='suggestions')
+            return suggestions
             
         except Exception as e:
             return f"Erreur lors de la génération des suggestions: {str(e)}"
     
     def _prepare_project_context(self, project_context: Dict) -> str:
-        """Prépare le contexte du projet pour l'IA"""
-        context_parts = []
-        
-        # Informations sur le fichier
-        if project_context.get('filename'):
-            context_parts.append(f"Fichier: {project_context['filename']}")
-        
-        # Calibration
-        if project_context.get('calibration'):
-            cal = project_context['calibration']
-            context_parts.append(f"Calibration: {cal['value']} {cal['unit']}")
-        
-        # Mesures
-        measurements = project_context.get('measurements', [])
-        if measurements:
-            context_parts.append(f"\nNombre de mesures: {len(measurements)}")
-            
-            # Grouper par type
-            by_type = {}
-            for m in measurements:
-                m_type = m.get('type', 'inconnu')
-                if m_type not in by_type:
-                    by_type[m_type] = []
-                by_type[m_type].append(m)
-            
-            context_parts.append("\nMesures par type:")
-            for m_type, items in by_type.items():
-                context_parts.append(f"- {m_type.capitalize()}: {len(items)} mesures")
-                
-                # Afficher quelques exemples
-                for item in items[:3]:
-                    label = item.get('label', 'Sans nom')
-                    value = item.get('value', 0)
-                    unit = item.get('unit', '')
-                    product = item.get('product', {})
-                    product_name = product.get('name', 'Aucun produit')
-                    
-                    context_parts.append(f"  • {label}: {value:.2f} {unit} ({product_name})")
-                
-                if len(items) > 3:
-                    context_parts.append(f"  • ... et {len(items) - 3} autres")
-        else:
-            context_parts.append("Aucune mesure effectuée pour le moment")
-        
-        return "\n".join(context_parts)
+        """Prépare le contexte du projet pour l'IA (résumé tenu à jour, taille bornée)"""
+        return self.context_builder.render(project_context, self.catalog)
     
     def get_conversation_summary(self) -> str:
         """Retourne un résumé de la conversation"""
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional
+from anthropic import AsyncAnthropic, APIConnectionError, APIStatusError
+
+# Appels simultanés au modèle pour tout le processus (toutes sessions confondues)
+MAX_CONCURRENT_REQUESTS = int(os.getenv('TAKEOFF_AI_MAX_CONCURRENCY', '8'))
+
+# Débit maximal de requêtes pour tout le processus
+REQUESTS_PER_MINUTE = float(os.getenv('TAKEOFF_AI_REQUESTS_PER_MINUTE', '50'))
+
+# Nouvelles tentatives après une erreur 429, 5xx, de connexion ou un délai dépassé
+MAX_RETRIES = 5
+
+# Attente avant la première nouvelle tentative, doublée à chaque échec (secondes)
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# Délai d'attente par défaut d'une requête (secondes)
+REQUEST_TIMEOUT = 120.0
+
+# Codes HTTP pour lesquels une nouvelle tentative a un sens
+RETRYABLE_STATUS = (408, 409, 429)
+
+def is_retryable(error: Exception) -> bool:
+    """Erreur passagère : surcharge, limite de débit, réseau ou délai dépassé"""
+    if isinstance(error, (APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """En-tête retry-after s'il est présent, sinon attente exponentielle avec gigue"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            return min(BACKOFF_MAX, float(response.headers.get('retry-after')))
+        except (TypeError, ValueError):
+            pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+class TokenBucket:
+    """Seau à jetons asynchrone : au plus rate requêtes par minute, par rafales de capacity"""
+
+    def __init__(self, requests_per_minute: float, capacity: Optional[float] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity or max(1.0, min(requests_per_minute / 6.0, MAX_CONCURRENT_REQUESTS))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, delay: float):
+        """Suspend toutes les requêtes (par ex. après un 429 avec retry-after)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    async def acquire(self):
+        # Une seule boucle d'événements : pas de verrou entre deux await
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncAIClient:
+    """Couche asynchrone au-dessus d'AsyncAnthropic
+
+    Toutes les requêtes passent par le même sémaphore (appels simultanés)
+    et le même seau à jetons (débit) ; les erreurs passagères sont
+    retentées avec une attente exponentielle, un 429 suspendant aussi les
+    autres requêtes pendant la durée demandée par l'API.
+    """
+
+    def __init__(self, client, max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                 requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 max_retries: int = MAX_RETRIES, timeout: float = REQUEST_TIMEOUT):
+        self.client = client
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_minute)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'errors': 0}
+
+    async def _attempts(self, call, kwargs: Dict):
+        kwargs.setdefault('timeout', self.timeout)
+        self.stats['requests'] += 1
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with self._semaphore:
+                    return await call(dict(kwargs))
+            except Exception as e:
+                if getattr(e, '_partial', False) or not is_retryable(e) or attempt == self.max_retries:
+                    self.stats['errors'] += 1
+                    raise
+                delay = retry_delay(e, attempt)
+                if getattr(e, 'status_code', None) == 429:
+                    self.stats['rate_limited'] += 1
+                    self.bucket.pause(delay)
+                self.stats['retries'] += 1
+                await asyncio.sleep(delay)
+
+    async def create(self, **kwargs):
+        """messages.create avec limites de débit et nouvelles tentatives"""
+        async def call(params):
+            return await asyncio.wait_for(self.client.messages.create(**params), params['timeout'])
+        return await self._attempts(call, kwargs)
+
+    async def stream(self, on_text, **kwargs):
+        """messages.stream : on_text reçoit chaque fragment, retourne le message final
+
+        Seule une erreur survenue avant le premier fragment est retentée.
+        """
+        async def call(params):
+            started = False
+            try:
+                async with self.client.messages.stream(**params) as stream:
+                    async for text in stream.text_stream:
+                        started = True
+                        on_text(text)
+                    return await stream.get_final_message()
+            except Exception as e:
+                e._partial = started
+                raise
+        return await self._attempts(call, kwargs)
+
+class _EventLoopThread:
+    """Boucle d'événements du processus, dans un thread dédié"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, name="ai-client", daemon=True)
+        thread.start()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+_loop_thread: Optional[_EventLoopThread] = None
+_loop_lock = threading.Lock()
+
+def _event_loop() -> _EventLoopThread:
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _EventLoopThread()
+        return _loop_thread
+
+_DONE = object()
+
+class _SyncStream:
+    """Équivalent synchrone du gestionnaire de contexte messages.stream"""
+
+    def __init__(self, async_client: AsyncAIClient, kwargs: Dict):
+        self._async_client = async_client
+        self._kwargs = kwargs
+        self._queue: queue.Queue = queue.Queue()
+        self._future = None
+
+    def __enter__(self):
+        async def run():
+            try:
+                return await self._async_client.stream(self._queue.put, **self._kwargs)
+            finally:
+                self._queue.put(_DONE)
+        self._future = _event_loop().submit(run())
+        return self
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        while True:
+            text = self._queue.get()
+            if text is _DONE:
+                break
+            yield text
+        # Propage l'erreur éventuelle de la requête
+        self._future.result()
+
+    def get_final_message(self):
+        return self._future.result()
+
+    def __exit__(self, *exc):
+        if not self._future.done():
+            self._future.cancel()
+        return False
+
+class _SyncMessages:
+    def __init__(self, async_client: AsyncAIClient):
+        self._async_client = async_client
+
+    def create(self, **kwargs):
+        return _event_loop().submit(self._async_client.create(**kwargs)).result()
+
+    def stream(self, **kwargs) -> _SyncStream:
+        return _SyncStream(self._async_client, kwargs)
+
+class SyncAIClient:
+    """Client synchrone pour l'interface (mêmes appels que Anthropic.messages)
+
+    Les requêtes s'exécutent sur la boucle d'événements partagée ; le
+    thread du script Streamlit attend seulement le résultat.
+    """
+
+    def __init__(self, async_client: AsyncAIClient):
+        self.async_client = async_client
+        self.messages = _SyncMessages(async_client)
+
+    @property
+    def stats(self) -> Dict:
+        return self.async_client.stats
+
+_clients: Dict[str, SyncAIClient] = {}
+_clients_lock = threading.Lock()
+
+def get_ai_client(api_key: str) -> SyncAIClient:
+    """Client partagé du processus pour une clé API
+
+    Les nouvelles tentatives sont gérées ici ; celles du SDK sont
+    désactivées pour ne pas les multiplier.
+    """
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = SyncAIClient(AsyncAIClient(
+                AsyncAnthropic(api_key=api_key, max_retries=0)
+            ))
+        return _clients[api_key]
@@ -0,0 +1,282 @@
+"""Pré-analyse de nuit de dossiers d'appel d'offres par l'API Message Batches
+
+Utilisation :
+    python -m models.batch_analysis travail.json plans1.pdf plans2.pdf \\
+        --profile profiles/entrepreneur_general.txt --project appel_offres.tak
+
+Relancer la même commande après un arrêt reprend le travail là où il
+s'était arrêté (lots déjà soumis, résultats déjà récupérés).
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from models.ai_assistant import AIAssistant, DEFAULT_MODEL
+from models.document_analysis import MAP_INSTRUCTIONS
+from models.document_index import document_hash
+from models.response_cache import text_hash
+
+# Nombre maximal de requêtes par lot soumis
+BATCH_MAX_REQUESTS = 10000
+
+# Intervalle entre deux vérifications de l'état des lots (secondes)
+BATCH_POLL_INTERVAL = 60.0
+
+# Jetons de sortie par page analysée
+BATCH_MAX_TOKENS = 1500
+
+# Soumissions d'une même page avant de la marquer en échec
+BATCH_MAX_ATTEMPTS = 2
+
+PAGE_FORMAT_INSTRUCTIONS = """Réponds uniquement par un objet JSON de la forme :
+{"resume": "résumé de la page", "elements": [{"categorie": "...", "description": "...", "quantite": nombre ou null, "unite": "..."}]}"""
+
+ProgressCallback = Callable[[Dict], None]
+
+def parse_page_result(text: str) -> Dict:
+    """Résultat structuré d'une page ; le texte brut devient le résumé si le JSON est invalide"""
+    start, end = text.find('{'), text.rfind('}')
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            if isinstance(data, dict):
+                return {'resume': str(data.get('resume', '')),
+                        'elements': [e for e in data.get('elements') or [] if isinstance(e, dict)]}
+        except ValueError:
+            pass
+    return {'resume': text.strip(), 'elements': []}
+
+def _read_pages(pdf_path: str) -> List[str]:
+    from utils.pdf_processor import PDFProcessor
+    processor = PDFProcessor()
+    if not processor.load_pdf(pdf_path):
+        raise IOError(f"Impossible d'ouvrir {pdf_path}")
+    return [processor.get_page_text(i) for i in range(processor.get_page_count())]
+
+class BatchAnalysisJob:
+    """Analyse page par page d'un ensemble de documents, en lots asynchrones
+
+    L'état du travail (documents, requêtes, lots soumis, résultats) est
+    enregistré dans state_file après chaque étape : un travail interrompu
+    est repris avec load(). Les pages en échec ou expirées sont soumises à
+    nouveau jusqu'à BATCH_MAX_ATTEMPTS fois.
+    """
+
+    def __init__(self, client, state_file: str, expert_profile: str = "",
+                 analysis_type: str = "general", model: str = DEFAULT_MODEL):
+        self.client = client
+        self.state_file = state_file
+        self.expert_profile = expert_profile
+        self.state = {
+            'model': model,
+            'analysis_type': analysis_type if analysis_type in MAP_INSTRUCTIONS else "general",
+            'profile_hash': text_hash(expert_profile),
+            'documents': {},
+            'requests': {},
+            'batches': {},
+            'results': {}
+        }
+
+    @classmethod
+    def load(cls, client, state_file: str, expert_profile: str = "",
+             analysis_type: str = "general", model: str = DEFAULT_MODEL) -> 'BatchAnalysisJob':
+        """Reprend le travail enregistré dans state_file, ou en crée un nouveau"""
+        job = cls(client, state_file, expert_profile, analysis_type, model)
+        if os.path.exists(state_file):
+            with open(state_file, 'r', encoding='utf-8') as f:
+                job.state = json.load(f)
+            if job.state['profile_hash'] != text_hash(expert_profile):
+                raise ValueError("Le profil d'expert a changé depuis le début de ce travail")
+        return job
+
+    def save(self):
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    @property
+    def pending(self) -> List[str]:
+        return [custom_id for custom_id in self.state['requests'] if custom_id not in self.state['results']]
+
+    def add_document(self, pdf_path: str, pages: Optional[List[str]] = None) -> int:
+        """Ajoute les pages non vides d'un document ; retourne le nombre de pages ajoutées
+
+        Un document déjà présent (même contenu) n'est pas ajouté deux fois.
+        """
+        document_id = document_hash(pdf_path)[:16]
+        if document_id in self.state['documents']:
+            return 0
+        pages = pages if pages is not None else _read_pages(pdf_path)
+        self.state['documents'][document_id] = {
+            'path': os.path.abspath(pdf_path),
+            'filename': os.path.basename(pdf_path),
+            'pages': len(pages)
+        }
+        added = 0
+        for number, text in enumerate(pages, start=1):
+            if text and text.strip():
+                # custom_id : lettres, chiffres, - et _ (64 caractères au plus)
+                self.state['requests'][f"{document_id}-p{number:05d}"] = {
+                    'document': document_id, 'page': number, 'batch_id': None, 'attempts': 0
+                }
+                added += 1
+        self.save()
+        return added
+
+    def _params(self, text: str, number: int) -> Dict:
+        instruction = MAP_INSTRUCTIONS[self.state['analysis_type']]
+        return {
+            'model': self.state['model'],
+            'max_tokens': BATCH_MAX_TOKENS,
+            'temperature': 0.3,
+            # Profil et consignes identiques pour toutes les pages : préfixe en cache
+            'system': AIAssistant._system_blocks(
+                self.expert_profile, f"{instruction}\n\n{PAGE_FORMAT_INSTRUCTIONS}"
+            ),
+            'messages': [{'role': 'user', 'content': f"--- Page {number} ---\n{text}"}]
+        }
+
+    def submit(self) -> List[str]:
+        """Soumet les pages sans lot en cours ; retourne les identifiants des nouveaux lots"""
+        waiting = [custom_id for custom_id in self.pending
+                   if self.state['requests'][custom_id]['batch_id'] is None]
+        batch_ids = []
+        page_texts: Dict[str, List[str]] = {}
+        for start in range(0, len(waiting), BATCH_MAX_REQUESTS):
+            requests = []
+            for custom_id in waiting[start:start + BATCH_MAX_REQUESTS]:
+                request = self.state['requests'][custom_id]
+                document_id = request['document']
+                if document_id not in page_texts:
+                    page_texts[document_id] = _read_pages(self.state['documents'][document_id]['path'])
+                text = page_texts[document_id][request['page'] - 1]
+                requests.append({'custom_id': custom_id, 'params': self._params(text, request['page'])})
+
+            batch = self.client.messages.batches.create(requests=requests)
+            self.state['batches'][batch.id] = {'status': batch.processing_status, 'collected': False,
+                                               'submitted': datetime.now().isoformat()}
+            for request in requests:
+                entry = self.state['requests'][request['custom_id']]
+                entry['batch_id'] = batch.id
+                entry['attempts'] += 1
+            # Enregistré aussitôt : un redémarrage ne soumet pas le lot une seconde fois
+            self.save()
+            batch_ids.append(batch.id)
+        return batch_ids
+
+    def poll(self) -> bool:
+        """Met à jour l'état des lots et récupère les résultats des lots terminés
+
+        Retourne True quand toutes les pages ont un résultat.
+        """
+        for batch_id, batch_state in self.state['batches'].items():
+            if batch_state['collected']:
+                continue
+            batch = self.client.messages.batches.retrieve(batch_id)
+            batch_state['status'] = batch.processing_status
+            if batch.processing_status == 'ended':
+                self._collect(batch_id)
+                batch_state['collected'] = True
+            self.save()
+        return not self.pending
+
+    def _collect(self, batch_id: str):
+        for entry in self.client.messages.batches.results(batch_id):
+            request = self.state['requests'].get(entry.custom_id)
+            if request is None or entry.custom_id in self.state['results']:
+                continue
+            result = entry.result
+            if result.type == 'succeeded':
+                text = "".join(getattr(block, 'text', '') for block in result.message.content)
+                self.state['results'][entry.custom_id] = dict(
+                    parse_page_result(text), status='succeeded', document=request['document'],
+                    page=request['page']
+                )
+            elif request['attempts'] < BATCH_MAX_ATTEMPTS:
+                # Erreur, expiration ou annulation : la page repart au prochain submit
+                request['batch_id'] = None
+            else:
+                error = getattr(getattr(getattr(result, 'error', None), 'error', None), 'message', result.type)
+                self.state['results'][entry.custom_id] = {
+                    'status': result.type, 'error': str(error), 'document': request['document'],
+                    'page': request['page'], 'resume': '', 'elements': []
+                }
+
+    def run(self, poll_interval: float = BATCH_POLL_INTERVAL,
+            progress: Optional[ProgressCallback] = None, sleep=time.sleep) -> Dict:
+        """Soumet, attend et récupère jusqu'à ce que toutes les pages aient un résultat"""
+        while True:
+            self.submit()
+            done = self.poll()
+            if progress:
+                progress(self.summary())
+            if done:
+                return self.state['results']
+            sleep(poll_interval)
+
+    def summary(self) -> Dict:
+        results = self.state['results'].values()
+        return {
+            'documents': len(self.state['documents']),
+            'pages': len(self.state['requests']),
+            'succeeded': sum(1 for r in results if r['status'] == 'succeeded'),
+            'failed': sum(1 for r in results if r['status'] != 'succeeded'),
+            'pending': len(self.pending),
+            'batches': len(self.state['batches'])
+        }
+
+    def apply_to_project(self, project_data: Dict) -> Dict:
+        """Ajoute les résultats au projet, sous 'ai_page_analyses', par document puis par page"""
+        analyses = project_data.setdefault('ai_page_analyses', {})
+        for document_id, document in self.state['documents'].items():
+            analyses[document_id] = {
+                'filename': document['filename'],
+                'analysis_type': self.state['analysis_type'],
+                'model': self.state['model'],
+                'pages': {}
+            }
+        for result in self.state['results'].values():
+            page_result = {k: v for k, v in result.items() if k not in ('document', 'page')}
+            # Clés texte : le projet est enregistré en JSON
+            analyses[result['document']]['pages'][str(result['page'])] = page_result
+        return project_data
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Analyse par lots des pages de documents PDF")
+    parser.add_argument('state_file', help="Fichier d'état du travail (créé ou repris)")
+    parser.add_argument('pdfs', nargs='*', help="Documents à ajouter au travail")
+    parser.add_argument('--profile', help="Fichier du profil d'expert")
+    parser.add_argument('--type', default="general", choices=sorted(MAP_INSTRUCTIONS), dest='analysis_type')
+    parser.add_argument('--project', help="Projet .tak / .takdb où écrire les résultats")
+    parser.add_argument('--poll', type=float, default=BATCH_POLL_INTERVAL, help="Intervalle de vérification (s)")
+    parser.add_argument('--base-url', help="URL de l'API (par ex. serveur local de test)")
+    args = parser.parse_args(argv)
+
+    from anthropic import Anthropic
+    client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY') or 'local', base_url=args.base_url)
+    profile = ""
+    if args.profile:
+        with open(args.profile, 'r', encoding='utf-8') as f:
+            profile = f.read()
+
+    job = BatchAnalysisJob.load(client, args.state_file, profile, args.analysis_type)
+    for pdf_path in args.pdfs:
+        print(f"{os.path.basename(pdf_path)} : {job.add_document(pdf_path)} pages ajoutées")
+    job.run(args.poll, progress=lambda s: print(
+        f"{s['succeeded']} pages analysées, {s['failed']} en échec, {s['pending']} en attente"
+    ))
+
+    if args.project:
+        from utils.project_manager import ProjectManager
+        manager = ProjectManager()
+        project_data = (manager.load_project(args.project) if os.path.exists(args.project)
+                        else {'filename': None, 'pdf_path': None, 'measurements': [],
+                              'calibration': {'value': 1.0, 'unit': 'cm'}})
+        if project_data is not None and manager.save_project(args.project, job.apply_to_project(project_data)):
+            print(f"Résultats écrits dans {args.project}")
+
+if __name__ == '__main__':
+    main()
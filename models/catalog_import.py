@@ -0,0 +1,208 @@
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import date
+from itertools import chain
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from models.price_history import apply_price
+
+# Nombre de lignes validées puis écrites ensemble dans le catalogue
+IMPORT_BATCH = 5000
+
+# En-têtes acceptés pour chaque champ (comparés en minuscules)
+COLUMN_ALIASES = {
+    'category': ('category', 'catégorie', 'categorie'),
+    'name': ('name', 'nom', 'produit', 'product'),
+    'sku': ('sku', 'code', 'code produit'),
+    'dimensions': ('dimensions',),
+    'price': ('price', 'prix', 'prix unitaire'),
+    'price_unit': ('price_unit', 'unit', 'unité', 'unite', 'unité de prix'),
+    'color': ('color', 'couleur'),
+    'effective_date': ('effective_date', 'date', "date d'effet")
+}
+
+# Valeurs par défaut des nouveaux produits (voir ProductCatalog.add_product)
+NEW_PRODUCT_DEFAULTS = {'dimensions': '', 'price_unit': 'pi²', 'color': '#CCCCCC'}
+
+# Nombre maximal de messages d'erreur conservés dans le rapport
+MAX_ERRORS = 50
+
+ProgressCallback = Callable[[int, int, Dict], None]
+
+def _open_text(file_obj) -> io.TextIOBase:
+    """Flux texte UTF-8 sur un fichier binaire, décompressé s'il est en gzip"""
+    if isinstance(file_obj, io.TextIOBase):
+        return file_obj
+    position = file_obj.tell()
+    head = file_obj.read(2)
+    file_obj.seek(position)
+    if head == b'\x1f\x8b':
+        file_obj = gzip.GzipFile(fileobj=file_obj)
+    return io.TextIOWrapper(file_obj, encoding='utf-8-sig', newline='')
+
+def _normalize_record(record: Dict) -> Dict:
+    fields = {}
+    lowered = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            value = lowered.get(alias)
+            if value not in (None, ''):
+                fields[field] = value.strip() if isinstance(value, str) else value
+                break
+    return fields
+
+def iter_supplier_records(text_stream, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """Génère (numéro de ligne, champs) pour un fichier CSV ou JSON lines"""
+    if fmt == 'csv':
+        # Séparateur déduit de la ligne d'en-tête (les exports Excel français utilisent ;)
+        header = text_stream.readline()
+        delimiter = max(',;\t', key=header.count)
+        reader = csv.DictReader(chain([header], text_stream), delimiter=delimiter)
+        for record in reader:
+            yield reader.line_num, _normalize_record(record)
+    else:
+        for line_number, line in enumerate(text_stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, {'_error': f"JSON invalide ({e.msg})"}
+                continue
+            if not isinstance(record, dict):
+                yield line_number, {'_error': "objet JSON attendu"}
+                continue
+            yield line_number, _normalize_record(record)
+
+def validate_record(fields: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """Retourne (champs validés, None) ou (None, message d'erreur)"""
+    if '_error' in fields:
+        return None, fields['_error']
+    if not fields.get('category') or not fields.get('name'):
+        return None, "catégorie et nom requis"
+    if 'price' in fields:
+        try:
+            price = float(str(fields['price']).replace('$', '').replace(' ', '').replace(',', '.'))
+        except ValueError:
+            return None, f"prix invalide : {fields['price']!r}"
+        if price < 0:
+            return None, f"prix négatif : {price}"
+        fields['price'] = price
+    if 'effective_date' in fields:
+        try:
+            fields['effective_date'] = date.fromisoformat(str(fields['effective_date'])[:10]).isoformat()
+        except ValueError:
+            return None, f"date d'effet invalide : {fields['effective_date']!r}"
+    for key in ('category', 'name', 'sku', 'dimensions', 'price_unit', 'color'):
+        if key in fields:
+            fields[key] = str(fields[key])
+    return fields, None
+
+def _merge(existing: Optional[Dict], fields: Dict) -> Dict:
+    """Les champs absents du fichier gardent leur valeur actuelle"""
+    data = dict(existing) if existing else dict(NEW_PRODUCT_DEFAULTS, price=0.0)
+    for key, value in fields.items():
+        if key not in ('category', 'name', 'effective_date'):
+            data[key] = value
+    if existing and 'price' in fields and fields['price'] != existing.get('price'):
+        # Nouveau prix daté : l'ancien reste dans l'historique
+        data = apply_price({**data, 'price': existing.get('price', 0),
+                            'price_history': existing.get('price_history')},
+                           fields['price'], fields.get('effective_date'))
+    return data
+
+class SupplierImport:
+    """Import en continu d'une liste de prix fournisseur (CSV ou JSON lines)
+
+    Le fichier est lu ligne par ligne ; les lignes valides sont regroupées
+    par lots de IMPORT_BATCH et écrites avec catalog.upsert_products, une
+    transaction par lot pour le catalogue SQLite. Seul le lot courant est
+    en mémoire. Chaque ligne est comparée au produit existant : les champs
+    absents sont conservés et, avec only_changed, les produits identiques
+    ne sont pas réécrits.
+    """
+
+    def __init__(self, catalog, only_changed: bool = True, batch_size: int = IMPORT_BATCH,
+                 progress: Optional[ProgressCallback] = None):
+        self.catalog = catalog
+        self.only_changed = only_changed
+        self.batch_size = batch_size
+        self.progress = progress
+        self.report = {'rows': 0, 'added': 0, 'updated': 0, 'unchanged': 0,
+                       'invalid': 0, 'errors': []}
+
+    def _error(self, line_number: int, message: str):
+        self.report['invalid'] += 1
+        if len(self.report['errors']) < MAX_ERRORS:
+            self.report['errors'].append(f"Ligne {line_number} : {message}")
+
+    def _flush(self, batch: List[Tuple[str, str, Dict]]):
+        if batch:
+            self.catalog.upsert_products(batch)
+            batch.clear()
+
+    def run(self, file_obj, fmt: str, total_bytes: int = 0) -> Dict:
+        """Importe le fichier et retourne le rapport (compteurs et erreurs)"""
+        raw = file_obj
+        text_stream = _open_text(file_obj)
+        batch = []
+        # Produits du lot pas encore écrits : une ligne répétée dans le
+        # fichier voit la version de la ligne précédente
+        pending: Dict[Tuple[str, str], Dict] = {}
+        for line_number, fields in iter_supplier_records(text_stream, fmt):
+            self.report['rows'] += 1
+            fields, error = validate_record(fields)
+            if error:
+                self._error(line_number, error)
+                continue
+
+            category, name = fields['category'], fields['name']
+            key = (category, name)
+            existing = pending[key] if key in pending else self.catalog.get_product(category, name)
+            data = _merge(existing, fields)
+            if existing is None:
+                self.report['added'] += 1
+            elif data == existing:
+                self.report['unchanged'] += 1
+                if self.only_changed:
+                    continue
+            else:
+                self.report['updated'] += 1
+            batch.append((category, name, data))
+            pending[key] = data
+
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                pending.clear()
+                if self.progress:
+                    self.progress(_position(raw), total_bytes, self.report)
+
+        self._flush(batch)
+        self.catalog.save_catalog()
+        if self.progress:
+            self.progress(total_bytes or _position(raw), total_bytes, self.report)
+        return self.report
+
+def _position(file_obj) -> int:
+    try:
+        return file_obj.tell()
+    except (OSError, ValueError):
+        return 0
+
+def detect_format(filename: str) -> str:
+    """'jsonl' pour .jsonl / .ndjson (éventuellement .gz), sinon 'csv'"""
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def import_supplier_file(catalog, filepath: str, only_changed: bool = True,
+                         progress: Optional[ProgressCallback] = None) -> Dict:
+    """Importe une liste de prix fournisseur depuis un fichier sur disque"""
+    with open(filepath, 'rb') as f:
+        return SupplierImport(catalog, only_changed, progress=progress).run(
+            f, detect_format(filepath), os.path.getsize(filepath)
+        )
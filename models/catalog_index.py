@@ -0,0 +1,236 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+# Longueur des n-grammes utilisés pour la recherche de sous-chaînes
+NGRAM = 3
+
+# Au-delà d'un candidat pour SCAN_RATIO noms, les noms sont parcourus dans
+# l'ordre du classement plutôt que triés : la limite est vite atteinte
+SCAN_RATIO = 16
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+class _FoldTable(dict):
+    """Table de str.translate remplie à la demande, caractère par caractère"""
+
+    def __missing__(self, code: int) -> str:
+        folded = ''.join(
+            c for c in unicodedata.normalize('NFD', chr(code))
+            if unicodedata.category(c) != 'Mn'  # Mn = accents
+        )
+        self[code] = folded
+        return folded
+
+_FOLD_TABLE = _FoldTable()
+
+def fold_accents(text: str) -> str:
+    """Texte en minuscules sans accents (é -> e, Ç -> c)"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return text.translate(_FOLD_TABLE)
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte replié en mots alphanumériques"""
+    return _TOKEN_RE.findall(fold_accents(text))
+
+def _ngrams(token: str, size: int = NGRAM) -> Set[str]:
+    return {token[i:i + size] for i in range(len(token) - size + 1)}
+
+def _grams(token: str) -> Set[str]:
+    """Trigrammes et bigrammes d'un mot (les bigrammes servent aux termes de 2 caractères)"""
+    return _ngrams(token) | _ngrams(token, 2)
+
+ProductKey = Tuple[str, str]
+
+class CatalogIndex:
+    """Index inversé du catalogue pour la recherche pendant la saisie
+
+    Chaque nom de produit est replié (minuscules, sans accents) et découpé
+    en mots. Les résultats sont classés par niveaux, du plus pertinent au
+    moins pertinent, et la recherche s'arrête dès que la limite est
+    atteinte :
+
+    1. noms qui commencent par la requête (liste triée des noms) ;
+    2. noms dont un mot commence par chaque terme (liste triée des mots) ;
+    3. noms qui contiennent chaque terme (index de trigrammes et de
+       bigrammes ; si tous les termes font un caractère, parcours des noms
+       du plus court au plus long, arrêté dès que la limite est atteinte).
+    """
+
+    def __init__(self):
+        self._ngrams: Dict[str, Set[ProductKey]] = {}
+        self._folded: Dict[ProductKey, str] = {}
+        self._tokens: Dict[ProductKey, List[str]] = {}
+        # Listes triées pour les recherches par préfixe (bisect)
+        self._names: List[Tuple[str, ProductKey]] = []
+        self._words: List[Tuple[str, str, ProductKey]] = []
+        # Noms dans l'ordre de classement du niveau 3 (longueur, nom)
+        self._by_length: List[Tuple[int, str, ProductKey]] = []
+
+    def __len__(self) -> int:
+        return len(self._folded)
+
+    def add(self, category: str, name: str):
+        """Indexe un produit (remplace l'entrée existante)"""
+        key = (category, name)
+        if key in self._folded:
+            self.remove(category, name)
+        folded = fold_accents(name)
+        tokens = sorted(set(tokenize(name)))
+        self._folded[key] = folded
+        self._tokens[key] = tokens
+        insort(self._names, (folded, key))
+        insort(self._by_length, (len(folded), folded, key))
+        for token in tokens:
+            insort(self._words, (token, folded, key))
+            for gram in _grams(token):
+                self._ngrams.setdefault(gram, set()).add(key)
+
+    def remove(self, category: str, name: str):
+        """Retire un produit de l'index"""
+        key = (category, name)
+        folded = self._folded.pop(key, None)
+        if folded is None:
+            return
+        tokens = self._tokens.pop(key)
+        _discard_sorted(self._names, (folded, key))
+        _discard_sorted(self._by_length, (len(folded), folded, key))
+        for token in tokens:
+            _discard_sorted(self._words, (token, folded, key))
+            for gram in _grams(token):
+                postings = self._ngrams.get(gram)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del self._ngrams[gram]
+
+    def remove_category(self, category: str):
+        """Retire tous les produits d'une catégorie"""
+        for key in [key for key in self._folded if key[0] == category]:
+            self.remove(*key)
+
+    def rebuild(self, catalog: Dict[str, Dict[str, Dict]]):
+        """Reconstruit l'index à partir du catalogue complet"""
+        self.__init__()
+        for category, products in catalog.items():
+            for name in products:
+                key = (category, name)
+                folded = fold_accents(name)
+                tokens = sorted(set(_TOKEN_RE.findall(folded)))
+                self._folded[key] = folded
+                self._tokens[key] = tokens
+                self._names.append((folded, key))
+                self._by_length.append((len(folded), folded, key))
+                for token in tokens:
+                    self._words.append((token, folded, key))
+                    for gram in _grams(token):
+                        self._ngrams.setdefault(gram, set()).add(key)
+        self._names.sort()
+        self._words.sort()
+        self._by_length.sort()
+
+    def _substring_candidates(self, term: str) -> Set[ProductKey]:
+        postings = [self._ngrams.get(gram) for gram in _ngrams(term, min(len(term), NGRAM))]
+        if not postings or any(p is None for p in postings):
+            return set()
+        postings.sort(key=len)
+        result = set(postings[0])
+        for p in postings[1:]:
+            result &= p
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[ProductKey]:
+        """Produits dont le nom contient tous les termes de la requête, classés"""
+        folded_query = ' '.join(fold_accents(query).split())
+        terms = _TOKEN_RE.findall(folded_query)
+        if not terms:
+            return []
+        limit = limit if limit is not None else len(self._folded)
+        results: List[ProductKey] = []
+        seen: Set[ProductKey] = set()
+
+        def accept(key, check):
+            if key not in seen and check(key):
+                seen.add(key)
+                results.append(key)
+            return len(results) >= limit
+
+        def has_all_terms(key):
+            folded = self._folded[key]
+            return all(term in folded for term in terms)
+
+        # 1. Le nom commence par la requête
+        names = self._names
+        for i in range(bisect_left(names, (folded_query,)), len(names)):
+            folded, key = names[i]
+            if not folded.startswith(folded_query):
+                break
+            if accept(key, has_all_terms):
+                return results
+
+        # 2. Un mot du nom commence par chaque terme
+        words = self._words
+        # Plages de mots par terme, de la plus courte à la plus longue
+        ranges = sorted(
+            ((bisect_left(words, (term,)), bisect_left(words, (term + '\uffff',)), term)
+             for term in set(terms)),
+            key=lambda r: r[1] - r[0]
+        )
+        start, end, _term = ranges[0]
+        if len(ranges) == 1:
+            # Un seul terme : la liste triée donne directement l'ordre
+            for i in range(start, end):
+                if accept(words[i][2], bool):
+                    return results
+        else:
+            keys = {words[i][2] for i in range(start, end)}
+            for _start, _end, term in ranges[1:]:
+                # Filtrer les clés retenues plutôt que d'énumérer une plage plus longue
+                keys = {k for k in keys if any(token.startswith(term) for token in self._tokens[k])}
+                if not keys:
+                    break
+            keys -= seen
+            for _length, _folded, key in heapq.nsmallest(
+                    limit - len(results), ((len(self._folded[k]), self._folded[k], k) for k in keys)):
+                accept(key, bool)
+            if len(results) >= limit:
+                return results
+
+        # 3. Le nom contient chaque terme (n-grammes, puis vérification)
+        candidates = None
+        for term in sorted(terms, key=len, reverse=True):
+            if len(term) == 1:
+                break
+            found = self._substring_candidates(term)
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return results
+        if candidates is None or len(candidates) * SCAN_RATIO > len(self._by_length):
+            # Termes d'un caractère ou très fréquents ("pi", "x4") : parcours
+            # dans l'ordre du classement, arrêté dès que la limite est atteinte
+            for _length, folded, key in self._by_length:
+                if (key not in seen and (candidates is None or key in candidates)
+                        and all(term in folded for term in terms)):
+                    results.append(key)
+                    if len(results) >= limit:
+                        break
+            return results
+        candidates -= seen
+        matches = [
+            (len(self._folded[key]), self._folded[key], key)
+            for key in candidates if has_all_terms(key)
+        ]
+        for _length, _folded, key in heapq.nsmallest(limit - len(results), matches):
+            results.append(key)
+        return results
+
+def _discard_sorted(items: list, item):
+    index = bisect_left(items, item)
+    if index < len(items) and items[index] == item:
+        del items[index]
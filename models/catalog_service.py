@@ -0,0 +1,129 @@
+import threading
+from typing import Callable, Dict, List, Optional
+from models.product_catalog import open_product_catalog
+
+CatalogListener = Callable[[int], None]
+
+class CatalogService:
+    """Catalogue unique partagé par toutes les sessions du processus
+
+    Les écritures sont sérialisées par un verrou et incrémentent la
+    version ; chaque session compare la version qu'elle a vue pour savoir
+    si le catalogue a changé depuis son dernier rerun. Les lectures ne
+    prennent pas le verrou : ProductCatalog remplace ses dictionnaires au
+    lieu de les modifier (copie sur écriture), un lecteur garde donc un
+    instantané cohérent, et SQLite isole les lectures des écritures.
+    Seule la recherche, qui parcourt l'index en mémoire, est sérialisée.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.version = 0
+        self._lock = threading.RLock()
+        self._listeners: List[CatalogListener] = []
+
+    @property
+    def catalog_file(self) -> str:
+        return self.catalog.catalog_file
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.catalog.is_dirty
+
+    def subscribe(self, listener: CatalogListener):
+        """Appelle listener(version) après chaque modification"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: CatalogListener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def changed_since(self, version: Optional[int]) -> bool:
+        """Indique si le catalogue a été modifié depuis la version donnée"""
+        return version != self.version
+
+    def _write(self, method: str, *args, **kwargs):
+        with self._lock:
+            result = getattr(self.catalog, method)(*args, **kwargs)
+            if result:
+                self.version += 1
+                for listener in list(self._listeners):
+                    try:
+                        listener(self.version)
+                    except Exception as e:
+                        print(f"Erreur lors de la notification du catalogue: {str(e)}")
+            return result
+
+    # Lecture
+
+    def get_categories(self) -> List[str]:
+        return self.catalog.get_categories()
+
+    def get_products_by_category(self, category: str) -> Dict[str, Dict]:
+        return self.catalog.get_products_by_category(category)
+
+    def get_product(self, category: str, product_name: str) -> Optional[Dict]:
+        return self.catalog.get_product(category, product_name)
+
+    def search_products(self, query: str, limit: Optional[int] = None) -> List[tuple]:
+        with self._lock:
+            return self.catalog.search_products(query, limit)
+
+    def export_catalog(self, file_path: str) -> bool:
+        return self.catalog.export_catalog(file_path)
+
+    def export_catalog_to_string(self) -> str:
+        return self.catalog.export_catalog_to_string()
+
+    # Écriture
+
+    def add_product(self, *args, **kwargs) -> bool:
+        return self._write('add_product', *args, **kwargs)
+
+    def update_product(self, *args, **kwargs) -> bool:
+        """Met à jour un produit ; un changement de prix est ajouté à l'historique
+
+        Une seule écriture (un seul remplacement du catalogue, une seule
+        version) : les sessions ne voient jamais le nouveau prix sans son
+        historique.
+        """
+        return self._write('update_product', *args, **kwargs)
+
+    def delete_product(self, *args, **kwargs) -> bool:
+        return self._write('delete_product', *args, **kwargs)
+
+    def upsert_products(self, products) -> int:
+        return self._write('upsert_products', products)
+
+    def add_category(self, category: str) -> bool:
+        return self._write('add_category', category)
+
+    def delete_category(self, category: str) -> bool:
+        return self._write('delete_category', category)
+
+    def import_catalog(self, file_path: str) -> bool:
+        return self._write('import_catalog', file_path)
+
+    def import_catalog_from_file(self, file_obj) -> bool:
+        return self._write('import_catalog_from_file', file_obj)
+
+    def save_catalog(self) -> bool:
+        with self._lock:
+            return self.catalog.save_catalog()
+
+_services: Dict[str, CatalogService] = {}
+_services_lock = threading.Lock()
+
+def get_catalog_service(catalog_file: Optional[str] = None) -> CatalogService:
+    """Service de catalogue partagé du processus (un par fichier de catalogue)
+
+    Le catalogue n'est chargé qu'à la première demande ; les sessions
+    suivantes réutilisent la même instance.
+    """
+    with _services_lock:
+        key = catalog_file or ''
+        if key not in _services:
+            _services[key] = CatalogService(open_product_catalog(catalog_file))
+        return _services[key]
@@ -0,0 +1,222 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+from models.response_cache import make_key, text_hash
+
+# Taille visée d'un morceau de document envoyé au modèle (caractères)
+CHUNK_CHARS = 12000
+
+# Analyses partielles regroupées par appel de réduction (caractères)
+REDUCE_CHARS = 40000
+
+# Appels simultanés au modèle pendant la phase d'analyse des morceaux
+ANALYSIS_WORKERS = 4
+
+# Durée maximale d'une analyse complète ; les morceaux restants sont signalés
+ANALYSIS_DEADLINE = 300.0
+
+# Délai d'attente d'un appel individuel au modèle (secondes)
+CALL_TIMEOUT = 120.0
+
+MAP_INSTRUCTIONS = {
+    "general": "Résume les éléments importants de cet extrait pour un projet de construction.",
+    "measurements": "Relève toutes les mesures, dimensions et quantités mentionnées dans cet extrait.",
+    "materials": "Liste les matériaux, produits et équipements mentionnés dans cet extrait avec leurs spécifications.",
+    "costs": "Relève les informations de coûts, prix et budget présentes dans cet extrait."
+}
+
+REDUCE_INSTRUCTIONS = {
+    "general": "Fournis un résumé structuré des éléments importants pour le projet de construction.",
+    "measurements": "Fournis une liste structurée et dédoublonnée des mesures, dimensions et quantités.",
+    "materials": "Fournis une liste structurée et dédoublonnée des matériaux, produits et équipements.",
+    "costs": "Fournis une synthèse structurée des coûts, prix et budget."
+}
+
+ProgressCallback = Callable[[int, int], None]
+
+# Séparateur de pages produit par PDFProcessor.get_all_text
+_PAGE_MARKER = re.compile(r'^--- Page (\d+) ---$', re.MULTILINE)
+
+def pages_from_text(text: str) -> List[str]:
+    """Découpe le texte de get_all_text en pages (index = numéro - 1)"""
+    markers = list(_PAGE_MARKER.finditer(text))
+    if not markers:
+        return [text]
+    pages = [""] * int(max(int(m.group(1)) for m in markers))
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        pages[int(marker.group(1)) - 1] = text[marker.end():end].strip()
+    return pages
+
+def split_pages(pages: List[str], max_chars: int = CHUNK_CHARS) -> List[Dict]:
+    """Regroupe les pages consécutives en morceaux d'au plus max_chars
+
+    Une page trop longue est coupée entre paragraphes. Chaque morceau
+    garde ses numéros de page (base 1) : {'first_page', 'last_page', 'text'}.
+    """
+    chunks = []
+    blocks, size = [], 0
+
+    def flush():
+        if blocks:
+            chunks.append({'first_page': blocks[0][0], 'last_page': blocks[-1][0],
+                           'text': "\n\n".join(text for _number, text in blocks)})
+
+    for number, text in enumerate(pages, start=1):
+        text = (text or "").strip()
+        if not text:
+            continue
+        for part in _split_text(text, max_chars):
+            block = f"--- Page {number} ---\n{part}"
+            if blocks and size + len(block) > max_chars:
+                flush()
+                blocks, size = [], 0
+            blocks.append((number, block))
+            size += len(block)
+    flush()
+    return chunks
+
+def _split_text(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    parts, current = [], ""
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        parts.append(current)
+    return parts
+
+def _page_label(chunk: Dict) -> str:
+    if chunk['first_page'] == chunk['last_page']:
+        return f"page {chunk['first_page']}"
+    return f"pages {chunk['first_page']} à {chunk['last_page']}"
+
+class DocumentAnalyzer:
+    """Analyse d'un long document en deux phases (map-reduce)
+
+    1. Chaque morceau de pages est analysé séparément, avec au plus
+       `workers` appels simultanés ; les résultats sont conservés dans le
+       cache de réponses de l'assistant, par empreinte du contenu (modèle,
+       profil, type d'analyse, texte).
+    2. Les analyses partielles sont fusionnées en une réponse structurée,
+       par groupes si elles sont trop longues pour un seul appel.
+
+    La durée totale est bornée par `deadline` : les morceaux non terminés
+    à temps sont signalés dans la réponse au lieu de la bloquer.
+    """
+
+    def __init__(self, assistant, expert_profile: str, analysis_type: str = "general",
+                 workers: int = ANALYSIS_WORKERS, deadline: float = ANALYSIS_DEADLINE,
+                 use_cache: bool = True):
+        self.assistant = assistant
+        self.expert_profile = expert_profile
+        self.analysis_type = analysis_type if analysis_type in MAP_INSTRUCTIONS else "general"
+        self.workers = workers
+        self.deadline = deadline
+        self.use_cache = use_cache
+        self.cache = getattr(assistant, 'response_cache', None)
+        # Morceaux non analysés lors du dernier appel à analyze
+        self.missing: List[Dict] = []
+
+    def _call(self, system_text: str, user_text: str, max_tokens: int) -> str:
+        response = self.assistant.client.messages.create(
+            model=self.assistant.model,
+            max_tokens=max_tokens,
+            temperature=0.3,
+            system=self.assistant._system_blocks(self.expert_profile, system_text),
+            messages=[{'role': 'user', 'content': user_text}],
+            timeout=CALL_TIMEOUT
+        )
+        self.assistant._record_usage(getattr(response, 'usage', None))
+        return response.content[0].text
+
+    def analyze_chunk(self, chunk: Dict) -> str:
+        """Analyse partielle d'un morceau (résultat en cache si déjà calculé)"""
+        key = make_key('chunk', self.assistant.model, text_hash(self.expert_profile),
+                       self.analysis_type, text_hash(chunk['text']))
+        if self.cache and self.use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        result = self._call(
+            "Tu analyses un extrait d'un document de construction plus long.",
+            f"EXTRAIT ({_page_label(chunk)}):\n{chunk['text']}\n\n"
+            f"INSTRUCTION:\n{MAP_INSTRUCTIONS[self.analysis_type]}\n"
+            "Indique les numéros de page des éléments relevés. Sois concis.",
+            max_tokens=1000
+        )
+        if self.cache:
+            self.cache.put(key, result, kind='chunk', analysis_type=self.analysis_type)
+        return result
+
+    def _reduce(self, partials: List[str], missing: List[Dict]) -> str:
+        # Fusion par groupes tant que l'ensemble est trop long pour un appel
+        while len(partials) > 1 and sum(len(p) for p in partials) > REDUCE_CHARS:
+            groups, group, size = [], [], 0
+            for partial in partials:
+                if group and size + len(partial) > REDUCE_CHARS:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(partial)
+                size += len(partial)
+            groups.append(group)
+            partials = [self._merge(group, final=False) for group in groups]
+
+        result = self._merge(partials, final=True) if len(partials) > 1 else partials[0]
+        if missing:
+            labels = ", ".join(_page_label(chunk) for chunk in missing)
+            result += f"\n\n⚠️ Analyse incomplète : {labels} non analysées (délai dépassé ou erreur)."
+        return result
+
+    def _merge(self, partials: List[str], final: bool) -> str:
+        instruction = (REDUCE_INSTRUCTIONS[self.analysis_type] if final
+                       else "Fusionne ces analyses partielles en conservant les numéros de page.")
+        return self._call(
+            "Tu fusionnes les analyses partielles des extraits d'un même document.",
+            "ANALYSES PARTIELLES:\n\n" + "\n\n====\n\n".join(partials)
+            + f"\n\nINSTRUCTION:\n{instruction}",
+            max_tokens=2000 if final else 1500
+        )
+
+    def analyze(self, pages: List[str], progress: Optional[ProgressCallback] = None) -> str:
+        """Analyse toutes les pages et retourne la réponse fusionnée"""
+        chunks = split_pages(pages)
+        if not chunks:
+            return "Aucun texte trouvé dans le document."
+
+        started = time.monotonic()
+        results: Dict[int, str] = {}
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {pool.submit(self.analyze_chunk, chunk): i for i, chunk in enumerate(chunks)}
+            pending = set(futures)
+            while pending:
+                remaining = self.deadline - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    try:
+                        results[index] = f"[{_page_label(chunks[index])}]\n{future.result()}"
+                    except Exception as e:
+                        print(f"Erreur lors de l'analyse des {_page_label(chunks[index])}: {str(e)}")
+                if progress:
+                    progress(len(results), len(chunks))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if not results:
+            raise RuntimeError("Aucune partie du document n'a pu être analysée")
+        self.missing = [chunk for i, chunk in enumerate(chunks) if i not in results]
+        return self._reduce([results[i] for i in sorted(results)], self.missing)
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+from models.catalog_index import tokenize
+
+# Taille visée d'un passage indexé (caractères, sans couper une page)
+PASSAGE_CHARS = 1200
+
+# Nombre de passages joints à une question
+RETRIEVAL_TOP_K = 5
+
+# Paramètres BM25 usuels
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Version du format des index enregistrés (un changement force la reconstruction)
+INDEX_FORMAT = 1
+
+INDEX_DIR = "document_indexes"
+
+# Index gardés en mémoire (les moins récemment utilisés sont relus du disque)
+MAX_CACHED_INDEXES = 8
+MAX_CACHED_HASHES = 256
+
+# Mots trop fréquents pour départager les passages (repliés, sans accents)
+STOP_WORDS = frozenset(
+    "a au aux avec ce ces dans de des du elle en est et il ils je la le les leur "
+    "mais me ne ni nous on ou par pas pour qu que qui sa se ses son sont sur ta te "
+    "tu un une vos votre vous y l d s n c j m t "
+    "an and are as at be by for from in is it of on or that the this to with".split()
+)
+
+def _terms(text: str) -> List[str]:
+    return [t for t in tokenize(text) if t not in STOP_WORDS]
+
+def document_hash(pdf_path: str) -> str:
+    """Empreinte SHA-256 du contenu du fichier (indépendante de son nom)"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def split_passages(pages: List[str], max_chars: int = PASSAGE_CHARS) -> List[Dict]:
+    """Découpe chaque page en passages de paragraphes consécutifs {'page', 'text'}"""
+    passages = []
+    for number, text in enumerate(pages, start=1):
+        current = ""
+        for paragraph in (text or "").split("\n\n"):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if current and len(current) + len(paragraph) > max_chars:
+                passages.append({'page': number, 'text': current})
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            passages.append({'page': number, 'text': current})
+    return passages
+
+class DocumentIndex:
+    """Index BM25 des passages d'un document, pour la recherche locale
+
+    Les listes d'occurrences (terme -> [passage, fréquence, passage,
+    fréquence, ...], à plat pour un chargement JSON rapide) sont calculées
+    une fois puis enregistrées sous l'empreinte du document ; une recherche
+    ne parcourt que les listes des termes de la question.
+    """
+
+    def __init__(self, passages: List[Dict], postings: Dict[str, List[int]],
+                 lengths: List[int]):
+        self.passages = passages
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def build(cls, pages: List[str]) -> 'DocumentIndex':
+        """Indexe le texte de chaque page (index = numéro de page - 1)"""
+        passages = split_passages(pages)
+        postings: Dict[str, List[int]] = {}
+        lengths = []
+        for passage_id, passage in enumerate(passages):
+            terms = _terms(passage['text'])
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).extend((passage_id, count))
+        return cls(passages, postings, lengths)
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[Dict]:
+        """Les k passages les plus pertinents : [{'page', 'text', 'score'}]"""
+        total = len(self.passages)
+        scores: Dict[int, float] = {}
+        for term in set(_terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            matches = len(postings) // 2
+            idf = math.log(1 + (total - matches + 0.5) / (matches + 0.5))
+            for passage_id, count in zip(postings[::2], postings[1::2]):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[passage_id] / self.avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * count * (BM25_K1 + 1) / (count + norm)
+
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [dict(self.passages[passage_id], score=score) for passage_id, score in best]
+
+    def save(self, file_path: str):
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': INDEX_FORMAT, 'passages': self.passages,
+                       'postings': self.postings, 'lengths': self.lengths}, f, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional['DocumentIndex']:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('format') != INDEX_FORMAT:
+            return None
+        return cls(data['passages'], data['postings'], data['lengths'])
+
+def format_passages(passages: List[Dict]) -> str:
+    """Passages retrouvés, avec leur numéro de page, pour le prompt"""
+    return "\n\n".join(f"[Page {p['page']}]\n{p['text']}" for p in passages)
+
+_indexes: Dict[str, DocumentIndex] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+# Empreintes déjà calculées, par (chemin, date de modification, taille)
+_hashes: Dict[tuple, str] = OrderedDict()
+
+def _remember(cache: OrderedDict, key, value, max_size: int):
+    """Ajoute une entrée au cache LRU (appelé avec _indexes_lock acquis)"""
+    value = cache.setdefault(key, value)
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+    return value
+
+def _cached_hash(pdf_path: str) -> str:
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+    with _indexes_lock:
+        if key in _hashes:
+            _hashes.move_to_end(key)
+            return _hashes[key]
+    digest = document_hash(pdf_path)
+    with _indexes_lock:
+        return _remember(_hashes, key, digest, MAX_CACHED_HASHES)
+
+def get_document_index(pdf_path: str, pdf_processor, index_dir: str = INDEX_DIR) -> Optional[DocumentIndex]:
+    """Index du document, lu sur disque ou construit puis enregistré
+
+    L'index est partagé par les sessions du processus et retrouvé par
+    empreinte du contenu : un même PDF importé sous un autre nom n'est pas
+    réindexé. Seuls les MAX_CACHED_INDEXES derniers index utilisés restent
+    en mémoire.
+    """
+    try:
+        key = _cached_hash(pdf_path)
+    except OSError as e:
+        print(f"Erreur lors de la lecture du document: {str(e)}")
+        return None
+
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+    file_path = os.path.join(index_dir, f"{key}.json")
+    index = DocumentIndex.load(file_path)
+    if index is None:
+        pages = [pdf_processor.get_page_text(i) for i in range(pdf_processor.get_page_count())]
+        index = DocumentIndex.build(pages)
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+            index.save(file_path)
+        except OSError as e:
+            print(f"Erreur lors de l'enregistrement de l'index du document: {str(e)}")
+
+    with _indexes_lock:
+        return _remember(_indexes, key, index, MAX_CACHED_INDEXES)
@@ -0,0 +1,123 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+# Date d'effet du prix initial d'un produit sans historique
+MIN_DATE = '1900-01-01'
+
+DateLike = Union[str, date, np.datetime64]
+
+def _day(value: Optional[DateLike]) -> np.datetime64:
+    return np.datetime64(value or date.today(), 'D')
+
+def price_history(data: Dict) -> List[Dict]:
+    """Historique daté d'un produit, trié ; le prix courant seul sinon"""
+    history = data.get('price_history')
+    if history:
+        return history
+    return [{'date': MIN_DATE, 'price': float(data.get('price', 0) or 0)}]
+
+def apply_price(data: Dict, price: float, effective_date: Optional[DateLike] = None) -> Dict:
+    """Copie de data avec un nouveau prix en vigueur à partir de effective_date
+
+    Le prix précédent reste dans 'price_history' ; 'price' est le prix en
+    vigueur le jour de l'écriture (un prix daté dans le futur ne le remplace
+    pas encore) et les catalogues le recalculent à la lecture avec
+    current_product().
+    """
+    effective = str(_day(effective_date))
+    history = [record for record in price_history(data) if record['date'] != effective]
+    history.append({'date': effective, 'price': float(price)})
+    history.sort(key=lambda record: record['date'])
+
+    updated = dict(data)
+    updated['price_history'] = history
+    updated['price'] = price_as_of(history, date.today())
+    return updated
+
+def current_product(data: Dict) -> Dict:
+    """Produit dont 'price' est le prix de l'historique en vigueur aujourd'hui
+
+    Un prix daté dans le futur devient le prix courant dès que sa date est
+    atteinte, sans réécriture du catalogue. Sans historique, data est
+    retourné tel quel.
+    """
+    history = data.get('price_history')
+    if not history:
+        return data
+    price = price_as_of(history, date.today())
+    return data if data.get('price') == price else dict(data, price=price)
+
+def price_as_of(history: Sequence[Dict], as_of: DateLike) -> float:
+    """Prix en vigueur à une date (le plus ancien si la date le précède)"""
+    day = str(_day(as_of))
+    price = history[0]['price']
+    for record in history:
+        if record['date'] > day:
+            break
+        price = record['price']
+    return price
+
+ProductKey = Tuple[Optional[str], str]
+
+class PriceIndex:
+    """Index des prix datés pour des recherches « prix à la date D » en lot
+
+    Tous les enregistrements sont rangés dans un seul tableau trié sur une
+    clé composite (numéro de produit, jour) ; une recherche pour N couples
+    (produit, date) est un seul np.searchsorted, quel que soit le nombre de
+    projets ou de produits interrogés.
+    """
+
+    # Décalage de la clé composite : les jours tiennent sur 32 bits
+    _SHIFT = np.int64(1 << 32)
+
+    def __init__(self, histories: Dict[ProductKey, Sequence[Dict]]):
+        self._ids = {key: i for i, key in enumerate(histories)}
+        ids, dates, prices = [], [], []
+        for key, history in histories.items():
+            for record in history:
+                ids.append(self._ids[key])
+                dates.append(record['date'])
+                prices.append(record['price'])
+        composite = np.array(ids, dtype=np.int64) * self._SHIFT + self._day_number(dates)
+        order = np.argsort(composite, kind='stable')
+        self._composite = composite[order]
+        self._prices = np.array(prices, dtype=np.float64)[order]
+
+    @classmethod
+    def _day_number(cls, value: DateLike):
+        # Jours depuis MIN_DATE (toujours positifs pour les dates valides)
+        return (np.asarray(value, dtype='datetime64[D]') - np.datetime64(MIN_DATE, 'D')).astype(np.int64)
+
+    @classmethod
+    def from_catalog(cls, catalog, keys: Iterable[ProductKey]) -> 'PriceIndex':
+        """Index des produits demandés (seuls ceux-ci sont lus dans le catalogue)"""
+        histories = {}
+        for category, name in set(keys):
+            product = catalog.get_product(category, name) if catalog and category else None
+            if product:
+                histories[(category, name)] = price_history(product)
+        return cls(histories)
+
+    def lookup(self, keys: Sequence[ProductKey], dates: Union[DateLike, Sequence[DateLike]]) -> np.ndarray:
+        """Prix de chaque produit à la date correspondante (0 si inconnu)
+
+        dates est une date unique ou une date par produit.
+        """
+        prices = np.zeros(len(keys))
+        if not len(keys) or not len(self._composite):
+            return prices
+        ids = np.array([self._ids.get(key, -1) for key in keys], dtype=np.int64)
+        days = np.broadcast_to(self._day_number(dates), ids.shape)
+        known = ids >= 0
+
+        base = np.where(known, ids, 0) * self._SHIFT
+        position = np.searchsorted(self._composite, base + days, side='right') - 1
+        # Date antérieure au premier prix : on prend le premier prix du produit
+        position = np.maximum(position, np.searchsorted(self._composite, base))
+        position = np.minimum(position, len(self._composite) - 1)
+
+        known &= (self._composite[position] // self._SHIFT) == ids
+        prices[known] = self._prices[position[known]]
+        return prices
@@ -2,13 +2,32 @@ import json
 import os
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+from models.catalog_index import CatalogIndex
+from models.price_history import apply_price, current_product
+
+def open_product_catalog(catalog_file: Optional[str] = None):
+    """Ouvre le catalogue selon son fichier : SQLite (.db, .sqlite) ou JSON
+
+    Le fichier est lu dans TAKEOFF_CATALOG à défaut d'argument.
+    """
+    catalog_file = catalog_file or os.environ.get('TAKEOFF_CATALOG') or "product_catalog.json"
+    from models.sqlite_catalog import SQLiteProductCatalog, is_sqlite_catalog
+    if is_sqlite_catalog(catalog_file):
+        return SQLiteProductCatalog(catalog_file)
+    return ProductCatalog(catalog_file)
 
 class ProductCatalog:
-    """Gestionnaire du catalogue de produits"""
+    """Gestionnaire du catalogue de produits
+
+    Les modifications remplacent les dictionnaires concernés au lieu de les
+    modifier (copie sur écriture) : un dictionnaire renvoyé par
+    get_products_by_category reste un instantané valide pour son lecteur.
+    """
     
-    def __init__(self):
-        self.catalog_file = "product_catalog.json"
+    def __init__(self, catalog_file: str = "product_catalog.json"):
+        self.catalog_file = catalog_file
         self.catalog = {}
+        self.index = CatalogIndex()
         self.is_dirty = False
         self.load_catalog()
         self.ensure_default_catalog()
@@ -23,18 +42,23 @@ class ProductCatalog:
             except Exception as e:
                 print(f"Erreur lors du chargement du catalogue: {str(e)}")
                 self.catalog = {}
+        self.index.rebuild(self.catalog)
     
     def ensure_default_catalog(self):
         """Assure qu'un catalogue par défaut existe"""
         if not self.catalog:
             self.catalog = self.get_default_catalog()
+            self.index.rebuild(self.catalog)
             self.save_catalog()
     
     def save_catalog(self):
         """Sauvegarde le catalogue dans le fichier JSON"""
         try:
-            with open(self.catalog_file, 'w', encoding='utf-8') as f:
+            # Écriture atomique : fichier temporaire puis remplacement
+            tmp_path = f"{self.catalog_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(self.catalog, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.catalog_file)
             self.is_dirty = False
             return True
         except Exception as e:
@@ -46,47 +70,55 @@ class ProductCatalog:
         return list(self.catalog.keys())
     
     def get_products_by_category(self, category: str) -> Dict[str, Dict]:
-        """Retourne les produits d'une catégorie"""
-        return self.catalog.get(category, {})
+        """Retourne les produits d'une catégorie (prix courant d'après l'historique)"""
+        return {name: current_product(data) for name, data in self.catalog.get(category, {}).items()}
     
     def get_product(self, category: str, product_name: str) -> Optional[Dict]:
-        """Récupère un produit spécifique"""
+        """Récupère un produit spécifique (prix courant d'après l'historique)"""
         if category in self.catalog and product_name in self.catalog[category]:
-            return self.catalog[category][product_name]
+            return current_product(self.catalog[category][product_name])
         return None
     
     def add_product(self, category: str, name: str, dimensions: str, 
                    price: float, unit: str = "pi²", color: str = "#CCCCCC") -> bool:
         """Ajoute un nouveau produit"""
-        if category not in self.catalog:
-            self.catalog[category] = {}
-        
-        self.catalog[category][name] = {
+        products = dict(self.catalog.get(category, {}))
+        products[name] = {
             'dimensions': dimensions,
             'price': price,
             'price_unit': unit,
             'color': color
         }
+        self.catalog = {**self.catalog, category: products}
+        self.index.add(category, name)
         
         self.is_dirty = True
         return True
     
     def update_product(self, category: str, old_name: str, new_name: str,
                       dimensions: str, price: float, unit: str, color: str) -> bool:
-        """Met à jour un produit existant"""
+        """Met à jour un produit existant ; un changement de prix est ajouté à l'historique"""
         if category not in self.catalog or old_name not in self.catalog[category]:
             return False
         
+        products = dict(self.catalog[category])
+        
         # Si le nom change, on doit déplacer le produit
         if old_name != new_name:
-            self.catalog[category][new_name] = self.catalog[category].pop(old_name)
+            products[new_name] = products.pop(old_name)
+            self.index.remove(category, old_name)
+            self.index.add(category, new_name)
         
-        self.catalog[category][new_name] = {
-            'dimensions': dimensions,
-            'price': price,
-            'price_unit': unit,
-            'color': color
-        }
+        # Les autres champs (sku, historique des prix...) sont conservés
+        current = products[new_name]
+        updated = {**current, 'dimensions': dimensions, 'price_unit': unit, 'color': color}
+        if float(current.get('price', 0) or 0) != float(price):
+            # Nouveau prix : l'ancien reste dans l'historique
+            updated = apply_price(updated, price)
+        else:
+            updated['price'] = price
+        products[new_name] = updated
+        self.catalog = {**self.catalog, category: products}
         
         self.is_dirty = True
         return True
@@ -94,20 +126,43 @@ class ProductCatalog:
     def delete_product(self, category: str, product_name: str) -> bool:
         """Supprime un produit"""
         if category in self.catalog and product_name in self.catalog[category]:
-            del self.catalog[category][product_name]
+            products = dict(self.catalog[category])
+            del products[product_name]
+            self.index.remove(category, product_name)
             
-            # Supprimer la catégorie si elle est vide
-            if not self.catalog[category]:
-                del self.catalog[category]
+            catalog = dict(self.catalog)
+            if products:
+                catalog[category] = products
+            else:
+                # Supprimer la catégorie si elle est vide
+                del catalog[category]
+            self.catalog = catalog
             
             self.is_dirty = True
             return True
         return False
     
+    def upsert_products(self, products) -> int:
+        """Ajoute ou remplace des produits (category, name, data)"""
+        catalog = dict(self.catalog)
+        copied = set()
+        count = 0
+        for category, name, data in products:
+            if category not in copied:
+                catalog[category] = dict(catalog.get(category, {}))
+                copied.add(category)
+            catalog[category][name] = data
+            self.index.add(category, name)
+            count += 1
+        if count:
+            self.catalog = catalog
+            self.is_dirty = True
+        return count
+    
     def add_category(self, category: str) -> bool:
         """Ajoute une nouvelle catégorie"""
         if category not in self.catalog:
-            self.catalog[category] = {}
+            self.catalog = {**self.catalog, category: {}}
             self.is_dirty = True
             return True
         return False
@@ -115,7 +170,8 @@ class ProductCatalog:
     def delete_category(self, category: str) -> bool:
         """Supprime une catégorie et tous ses produits"""
         if category in self.catalog:
-            del self.catalog[category]
+            self.catalog = {k: v for k, v in self.catalog.items() if k != category}
+            self.index.remove_category(category)
             self.is_dirty = True
             return True
         return False
@@ -139,6 +195,7 @@ class ProductCatalog:
             # Valider la structure
             if isinstance(new_catalog, dict):
                 self.catalog = new_catalog
+                self.index.rebuild(self.catalog)
                 self.is_dirty = True
                 self.save_catalog()
                 return True
@@ -147,17 +204,12 @@ class ProductCatalog:
             print(f"Erreur lors de l'import du catalogue: {str(e)}")
             return False
     
-    def search_products(self, query: str) -> List[tuple]:
-        """Recherche des produits par nom"""
-        results = []
-        query_lower = query.lower()
-        
-        for category, products in self.catalog.items():
-            for product_name, product_data in products.items():
-                if query_lower in product_name.lower():
-                    results.append((category, product_name, product_data))
-        
-        return results
+    def search_products(self, query: str, limit: Optional[int] = None) -> List[tuple]:
+        """Recherche des produits par nom (sans accents, classés par pertinence)"""
+        return [
+            (category, name, current_product(self.catalog[category][name]))
+            for category, name in self.index.search(query, limit)
+        ]
     
     def export_catalog_to_string(self) -> str:
         """Exporte le catalogue vers une chaîne JSON"""
@@ -175,6 +227,7 @@ class ProductCatalog:
             
             if isinstance(new_catalog, dict):
                 self.catalog = new_catalog
+                self.index.rebuild(self.catalog)
                 self.is_dirty = True
                 self.save_catalog()
                 return True
@@ -183,7 +236,8 @@ class ProductCatalog:
             print(f"Erreur lors de l'import du catalogue: {str(e)}")
             return False
     
-    def get_default_catalog(self) -> Dict:
+    @staticmethod
+    def get_default_catalog() -> Dict:
         """Retourne un catalogue par défaut"""
         return {
             "Béton": {
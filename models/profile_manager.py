@@ -1,39 +1,137 @@
 import os
 import json
-from typing import Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Nombre de profils complets gardés en mémoire (partagés entre les sessions)
+PROFILE_CONTENT_CACHE_SIZE = 16
+
+class ProfileLibrary:
+    """Index des profils d'un dossier, partagé par toutes les sessions
+
+    Seule la première ligne de chaque fichier est lue pour construire
+    l'index (id, nom, taille, date de modification). Le contenu complet
+    n'est lu qu'à la demande et gardé dans un petit cache LRU. L'index est
+    revalidé au plus une fois toutes les check_interval secondes : un
+    fichier modifié, ajouté ou supprimé est relu.
+    """
+
+    def __init__(self, profiles_dir: str, check_interval: float = 2.0):
+        self.profiles_dir = profiles_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._contents: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._checked_at = None
+
+    @staticmethod
+    def _read_name(file_path: str, profile_id: str) -> str:
+        # Première ligne non vide, comme le contenu lu puis strip()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    return line.strip().replace('TU ES UN ', '').strip()
+        return profile_id
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        if not os.path.exists(self.profiles_dir):
+            os.makedirs(self.profiles_dir, exist_ok=True)
+
+        entries = {}
+        with os.scandir(self.profiles_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.txt'):
+                    continue
+                profile_id = os.path.splitext(entry.name)[0]
+                stat = entry.stat()
+                previous = self._entries.get(profile_id)
+                if previous and previous['mtime'] == stat.st_mtime_ns and previous['size'] == stat.st_size:
+                    entries[profile_id] = previous
+                    continue
+                try:
+                    entries[profile_id] = {
+                        'name': self._read_name(entry.path, profile_id),
+                        'path': entry.path,
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime_ns
+                    }
+                except Exception as e:
+                    print(f"Erreur lors du chargement du profil {entry.name}: {str(e)}")
+        self._entries = entries
+
+    def invalidate(self):
+        """Force la relecture de l'index au prochain accès"""
+        with self._lock:
+            self._checked_at = None
+
+    def list(self) -> Dict[str, Dict]:
+        """Métadonnées des profils : {id: {'name', 'path', 'size', 'mtime'}}"""
+        with self._lock:
+            self._refresh()
+            return dict(self._entries)
+
+    def content(self, profile_id: str) -> Optional[str]:
+        """Contenu complet d'un profil (lu une fois par version du fichier)"""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(profile_id)
+            if not entry:
+                return None
+            key = (entry['path'], entry['mtime'])
+            if key in self._contents:
+                self._contents.move_to_end(key)
+                return self._contents[key]
+        try:
+            with open(entry['path'], 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"Erreur lors du chargement du profil {profile_id}: {str(e)}")
+            return None
+        with self._lock:
+            self._contents[key] = content
+            while len(self._contents) > PROFILE_CONTENT_CACHE_SIZE:
+                self._contents.popitem(last=False)
+        return content
+
+_libraries: Dict[str, ProfileLibrary] = {}
+_libraries_lock = threading.Lock()
+
+def get_profile_library(profiles_dir: str = "profiles") -> ProfileLibrary:
+    """Index de profils partagé du processus pour un dossier"""
+    profiles_dir = os.path.abspath(profiles_dir)
+    with _libraries_lock:
+        if profiles_dir not in _libraries:
+            _libraries[profiles_dir] = ProfileLibrary(profiles_dir)
+        return _libraries[profiles_dir]
 
 class ExpertProfileManager:
-    """Gestionnaire des profils d'experts pour l'assistant IA"""
+    """Gestionnaire des profils d'experts pour l'assistant IA
+
+    Les profils du dossier viennent de l'index partagé (ProfileLibrary) :
+    la liste ne lit que les noms, le contenu est chargé par get_profile.
+    """
     
     def __init__(self):
-        self.profiles = {}
+        self.profiles = {}  # Profils ajoutés en mémoire (non enregistrés)
         self.profiles_dir = "profiles"
-        self.load_profiles()
+        self.library = get_profile_library(self.profiles_dir)
         self.ensure_default_profiles()
     
     def load_profiles(self):
-        """Charge les profils depuis le dossier profiles"""
-        if not os.path.exists(self.profiles_dir):
-            os.makedirs(self.profiles_dir, exist_ok=True)
-            return
-        
-        for filename in os.listdir(self.profiles_dir):
-            if filename.endswith('.txt'):
-                profile_id = os.path.splitext(filename)[0]
-                file_path = os.path.join(self.profiles_dir, filename)
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        lines = content.strip().split('\n')
-                        name = lines[0].replace('TU ES UN ', '').strip() if lines else profile_id
-                        self.add_profile(profile_id, name, content)
-                except Exception as e:
-                    print(f"Erreur lors du chargement du profil {filename}: {str(e)}")
+        """Relit l'index des profils du dossier"""
+        self.library.invalidate()
+        self.library.list()
     
     def ensure_default_profiles(self):
         """Assure que les profils par défaut sont disponibles"""
-        if 'entrepreneur_general' not in self.profiles:
+        if 'entrepreneur_general' not in self.library.list():
             content = self.get_default_entrepreneur_profile()
             self.add_profile('entrepreneur_general', 'Entrepreneur Général', content)
             self.save_profile_to_file('entrepreneur_general')
@@ -46,12 +144,26 @@ class ExpertProfileManager:
         }
     
     def get_profile(self, profile_id: str) -> Optional[Dict]:
-        """Récupère un profil par son ID"""
-        return self.profiles.get(profile_id)
+        """Récupère un profil par son ID (contenu complet)"""
+        if profile_id in self.profiles:
+            return self.profiles[profile_id]
+        entry = self.library.list().get(profile_id)
+        if not entry:
+            return None
+        content = self.library.content(profile_id)
+        if content is None:
+            return None
+        return {'name': entry['name'], 'content': content}
     
     def get_profiles(self) -> Dict:
-        """Retourne tous les profils"""
-        return self.profiles
+        """Retourne les profils disponibles : {id: {'name', ...}} sans leur contenu"""
+        profiles = {
+            profile_id: {'name': entry['name'], 'size': entry['size'], 'mtime': entry['mtime']}
+            for profile_id, entry in self.library.list().items()
+        }
+        for profile_id, profile in self.profiles.items():
+            profiles[profile_id] = {'name': profile['name'], 'size': len(profile['content']), 'mtime': None}
+        return profiles
     
     def save_profile_to_file(self, profile_id: str) -> bool:
         """Sauvegarde un profil dans un fichier"""
@@ -65,6 +177,7 @@ class ExpertProfileManager:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(self.profiles[profile_id]['content'])
             
+            self.library.invalidate()
             return True
         except Exception as e:
             print(f"Erreur lors de la sauvegarde du profil {profile_id}: {str(e)}")
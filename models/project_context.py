@@ -0,0 +1,211 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Taille maximale du bloc de contexte envoyé au modèle (caractères)
+CONTEXT_MAX_CHARS = 2500
+
+# Produits détaillés dans le contexte (les plus coûteux d'abord)
+CONTEXT_TOP_PRODUCTS = 10
+
+# Pages citées (les plus mesurées d'abord)
+CONTEXT_TOP_PAGES = 5
+
+# Dernières mesures citées en exemple
+CONTEXT_RECENT_MEASUREMENTS = 3
+
+ProductKey = Tuple[str, str]
+
+class ProjectContextBuilder:
+    """Résumé du projet tenu à jour mesure par mesure, pour les prompts de l'IA
+
+    Les compteurs et totaux par type, par page et par produit sont mis à
+    jour par apply() à chaque modification (voir
+    ProjectManager.log_measurement_change) au lieu d'être recalculés à
+    chaque message. Le bloc de contexte rendu est gardé tant que ni le
+    projet ni le catalogue n'ont changé.
+
+    sync() détecte les changements qui ne passent pas par apply()
+    (chargement d'un projet, page chargée paresseusement) en comparant la
+    liste de mesures et leur nombre, et reconstruit alors le résumé.
+    """
+
+    def __init__(self):
+        self._source: Optional[List[Dict]] = None
+        self._reset()
+
+    def _reset(self):
+        # Contribution de chaque mesure, pour la retirer lors d'une modification
+        self._contributions: Dict = {}
+        self.by_type: Dict[str, Dict] = {}
+        self.by_page: Dict[int, int] = {}
+        self.by_product: Dict[ProductKey, Dict] = {}
+        self._recent = deque(maxlen=CONTEXT_RECENT_MEASUREMENTS * 4)
+        self.unloaded = 0
+        self.version = getattr(self, 'version', 0) + 1
+        self._rendered: Optional[Tuple[tuple, str]] = None
+
+    @staticmethod
+    def _key(measurement: Dict):
+        return measurement.get('id') or id(measurement)
+
+    def _add(self, measurement: Dict):
+        product = measurement.get('product') or {}
+        contribution = {
+            'type': measurement.get('type', 'inconnu'),
+            'page': measurement.get('page', 0),
+            'value': measurement.get('value', 0) or 0,
+            'unit': measurement.get('unit', ''),
+            'label': measurement.get('label', 'Sans nom'),
+            'product': (product.get('category') or '', product['name']) if product.get('name') else None,
+            'price': product.get('price', 0) or 0
+        }
+        key = self._key(measurement)
+        if key in self._contributions:
+            self._remove(key)
+        self._contributions[key] = contribution
+        self._count(contribution, 1)
+        self._recent.append(key)
+
+    def _remove(self, key):
+        contribution = self._contributions.pop(key, None)
+        if contribution:
+            self._count(contribution, -1)
+
+    def _count(self, c: Dict, sign: int):
+        by_type = self.by_type.setdefault(c['type'], {'count': 0, 'totals': {}})
+        by_type['count'] += sign
+        by_type['totals'][c['unit']] = by_type['totals'].get(c['unit'], 0) + sign * c['value']
+        if not by_type['count']:
+            del self.by_type[c['type']]
+
+        self.by_page[c['page']] = self.by_page.get(c['page'], 0) + sign
+        if not self.by_page[c['page']]:
+            del self.by_page[c['page']]
+
+        if c['product']:
+            self._count_product(c['product'], c['unit'], c['price'], sign * c['value'], sign)
+
+    def _count_product(self, key: ProductKey, unit: str, price: float, quantity: float, count: int):
+        product = self.by_product.setdefault(key, {
+            'category': key[0], 'name': key[1], 'unit': unit, 'price': price, 'quantity': 0, 'count': 0
+        })
+        product['quantity'] += quantity
+        product['count'] += count
+        if product['count'] <= 0:
+            del self.by_product[key]
+
+    def apply(self, op: str, measurement: Optional[Dict] = None):
+        """Applique une modification de mesure ('add', 'update', 'delete', 'clear')"""
+        if op == 'clear':
+            self._reset()
+            return
+        if measurement is None:
+            return
+        if op in ('add', 'update'):
+            self._add(measurement)
+        elif op == 'delete':
+            self._remove(self._key(measurement))
+        self.version += 1
+
+    def rebuild(self, project: Dict):
+        """Recalcule le résumé à partir de toutes les mesures du projet"""
+        self._reset()
+        self._source = project.get('measurements', [])
+        for measurement in self._source:
+            self._add(measurement)
+
+        # Pages non chargées d'un projet ouvert paresseusement : agrégats de l'en-tête
+        lazy = project.get('lazy')
+        if lazy:
+            for page, aggregate in lazy['page_aggregates'].items():
+                if int(page) in lazy['hydrated']:
+                    continue
+                count = lazy['page_counts'].get(page, 0)
+                self.unloaded += count
+                self.by_page[int(page)] = self.by_page.get(int(page), 0) + count
+                for m_type, type_count in aggregate.get('types', {}).items():
+                    self.by_type.setdefault(m_type or 'inconnu', {'count': 0, 'totals': {}})['count'] += type_count
+                for item in aggregate.get('products', []):
+                    self._count_product((item.get('category') or '', item['name']), item.get('unit', ''),
+                                        item.get('unit_price', 0) or 0, item.get('quantity', 0),
+                                        item.get('count', 0))
+
+    def sync(self, project: Dict):
+        """Reconstruit le résumé si le projet a changé sans passer par apply()"""
+        measurements = project.get('measurements', [])
+        if measurements is not self._source or len(measurements) != len(self._contributions):
+            self.rebuild(project)
+
+    def render(self, project: Dict, catalog=None, max_chars: int = CONTEXT_MAX_CHARS) -> str:
+        """Bloc de contexte compact (au plus max_chars), avec les coûts du catalogue"""
+        self.sync(project)
+        calibration = project.get('calibration') or {}
+        render_key = (self.version, getattr(catalog, 'version', None), project.get('filename'),
+                      calibration.get('value'), calibration.get('unit'), max_chars)
+        if self._rendered and self._rendered[0] == render_key:
+            return self._rendered[1]
+
+        lines = []
+        if project.get('filename'):
+            lines.append(f"Fichier: {project['filename']}")
+        if calibration:
+            lines.append(f"Calibration: {calibration.get('value')} {calibration.get('unit')}")
+
+        total = len(self._contributions) + self.unloaded
+        if not total:
+            lines.append("Aucune mesure effectuée pour le moment")
+        else:
+            lines.append(f"\nNombre de mesures: {total}")
+            lines.append("\nMesures par type:")
+            for m_type, data in sorted(self.by_type.items(), key=lambda item: -item[1]['count']):
+                totals = ", ".join(f"{value:.2f} {unit}".strip()
+                                   for unit, value in data['totals'].items() if abs(value) > 1e-9)
+                lines.append(f"- {m_type.capitalize()}: {data['count']} mesures"
+                             + (f" (total {totals})" if totals else ""))
+
+            lines.extend(self._product_lines(catalog))
+
+            pages = sorted(self.by_page.items(), key=lambda item: -item[1])[:CONTEXT_TOP_PAGES]
+            lines.append("\nPages les plus mesurées: "
+                         + ", ".join(f"p.{page + 1} ({count})" for page, count in pages))
+
+            recent, seen = [], set()
+            for key in reversed(self._recent):
+                c = self._contributions.get(key)
+                if c and key not in seen and len(recent) < CONTEXT_RECENT_MEASUREMENTS:
+                    seen.add(key)
+                    product = c['product'][1] if c['product'] else 'Aucun produit'
+                    recent.append(f"  • {c['label']}: {c['value']:.2f} {c['unit']} ({product})")
+            if recent:
+                lines.append("\nDernières mesures:")
+                lines.extend(recent)
+
+        text = "\n".join(lines)
+        if len(text) > max_chars:
+            text = text[:max_chars - 20].rsplit("\n", 1)[0] + "\n[... contexte abrégé]"
+        self._rendered = (render_key, text)
+        return text
+
+    def _product_lines(self, catalog) -> List[str]:
+        if not self.by_product:
+            return []
+        priced = []
+        for (category, name), data in self.by_product.items():
+            current = catalog.get_product(category, name) if catalog and category else None
+            price = float((current or {}).get('price', data['price']) or 0)
+            priced.append((data['quantity'] * price, price, data))
+
+        priced.sort(key=lambda item: -item[0])
+        lines = [f"\nProduits ({min(len(priced), CONTEXT_TOP_PRODUCTS)} principaux sur {len(priced)}, par coût):"]
+        for cost, price, data in priced[:CONTEXT_TOP_PRODUCTS]:
+            line = f"- {data['name']}"
+            if data['category']:
+                line += f" [{data['category']}]"
+            line += f": {data['quantity']:.2f} {data['unit']} ({data['count']} mesures)"
+            if price:
+                line += f" × {price:.2f}$ = {cost:.2f}$"
+            lines.append(line)
+        total_cost = sum(cost for cost, _price, _data in priced)
+        if total_cost:
+            lines.append(f"Coût estimé total: {total_cost:.2f}$")
+        return lines
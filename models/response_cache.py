@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Durée de validité d'une réponse en cache (secondes)
+RESPONSE_CACHE_TTL = 30 * 24 * 3600
+
+# Taille maximale du cache sur disque ; les entrées les moins récemment lues partent en premier
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+RESPONSE_CACHE_DIR = "ai_cache"
+
+def make_key(*parts) -> str:
+    """Empreinte SHA-256 des paramètres d'une requête (valeurs sérialisables en JSON)"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Cache disque des réponses du modèle, adressé par contenu
+
+    Une entrée est un fichier JSON nommé d'après l'empreinte de la requête
+    (modèle, profil, document, paramètres) : deux estimateurs qui analysent
+    le même document avec le même profil partagent la réponse. La date de
+    modification d'un fichier sert de date de dernière lecture pour
+    l'éviction ; les entrées plus vieilles que ttl sont ignorées puis
+    supprimées.
+    """
+
+    def __init__(self, cache_dir: str = RESPONSE_CACHE_DIR, ttl: float = RESPONSE_CACHE_TTL,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Réponse en cache, ou None si absente ou expirée"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get('response')
+
+    def put(self, key: str, response: str, **metadata):
+        """Enregistre une réponse puis réduit le cache s'il dépasse max_bytes"""
+        path = self._path(key)
+        entry = {'created': time.time(), 'response': response, 'metadata': metadata}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du cache IA: {str(e)}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        with os.scandir(self.cache_dir) as shards:
+            for shard in shards:
+                if shard.is_dir():
+                    with os.scandir(shard.path) as it:
+                        for entry in it:
+                            if entry.name.endswith('.json'):
+                                yield entry
+
+    def _disk_usage(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        # Les moins récemment lues d'abord, jusqu'à 90 % de la taille maximale
+        entries = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()))
+        self._size = sum(size for _mtime, size, _path in entries)
+        target = self.max_bytes * 0.9
+        for _mtime, size, path in entries:
+            if self._size <= target:
+                break
+            if self._remove(path):
+                self._size -= size
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            for entry in list(self._entries()):
+                self._remove(entry.path)
+            self._size = 0
+
+    def stats(self) -> Dict:
+        """Nombre d'entrées et taille totale en octets"""
+        sizes = [entry.stat().st_size for entry in self._entries()]
+        return {'entries': len(sizes), 'bytes': sum(sizes)}
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+def get_response_cache(cache_dir: str = RESPONSE_CACHE_DIR) -> ResponseCache:
+    """Cache de réponses partagé du processus (un par répertoire)"""
+    cache_dir = os.path.abspath(cache_dir)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ResponseCache(cache_dir)
+        return _caches[cache_dir]
@@ -0,0 +1,447 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from models.catalog_index import NGRAM, fold_accents, tokenize
+from models.price_history import apply_price, current_product
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    folded_name TEXT NOT NULL,
+    sku TEXT,
+    dimensions TEXT,
+    price REAL DEFAULT 0,
+    price_unit TEXT,
+    color TEXT,
+    extra TEXT,
+    UNIQUE (category, name)
+);
+CREATE INDEX IF NOT EXISTS idx_products_sku ON products(sku);
+CREATE INDEX IF NOT EXISTS idx_products_folded_name ON products(folded_name);
+"""
+
+# Index plein texte par trigrammes du nom replié : recherche de sous-chaînes,
+# comme CatalogIndex (« ton » trouve « Béton »)
+FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS products_trigram USING fts5(
+    folded_name, content='products', content_rowid='id', tokenize='trigram'
+)
+"""
+
+# Déclencheurs qui tiennent l'index à jour ligne par ligne
+FTS_TRIGGERS = {
+    'products_trigram_insert': """
+CREATE TRIGGER IF NOT EXISTS products_trigram_insert AFTER INSERT ON products BEGIN
+    INSERT INTO products_trigram(rowid, folded_name) VALUES (new.id, new.folded_name);
+END""",
+    'products_trigram_delete': """
+CREATE TRIGGER IF NOT EXISTS products_trigram_delete AFTER DELETE ON products BEGIN
+    INSERT INTO products_trigram(products_trigram, rowid, folded_name)
+    VALUES ('delete', old.id, old.folded_name);
+END""",
+    'products_trigram_update': """
+CREATE TRIGGER IF NOT EXISTS products_trigram_update AFTER UPDATE OF folded_name ON products BEGIN
+    INSERT INTO products_trigram(products_trigram, rowid, folded_name)
+    VALUES ('delete', old.id, old.folded_name);
+    INSERT INTO products_trigram(rowid, folded_name) VALUES (new.id, new.folded_name);
+END"""
+}
+
+# Ancien index par mots (préfixes seulement), remplacé par l'index de trigrammes
+LEGACY_FTS = ('products_fts_insert', 'products_fts_delete', 'products_fts_update')
+
+# Champs stockés dans des colonnes ; les autres vont dans 'extra' (JSON)
+PRODUCT_FIELDS = ('sku', 'dimensions', 'price', 'price_unit', 'color')
+
+# Nombre de produits écrits par executemany lors des imports
+UPSERT_BATCH = 5000
+
+def is_sqlite_catalog(filepath: str) -> bool:
+    """Indique si le fichier désigne un catalogue SQLite"""
+    return filepath.lower().endswith(('.db', '.sqlite'))
+
+class SQLiteProductCatalog:
+    """Catalogue de produits stocké dans une base SQLite
+
+    Même interface que ProductCatalog (get_product, get_products_by_category,
+    search_products, add_product, ...), mais chaque modification est une
+    requête unitaire validée immédiatement : l'ouverture ne charge rien en
+    mémoire et save_catalog n'a plus rien à réécrire. La recherche trouve
+    les mêmes produits que CatalogIndex (sous-chaînes du nom replié) : index
+    FTS5 de trigrammes, LIKE pour les termes plus courts qu'un trigramme ou
+    si FTS5 n'a pas le tokenizer trigram (SQLite < 3.34).
+
+    Une seule connexion est gardée ouverte (les lectures du catalogue sont
+    très fréquentes) et protégée par un verrou, Streamlit pouvant exécuter
+    les reruns dans des threads différents.
+    """
+
+    def __init__(self, catalog_file: str = "product_catalog.db",
+                 legacy_file: Optional[str] = "product_catalog.json"):
+        self.catalog_file = catalog_file
+        self.is_dirty = False
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(catalog_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Les remplacements (UPDATE OR REPLACE) déclenchent aussi la mise à jour de FTS
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self._conn.executescript(SCHEMA)
+        for name in LEGACY_FTS:
+            self._conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self._conn.execute("DROP TABLE IF EXISTS products_fts")
+        try:
+            created = not self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'products_trigram'"
+            ).fetchone()
+            self._conn.execute(FTS_TABLE)
+            for trigger in FTS_TRIGGERS.values():
+                self._conn.execute(trigger)
+            if created:
+                self._conn.execute("INSERT INTO products_trigram(products_trigram) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            self.fts_enabled = False
+        self._conn.commit()
+        self.ensure_default_catalog(legacy_file)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            try:
+                yield self._conn
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def ensure_default_catalog(self, legacy_file: Optional[str] = None):
+        """Remplit une base vide depuis l'ancien catalogue JSON ou le catalogue par défaut"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM categories LIMIT 1").fetchone():
+                return
+        catalog = None
+        if legacy_file and os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    catalog = json.load(f)
+            except Exception as e:
+                print(f"Erreur lors de la migration du catalogue: {str(e)}")
+        if not isinstance(catalog, dict) or not catalog:
+            from models.product_catalog import ProductCatalog
+            catalog = ProductCatalog.get_default_catalog()
+        self._replace_catalog(catalog)
+
+    def save_catalog(self):
+        """Les modifications sont déjà enregistrées : rien à réécrire"""
+        return True
+
+    # Lecture
+
+    @staticmethod
+    def _product_data(row: Tuple) -> Dict:
+        sku, dimensions, price, price_unit, color, extra = row
+        data = json.loads(extra) if extra else {}
+        data.update({
+            'dimensions': dimensions,
+            'price': price,
+            'price_unit': price_unit,
+            'color': color
+        })
+        if sku is not None:
+            data['sku'] = sku
+        return current_product(data)
+
+    def get_categories(self) -> List[str]:
+        """Retourne la liste des catégories"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM categories ORDER BY id").fetchall()
+        return [row[0] for row in rows]
+
+    def get_products_by_category(self, category: str) -> Dict[str, Dict]:
+        """Retourne les produits d'une catégorie"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT name, sku, dimensions, price, price_unit, color, extra
+                   FROM products WHERE category = ? ORDER BY id""",
+                (category,)
+            ).fetchall()
+        return {row[0]: self._product_data(row[1:]) for row in rows}
+
+    def get_product(self, category: str, product_name: str) -> Optional[Dict]:
+        """Récupère un produit spécifique"""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT sku, dimensions, price, price_unit, color, extra
+                   FROM products WHERE category = ? AND name = ?""",
+                (category, product_name)
+            ).fetchone()
+        return self._product_data(row) if row else None
+
+    def get_product_by_sku(self, sku: str) -> Optional[Tuple[str, str, Dict]]:
+        """Récupère un produit par son code fournisseur"""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT category, name, sku, dimensions, price, price_unit, color, extra
+                   FROM products WHERE sku = ? LIMIT 1""",
+                (sku,)
+            ).fetchone()
+        return (row[0], row[1], self._product_data(row[2:])) if row else None
+
+    def search_products(self, query: str, limit: Optional[int] = None) -> List[tuple]:
+        """Recherche des produits par nom (sans accents, classés par pertinence)
+
+        Mêmes produits que CatalogIndex : le nom replié contient chaque terme.
+        Mêmes niveaux de classement : noms qui commencent par la requête,
+        puis noms dont un mot (après une espace) commence par chaque terme,
+        puis les autres, les plus courts d'abord.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        prefix = ' '.join(fold_accents(query).split())
+        limit = -1 if limit is None else limit
+
+        # Trigrammes pour les termes assez longs, LIKE pour les plus courts ("x4")
+        indexed = [term for term in terms if self.fts_enabled and len(term) >= NGRAM]
+        scanned = [term for term in terms if term not in indexed]
+        conditions = ["p.folded_name LIKE ?" for _ in scanned]
+        params = [f"%{term}%" for term in scanned]
+        source = "products p"
+        if indexed:
+            source = "products_trigram t JOIN products p ON p.id = t.rowid"
+            conditions.insert(0, "products_trigram MATCH ?")
+            params.insert(0, ' AND '.join(f'"{term}"' for term in indexed))
+        word_start = ' AND '.join("(' ' || p.folded_name) LIKE ?" for _ in terms)
+        params += [len(prefix), prefix, len(prefix), prefix]
+        params += [f"% {term}%" for term in terms]
+        # Un seul terme : CatalogIndex classe ce niveau dans l'ordre des noms
+        word_order = "NULL"
+        if len(set(terms)) == 1:
+            word_order = f"CASE WHEN {word_start} THEN p.folded_name END"
+            params.append(f"% {terms[0]}%")
+        params.append(limit)
+        sql = f"""SELECT p.category, p.name, p.sku, p.dimensions, p.price,
+                         p.price_unit, p.color, p.extra
+                  FROM {source} WHERE {' AND '.join(conditions)}
+                  ORDER BY substr(p.folded_name, 1, ?) = ? DESC,
+                           CASE WHEN substr(p.folded_name, 1, ?) = ? THEN p.folded_name END,
+                           ({word_start}) DESC,
+                           {word_order},
+                           length(p.folded_name), p.folded_name
+                  LIMIT ?"""
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(row[0], row[1], self._product_data(row[2:])) for row in rows]
+
+    # Écriture
+
+    @staticmethod
+    def _product_row(category: str, name: str, data: Dict) -> Tuple:
+        extra = {k: v for k, v in data.items() if k not in PRODUCT_FIELDS}
+        return (
+            category, name, fold_accents(name),
+            data.get('sku'), data.get('dimensions'), data.get('price', 0),
+            data.get('price_unit'), data.get('color'),
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    @staticmethod
+    def _ensure_category(conn, category: str):
+        conn.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
+
+    def _upsert(self, conn, products: Iterable[Tuple[str, str, Dict]]) -> int:
+        categories = set()
+        rows = []
+
+        def flush():
+            conn.executemany(
+                "INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                [(row[0],) for row in rows if row[0] not in categories]
+            )
+            categories.update(row[0] for row in rows)
+            conn.executemany(
+                """INSERT INTO products (category, name, folded_name, sku, dimensions,
+                                         price, price_unit, color, extra)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (category, name) DO UPDATE SET
+                       sku = excluded.sku, dimensions = excluded.dimensions,
+                       price = excluded.price, price_unit = excluded.price_unit,
+                       color = excluded.color, extra = excluded.extra""",
+                rows
+            )
+
+        count = 0
+        for category, name, data in products:
+            rows.append(self._product_row(category, name, data))
+            count += 1
+            if len(rows) >= UPSERT_BATCH:
+                flush()
+                rows = []
+        if rows:
+            flush()
+        return count
+
+    def upsert_products(self, products: Iterable[Tuple[str, str, Dict]]) -> int:
+        """Ajoute ou remplace des produits (category, name, data) en une transaction"""
+        with self._transaction() as conn:
+            return self._upsert(conn, products)
+
+    def add_product(self, category: str, name: str, dimensions: str,
+                   price: float, unit: str = "pi²", color: str = "#CCCCCC") -> bool:
+        """Ajoute un nouveau produit"""
+        self.upsert_products([(category, name, {
+            'dimensions': dimensions,
+            'price': price,
+            'price_unit': unit,
+            'color': color
+        })])
+        return True
+
+    def update_product(self, category: str, old_name: str, new_name: str,
+                      dimensions: str, price: float, unit: str, color: str) -> bool:
+        """Met à jour un produit existant ; un changement de prix est ajouté à l'historique"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                """SELECT sku, dimensions, price, price_unit, color, extra
+                   FROM products WHERE category = ? AND name = ?""",
+                (category, old_name)
+            ).fetchone()
+            if not row:
+                return False
+            current = self._product_data(row)
+            updated = {**current, 'dimensions': dimensions, 'price_unit': unit, 'color': color}
+            if float(current.get('price', 0) or 0) != float(price):
+                updated = apply_price(updated, price)
+            else:
+                updated['price'] = price
+            extra = self._product_row(category, new_name, updated)[-1]
+
+            # Comme ProductCatalog, un produit du même nom est remplacé
+            cursor = conn.execute(
+                """UPDATE OR REPLACE products SET name = ?, folded_name = ?, dimensions = ?,
+                                       price = ?, price_unit = ?, color = ?, extra = ?
+                   WHERE category = ? AND name = ?""",
+                (new_name, fold_accents(new_name), dimensions, updated['price'], unit, color,
+                 extra, category, old_name)
+            )
+            return cursor.rowcount > 0
+
+    def delete_product(self, category: str, product_name: str) -> bool:
+        """Supprime un produit"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM products WHERE category = ? AND name = ?",
+                (category, product_name)
+            )
+            if not cursor.rowcount:
+                return False
+            # Supprimer la catégorie si elle est vide
+            if not conn.execute("SELECT 1 FROM products WHERE category = ? LIMIT 1",
+                                (category,)).fetchone():
+                conn.execute("DELETE FROM categories WHERE name = ?", (category,))
+            return True
+
+    def add_category(self, category: str) -> bool:
+        """Ajoute une nouvelle catégorie"""
+        with self._transaction() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
+            return cursor.rowcount > 0
+
+    def delete_category(self, category: str) -> bool:
+        """Supprime une catégorie et tous ses produits"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM products WHERE category = ?", (category,))
+            cursor = conn.execute("DELETE FROM categories WHERE name = ?", (category,))
+            return cursor.rowcount > 0
+
+    # Import / export
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict]]:
+        """Catalogue complet au format JSON de ProductCatalog"""
+        catalog = {category: {} for category in self.get_categories()}
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT category, name, sku, dimensions, price, price_unit, color, extra
+                   FROM products ORDER BY id"""
+            ).fetchall()
+        for row in rows:
+            catalog.setdefault(row[0], {})[row[1]] = self._product_data(row[2:])
+        return catalog
+
+    def _replace_catalog(self, catalog: Dict[str, Dict[str, Dict]]):
+        with self._transaction() as conn:
+            # Import en bloc : sans déclencheurs, puis reconstruction de
+            # l'index plein texte (bien plus rapide que ligne par ligne)
+            if self.fts_enabled:
+                for name in FTS_TRIGGERS:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.execute("DELETE FROM products")
+            conn.execute("DELETE FROM categories")
+            for category in catalog:
+                self._ensure_category(conn, category)
+            self._upsert(conn, (
+                (category, name, data)
+                for category, products in catalog.items()
+                for name, data in products.items()
+            ))
+            if self.fts_enabled:
+                conn.execute("INSERT INTO products_trigram(products_trigram) VALUES ('rebuild')")
+                for trigger in FTS_TRIGGERS.values():
+                    conn.execute(trigger)
+
+    def export_catalog(self, file_path: str) -> bool:
+        """Exporte le catalogue vers un fichier"""
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'export du catalogue: {str(e)}")
+            return False
+
+    def export_catalog_to_string(self) -> str:
+        """Exporte le catalogue vers une chaîne JSON"""
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+
+    def import_catalog(self, file_path: str) -> bool:
+        """Importe un catalogue depuis un fichier"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                new_catalog = json.load(f)
+            if isinstance(new_catalog, dict):
+                self._replace_catalog(new_catalog)
+                return True
+            return False
+        except Exception as e:
+            print(f"Erreur lors de l'import du catalogue: {str(e)}")
+            return False
+
+    def import_catalog_from_file(self, file_obj) -> bool:
+        """Importe un catalogue depuis un objet fichier Streamlit"""
+        try:
+            content = file_obj.read()
+            if isinstance(content, bytes):
+                content = content.decode('utf-8')
+            new_catalog = json.loads(content)
+            if isinstance(new_catalog, dict):
+                self._replace_catalog(new_catalog)
+                return True
+            return False
+        except Exception as e:
+            print(f"Erreur lors de l'import du catalogue: {str(e)}")
+            return False
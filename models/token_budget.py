@@ -0,0 +1,63 @@
+import math
+from typing import Dict, List, Tuple
+
+# Budget de jetons d'entrée d'une question de chat (profil, résumé, historique, contexte, question)
+CHAT_INPUT_BUDGET = 20000
+
+# Après un résumé, l'historique conservé ne dépasse pas cette part de son budget,
+# pour ne pas relancer un résumé à chaque tour
+HISTORY_REFILL_RATIO = 0.5
+
+# Longueur maximale du résumé glissant (jetons de sortie)
+SUMMARY_MAX_TOKENS = 600
+
+# Caractères par jeton, estimation prudente pour du français technique
+CHARS_PER_TOKEN = 3.5
+
+# Surcoût approximatif de chaque message (rôle, délimiteurs)
+MESSAGE_OVERHEAD = 4
+
+def estimate_tokens(text: str) -> int:
+    """Estimation locale du nombre de jetons d'un texte (sans appel à l'API)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def message_tokens(message: Dict) -> int:
+    content = message['content']
+    if isinstance(content, list):
+        content = "".join(block.get('text', '') for block in content)
+    return estimate_tokens(content) + MESSAGE_OVERHEAD
+
+def split_history(history: List[Dict], budget: int, max_messages: int) -> Tuple[int, int]:
+    """Découpe l'historique en (à résumer, à garder) ; retourne (début gardé, jetons gardés)
+
+    Les messages les plus récents sont gardés tant qu'ils tiennent dans le
+    budget et dans max_messages. Si des messages doivent être écartés, on
+    ne garde que HISTORY_REFILL_RATIO du budget pour que le prochain
+    dépassement arrive plusieurs tours plus tard. Le premier message gardé
+    est toujours une question de l'utilisateur, comme l'exige l'API.
+    """
+    def fit(limit_tokens: float, limit_messages: int) -> Tuple[int, int]:
+        start, used = len(history), 0
+        while start > 0 and len(history) - start < limit_messages:
+            cost = message_tokens(history[start - 1])
+            if used + cost > limit_tokens:
+                break
+            start -= 1
+            used += cost
+        return start, used
+
+    start, used = fit(budget, max_messages)
+    if start > 0:
+        start, used = fit(budget * HISTORY_REFILL_RATIO, max(1, int(max_messages * HISTORY_REFILL_RATIO)))
+    while start < len(history) and history[start]['role'] != 'user':
+        used -= message_tokens(history[start])
+        start += 1
+    return start, used
+
+def format_transcript(messages: List[Dict]) -> str:
+    """Échanges sous forme de texte, pour la demande de résumé"""
+    lines = []
+    for message in messages:
+        role = "Utilisateur" if message['role'] == 'user' else "Assistant"
+        lines.append(f"{role}: {message['content']}")
+    return "\n\n".join(lines)
@@ -0,0 +1,36 @@
+"""Recherche du catalogue pendant la saisie : termes courts sur un grand catalogue"""
+import time
+import pytest
+
+from benchmarks.bench_catalog_search import make_catalog
+from models.catalog_index import CatalogIndex, fold_accents
+
+@pytest.fixture(scope='module')
+def index():
+    index = CatalogIndex()
+    index.rebuild(make_catalog(60000))
+    return index
+
+@pytest.mark.parametrize('query', ['x4', 'pi', 'e', 'q', 'zz', '4 pi', 'x4 zz'])
+def test_short_terms_stay_fast(index, query):
+    index.search(query, 20)
+    start = time.perf_counter()
+    results = index.search(query, 20)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.05
+    terms = fold_accents(query).split()
+    assert all(all(term in fold_accents(name) for term in terms) for _category, name in results)
+
+def test_short_terms_rank_like_the_full_scan():
+    catalog = make_catalog(2000)
+    index = CatalogIndex()
+    index.rebuild(catalog)
+    names = sorted((fold_accents(name) for products in catalog.values() for name in products),
+                   key=lambda folded: (len(folded), folded))
+
+    results = [fold_accents(name) for _category, name in index.search('x4', 10)]
+
+    # Aucun nom ne commence par "x4" ni n'a de mot qui commence par "x4" :
+    # niveau 3 seul, les plus courts d'abord
+    assert results == [folded for folded in names if 'x4' in folded][:10]
@@ -0,0 +1,40 @@
+"""Même recherche pour le catalogue JSON (CatalogIndex) et le catalogue SQLite"""
+import json
+import pytest
+
+from benchmarks.bench_catalog_search import make_catalog
+from models.product_catalog import ProductCatalog
+from models.sqlite_catalog import SQLiteProductCatalog
+
+QUERIES = ['ton', 'beton', 'Béton 8', 'x4', 'pi', 'e', 'q', 'zz', '12pi', '2x4 gyp', 'brique 5/8', 'bloc']
+
+@pytest.fixture(scope='module')
+def catalogs(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('catalogues')
+    catalog = make_catalog(3000)
+    catalog['Béton'] = {'Béton 30 MPa': {'price': 1.0}, 'Bloc de béton 8po': {'price': 2.0},
+                        'Tonneau': {'price': 3.0}}
+    json_file = tmp_path / "catalogue.json"
+    json_file.write_text(json.dumps(catalog), encoding='utf-8')
+    sqlite_catalog = SQLiteProductCatalog(str(tmp_path / "catalogue.db"), legacy_file=str(json_file))
+    yield ProductCatalog(str(json_file)), sqlite_catalog
+    sqlite_catalog.close()
+
+def names(results):
+    return [(category, name) for category, name, _data in results]
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_backends_find_the_same_products(catalogs, query):
+    json_catalog, sqlite_catalog = catalogs
+
+    expected = names(json_catalog.search_products(query))
+    found = names(sqlite_catalog.search_products(query))
+
+    assert sorted(found) == sorted(expected)
+    assert found[:1] == expected[:1]
+
+def test_substring_inside_a_word(catalogs):
+    for catalog in catalogs:
+        found = names(catalog.search_products('ton', limit=None))
+        assert ('Béton', 'Béton 30 MPa') in found
+        assert ('Béton', 'Tonneau') in found
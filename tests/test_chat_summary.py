@@ -0,0 +1,60 @@
+"""Résumé glissant du chat : calculé en arrière-plan, compté seulement s'il réussit"""
+import threading
+from types import SimpleNamespace
+
+from models.ai_assistant import AIAssistant
+from models.response_cache import ResponseCache
+
+class _Messages:
+    def __init__(self):
+        self.release = threading.Event()
+        self.fail = False
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("surcharge")
+        return SimpleNamespace(content=[SimpleNamespace(text="Résumé")], usage=None)
+
+def make_assistant(tmp_path):
+    client = SimpleNamespace(messages=_Messages())
+    assistant = AIAssistant(client=client, response_cache=ResponseCache(str(tmp_path)))
+    for i in range(6):
+        assistant.add_to_history('user', f"Question {i}")
+        assistant.add_to_history('assistant', f"Réponse {i}")
+    return assistant, client.messages
+
+def build(assistant):
+    return assistant._build_chat_request("Nouvelle question", "Profil", {}, 4)
+
+def test_request_does_not_wait_for_the_summary(tmp_path):
+    assistant, messages = make_assistant(tmp_path)
+
+    _system, request_messages, _estimate = build(assistant)
+
+    # La requête est prête alors que le résumé est encore bloqué
+    assert len(request_messages) <= 5
+    assert assistant.summarized_count == 0
+    messages.release.set()
+    assert assistant.wait_for_summary(5)
+    assert assistant.history_summary == "Résumé"
+    assert assistant.summarized_count == assistant._fold_end > 0
+
+def test_failed_summary_is_not_counted(tmp_path):
+    assistant, messages = make_assistant(tmp_path)
+    messages.fail = True
+    messages.release.set()
+
+    build(assistant)
+    assert assistant.wait_for_summary(5)
+
+    assert assistant.summarized_count == 0
+    assert assistant.history_summary == ""
+    # Les messages écartés sont repliés à nouveau à la question suivante
+    messages.fail = False
+    build(assistant)
+    assert assistant.wait_for_summary(5)
+    assert messages.calls == 2
+    assert assistant.summarized_count > 0
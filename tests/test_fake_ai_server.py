@@ -0,0 +1,118 @@
+"""Client IA et analyse par lots contre le serveur local de benchmarks/fake_ai_server.py"""
+import asyncio
+import os
+import random
+import pytest
+
+anthropic = pytest.importorskip("anthropic")
+
+from benchmarks.fake_ai_server import FakeAIServer
+from models import ai_client, batch_analysis
+from models.ai_client import AsyncAIClient
+from models.batch_analysis import BatchAnalysisJob
+
+PARAMS = {'model': 'fake', 'max_tokens': 50, 'messages': [{'role': 'user', 'content': "Question"}]}
+
+@pytest.fixture
+def server():
+    server = FakeAIServer(requests_per_minute=10000, error_rate=0.0, latency=0.05, batch_delay=0.2).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ai_client, 'BACKOFF_BASE', 0.01)
+
+def run_client(server, coroutine_factory, **client_options):
+    async def main():
+        client = AsyncAIClient(
+            anthropic.AsyncAnthropic(api_key='fake', base_url=server.base_url, max_retries=0),
+            **client_options
+        )
+        return client, await coroutine_factory(client)
+    return asyncio.run(main())
+
+def test_retries_after_429_and_529(server):
+    server.scripted.extend([(429, 0.1), (529, None)])
+
+    client, message = run_client(server, lambda client: client.create(**PARAMS), requests_per_minute=6000)
+
+    assert message.content[0].text.startswith("Réponse")
+    assert client.stats == {'requests': 1, 'retries': 2, 'rate_limited': 1, 'errors': 0}
+    assert server.stats['rate_limited'] == 1
+    assert server.stats['overloaded'] == 1
+    assert server.stats['ok'] == 1
+
+def test_stream_retried_before_first_fragment(server):
+    server.scripted.append((529, None))
+    fragments = []
+
+    client, message = run_client(
+        server, lambda client: client.stream(fragments.append, **PARAMS), requests_per_minute=6000
+    )
+
+    assert "".join(fragments) == message.content[0].text
+    assert client.stats['retries'] == 1
+
+def test_gives_up_after_max_retries(server):
+    server.scripted.extend([(529, None)] * 3)
+
+    with pytest.raises(anthropic.APIStatusError) as error:
+        run_client(server, lambda client: client.create(**PARAMS),
+                   requests_per_minute=6000, max_retries=2)
+
+    assert error.value.status_code == 529
+    assert server.stats['requests'] == 3
+    assert server.stats['ok'] == 0
+
+def test_concurrency_cap(server):
+    server.latency = 0.2
+
+    async def burst(client):
+        return await asyncio.gather(*(client.create(**PARAMS) for _ in range(12)))
+
+    client, messages = run_client(server, burst, max_concurrency=3, requests_per_minute=6000)
+
+    assert len(messages) == 12
+    assert server.stats['ok'] == 12
+    assert server.stats['max_in_flight'] == 3
+
+def test_batch_job_resumes_after_interruption(server, tmp_path, monkeypatch):
+    random.seed(1)
+    server.error_rate = 0.3
+    pages = {}
+    for i in range(3):
+        pdf_path = tmp_path / f"plans_{i + 1}.pdf"
+        pdf_path.write_bytes(f"document {i}".encode('utf-8'))
+        pages[os.path.abspath(pdf_path)] = [f"Page {n} du document {i} : mur de gypse" for n in range(1, 6)]
+    monkeypatch.setattr(batch_analysis, '_read_pages', lambda path: pages[os.path.abspath(path)])
+
+    client = anthropic.Anthropic(api_key='fake', base_url=server.base_url, max_retries=0)
+    state_file = str(tmp_path / "travail.json")
+
+    # Première exécution interrompue juste après la soumission
+    job = BatchAnalysisJob.load(client, state_file, "Profil de test")
+    for pdf_path in pages:
+        job.add_document(pdf_path)
+    first_batches = job.submit()
+    assert len(first_batches) == 1
+
+    # Reprise : les pages soumises ne le sont pas une seconde fois
+    job = BatchAnalysisJob.load(client, state_file, "Profil de test")
+    for pdf_path in pages:
+        assert job.add_document(pdf_path) == 0
+    assert job.submit() == []
+    results = job.run(poll_interval=0.05)
+
+    summary = job.summary()
+    assert summary['pages'] == 15
+    assert summary['pending'] == 0
+    assert len(results) == 15
+    assert summary['succeeded'] + summary['failed'] == 15
+    assert summary['batches'] == len(server.batches)
+    # Les pages en erreur sont soumises à nouveau dans un lot suivant
+    assert summary['batches'] > 1
+
+    project = job.apply_to_project({'measurements': []})
+    assert sum(len(document['pages']) for document in project['ai_page_analyses'].values()) == 15
@@ -0,0 +1,52 @@
+"""Prix datés dans le futur : pris en compte à la lecture une fois leur date atteinte"""
+from datetime import date
+import pytest
+
+from models import price_history
+from models.price_history import apply_price, current_product
+from models.product_catalog import ProductCatalog
+from models.sqlite_catalog import SQLiteProductCatalog
+from utils.measurement_tools import MeasurementTools
+
+class _Date(date):
+    today_value = date(2026, 1, 1)
+
+    @classmethod
+    def today(cls):
+        return cls.today_value
+
+@pytest.fixture
+def today(monkeypatch):
+    monkeypatch.setattr(price_history, 'date', _Date)
+    _Date.today_value = date(2026, 1, 1)
+    return _Date
+
+@pytest.fixture(params=['json', 'sqlite'])
+def catalog(request, tmp_path):
+    if request.param == 'sqlite':
+        catalog = SQLiteProductCatalog(str(tmp_path / "catalogue.db"), legacy_file=None)
+    else:
+        catalog = ProductCatalog(str(tmp_path / "catalogue.json"))
+    catalog.add_category('Bois')
+    catalog.add_product('Bois', '2x4 Épinette 8pi', '2x4', 99.0, 'unité', '#8B4513')
+    return catalog
+
+def test_future_price_applies_once_its_date_is_reached(today, catalog):
+    product = catalog.get_product('Bois', '2x4 Épinette 8pi')
+    catalog.upsert_products([('Bois', '2x4 Épinette 8pi', apply_price(product, 120.0, '2030-01-01'))])
+
+    assert catalog.get_product('Bois', '2x4 Épinette 8pi')['price'] == 99.0
+
+    today.today_value = date(2030, 1, 2)
+    assert catalog.get_product('Bois', '2x4 Épinette 8pi')['price'] == 120.0
+    assert catalog.get_products_by_category('Bois')['2x4 Épinette 8pi']['price'] == 120.0
+    assert catalog.search_products('2x4')[0][2]['price'] == 120.0
+
+    measurements = [{'value': 2.0, 'unit': 'unité',
+                     'product': {'name': '2x4 Épinette 8pi', 'category': 'Bois'}}]
+    totals = MeasurementTools().calculate_totals(measurements, catalog)
+    assert totals[0]['Prix unitaire'] == "120.00$"
+
+def test_current_product_without_history_is_unchanged(today):
+    data = {'price': 5.0}
+    assert current_product(data) is data
@@ -0,0 +1,42 @@
+"""Journal .tak partagé par plusieurs écrivains et entrées incohérentes"""
+import threading
+
+from utils.project_journal import ProjectJournal
+from utils.tak_format import load_snapshot, write_snapshot
+
+def test_two_writers_share_one_sequence(tmp_path):
+    snapshot_path = str(tmp_path / "projet.tak")
+    write_snapshot(snapshot_path, {'measurements': [], 'journal_seq': 0}, binary=True)
+    journals = [ProjectJournal(snapshot_path, compact_every=7), ProjectJournal(snapshot_path, compact_every=11)]
+
+    def write(journal, tag):
+        for i in range(50):
+            journal.log_add({'id': f"{tag}{i}", 'value': i})
+
+    threads = [threading.Thread(target=write, args=(journal, tag)) for journal, tag in zip(journals, 'ab')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for journal in journals:
+        if journal._compaction_thread:
+            journal._compaction_thread.join()
+
+    seqs = [record['seq'] for record in journals[0]._read_records()]
+    assert seqs == sorted(set(seqs))
+    project = ProjectJournal(snapshot_path).replay(load_snapshot(snapshot_path))
+    assert len({m['id'] for m in project['measurements']}) == 100
+
+def test_record_for_unknown_measurement_is_skipped(tmp_path, capsys):
+    snapshot_path = str(tmp_path / "projet.tak")
+    write_snapshot(snapshot_path, {'measurements': [{'id': 'm1'}], 'journal_seq': 0}, binary=True)
+    journal = ProjectJournal(snapshot_path)
+    journal.log_update({'id': 'absente', 'value': 1})
+    journal.log_delete('absente')
+    journal.log_add({'id': 'm2'})
+
+    project = ProjectJournal(snapshot_path).replay(load_snapshot(snapshot_path))
+
+    assert [m['id'] for m in project['measurements']] == ['m1', 'm2']
+    assert project['journal_seq'] == 3
+    assert "absente" in capsys.readouterr().out
@@ -0,0 +1,35 @@
+"""Totaux par produit : montants numériques et total général"""
+import pytest
+
+from utils.measurement_tools import MeasurementTools
+
+class _Catalog:
+    def __init__(self, products):
+        self.products = products
+
+    def get_product(self, category, name):
+        return self.products.get((category, name))
+
+def measurement(name, value):
+    return {'value': value, 'unit': 'pi²', 'product': {'name': name, 'category': 'Gypse'}}
+
+def test_grand_total_sums_numeric_totals():
+    tools = MeasurementTools()
+    catalog = _Catalog({('Gypse', 'Gypse 1/2'): {'price': 12.5, 'price_unit': 'feuille'},
+                        ('Gypse', 'Gypse 5/8'): {'price': 0}})
+    totals = tools.product_totals(
+        [measurement('Gypse 1/2', 2.0), measurement('Gypse 1/2', 1.0), measurement('Gypse 5/8', 4.0)],
+        catalog
+    )
+
+    assert tools.grand_total(totals) == pytest.approx(37.5)
+    rows = {row['Produit']: row for row in tools.format_totals(totals)}
+    assert rows['Gypse 1/2']['Prix total'] == "37.50$"
+    assert rows['Gypse 5/8']['Prix total'] == 'N/D'
+
+def test_bad_price_raises():
+    tools = MeasurementTools()
+    catalog = _Catalog({('Gypse', 'Gypse 1/2'): {'price': 'douze'}})
+
+    with pytest.raises(TypeError):
+        tools.product_totals([measurement('Gypse 1/2', 2.0)], catalog)
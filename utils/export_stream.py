@@ -0,0 +1,135 @@
+import csv
+import gzip
+import io
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import xlsxwriter
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+# Colonnes communes aux exports CSV et XLSX
+EXPORT_COLUMNS = ['Type', 'Nom', 'Valeur', 'Unité', 'Page',
+                  'Produit', 'Catégorie', 'Prix unitaire', 'Quantité']
+
+# Colonnes de la feuille des totaux (voir MeasurementTools.calculate_totals)
+TOTALS_COLUMNS = ['Produit', 'Catégorie', 'Quantité', 'Unité',
+                  'Prix unitaire', 'Prix total', 'Nb mesures']
+
+# Colonnes de totaux écrites comme nombres (calculate_totals les met en texte)
+TOTALS_CURRENCY_COLUMNS = ('Prix unitaire', 'Prix total')
+TOTALS_NUMBER_COLUMNS = ('Quantité', 'Nb mesures') + TOTALS_CURRENCY_COLUMNS
+
+def iter_measurement_rows(measurements: Iterable[Dict]) -> Iterator[List]:
+    """Génère une ligne d'export par mesure (valeurs numériques brutes)"""
+    for m in measurements:
+        product = m.get('product') or {}
+        value = float(m.get('value', 0) or 0)
+        yield [
+            m.get('type', ''),
+            m.get('label', ''),
+            value,
+            m.get('unit', ''),
+            m.get('page', 0) + 1,
+            product.get('name', ''),
+            product.get('category', ''),
+            float(product.get('price', 0) or 0),
+            value
+        ]
+
+def _format_csv_row(row: List) -> List:
+    # Même présentation que l'ancien export : deux décimales
+    return [f"{v:.2f}" if isinstance(v, float) else v for v in row]
+
+def iter_csv_chunks(rows: Iterable[List], header: Optional[List[str]] = None,
+                    chunk_rows: int = 1000) -> Iterator[str]:
+    """Génère le CSV par blocs de chunk_rows lignes (mémoire bornée)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+
+    count = 0
+    for row in rows:
+        writer.writerow(_format_csv_row(row))
+        count += 1
+        if count >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def write_csv(measurements: Iterable[Dict], filepath: str, compress: bool = False,
+              chunk_rows: int = 1000) -> str:
+    """Écrit les mesures en CSV par blocs, compressé en gzip si demandé"""
+    if compress:
+        f = gzip.open(filepath, 'wt', encoding='utf-8', newline='')
+    else:
+        f = open(filepath, 'w', encoding='utf-8', newline='')
+    with f:
+        for chunk in iter_csv_chunks(iter_measurement_rows(measurements), EXPORT_COLUMNS, chunk_rows):
+            f.write(chunk)
+    return filepath
+
+def _totals_number(value) -> Optional[float]:
+    """Valeur numérique d'une cellule de totaux ('12.34$', '3.50', 4) ; None pour 'N/D'"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace('$', '').replace(' ', ''))
+    except ValueError:
+        return None
+
+def write_xlsx(measurements: List[Dict], filepath: str,
+               totals: Optional[List[Dict]] = None) -> str:
+    """Écrit un classeur XLSX : une feuille de totaux puis une feuille par page
+
+    Le classeur est écrit en mode constant_memory : chaque ligne est vidée
+    sur disque dès que la suivante commence, les feuilles sont donc remplies
+    l'une après l'autre, dans l'ordre des lignes.
+    """
+    if not XLSX_AVAILABLE:
+        raise ImportError("Le module xlsxwriter est requis pour l'export XLSX")
+
+    # Index des mesures par page (références, sans copie)
+    by_page = {}
+    for m in measurements:
+        by_page.setdefault(m.get('page', 0), []).append(m)
+
+    workbook = xlsxwriter.Workbook(filepath, {'constant_memory': True})
+    try:
+        bold = workbook.add_format({'bold': True})
+        number = workbook.add_format({'num_format': '0.00'})
+        currency = workbook.add_format({'num_format': '#,##0.00 $'})
+
+        sheet = workbook.add_worksheet('Totaux')
+        sheet.write_row(0, 0, TOTALS_COLUMNS, bold)
+        for row_index, row in enumerate(totals or [], start=1):
+            for col_index, column in enumerate(TOTALS_COLUMNS):
+                value = row.get(column, '')
+                amount = _totals_number(value) if column in TOTALS_NUMBER_COLUMNS else None
+                if amount is None:
+                    sheet.write(row_index, col_index, value)
+                elif column in TOTALS_CURRENCY_COLUMNS:
+                    sheet.write_number(row_index, col_index, amount, currency)
+                elif isinstance(amount, float):
+                    sheet.write_number(row_index, col_index, amount, number)
+                else:
+                    sheet.write_number(row_index, col_index, amount)
+
+        for page in sorted(by_page):
+            sheet = workbook.add_worksheet(f"Page {page + 1}")
+            sheet.write_row(0, 0, EXPORT_COLUMNS, bold)
+            for row_index, row in enumerate(iter_measurement_rows(by_page[page]), start=1):
+                for col_index, value in enumerate(row):
+                    if isinstance(value, float):
+                        sheet.write_number(row_index, col_index, value, number)
+                    else:
+                        sheet.write(row_index, col_index, value)
+    finally:
+        workbook.close()
+    return filepath
@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional
+from utils.tak_format import read_page
+from utils.sqlite_project_store import SQLiteProjectBackend
+
+# Un projet chargé paresseusement porte une clé 'lazy' :
+#   source          : fichier d'origine (.tak binaire v2 ou .takdb)
+#   format          : 'binary' ou 'sqlite'
+#   page_counts     : nombre de mesures par page ({"page": nombre})
+#   page_aggregates : totaux par page calculés à l'enregistrement
+#   hydrated        : pages dont les mesures sont chargées en mémoire
+
+def make_lazy_state(source: str, fmt: str, page_counts: Dict,
+                    page_aggregates: Dict) -> Dict:
+    """Construit l'état de chargement paresseux d'un projet"""
+    return {
+        'source': source,
+        'format': fmt,
+        'page_counts': {str(page): count for page, count in page_counts.items()},
+        'page_aggregates': {str(page): agg for page, agg in page_aggregates.items()},
+        'hydrated': []
+    }
+
+def is_page_loaded(project_data: Dict, page: int) -> bool:
+    """Indique si les mesures d'une page sont en mémoire"""
+    lazy = project_data.get('lazy')
+    if not lazy:
+        return True
+    return str(page) not in lazy['page_counts'] or page in lazy['hydrated']
+
+def _read_page(lazy: Dict, page: int) -> List[Dict]:
+    if lazy['format'] == 'sqlite':
+        return SQLiteProjectBackend(lazy['source']).get_page_measurements(page)
+    return read_page(lazy['source'], page)
+
+def hydrate_page(project_data: Dict, page: int) -> int:
+    """Charge les mesures d'une page si nécessaire ; retourne le nombre ajouté
+
+    Appelé à chaque rerun pour la page affichée : sans effet (O(1)) une fois
+    la page chargée.
+    """
+    if is_page_loaded(project_data, page):
+        return 0
+
+    lazy = project_data['lazy']
+    # Identifiants déjà présents sur disque (attribués à l'écriture du fichier)
+    measurements = _read_page(lazy, page)
+    project_data['measurements'].extend(measurements)
+    lazy['hydrated'].append(page)
+    return len(measurements)
+
+def hydrate_all(project_data: Dict):
+    """Charge toutes les pages puis retire l'état paresseux (export, sauvegarde)"""
+    lazy = project_data.get('lazy')
+    if not lazy:
+        return
+    for page in sorted(lazy['page_counts'], key=int):
+        hydrate_page(project_data, int(page))
+    project_data.pop('lazy', None)
+
+def unloaded_aggregates(project_data: Dict) -> List[Dict]:
+    """Agrégats des pages non chargées (à combiner avec les mesures en mémoire)"""
+    lazy = project_data.get('lazy')
+    if not lazy:
+        return []
+    return [
+        lazy['page_aggregates'].get(page, {})
+        for page in lazy['page_counts']
+        if int(page) not in lazy['hydrated']
+    ]
+
+def measurement_count(project_data: Dict, page: Optional[int] = None) -> int:
+    """Nombre total de mesures, pages non chargées comprises"""
+    measurements = project_data.get('measurements', [])
+    lazy = project_data.get('lazy')
+    if page is not None:
+        if not is_page_loaded(project_data, page):
+            return lazy['page_counts'].get(str(page), 0)
+        return sum(1 for m in measurements if m.get('page', 0) == page)
+
+    count = len(measurements)
+    if lazy:
+        count += sum(
+            n for page_key, n in lazy['page_counts'].items()
+            if int(page_key) not in lazy['hydrated']
+        )
+    return count
+
+def discard_unloaded(project_data: Dict):
+    """Oublie les pages non chargées (suppression de toutes les mesures)"""
+    project_data.pop('lazy', None)
@@ -1,6 +1,7 @@
 import math
 import numpy as np
 from typing import List, Dict, Tuple, Optional
+from models.price_history import PriceIndex, price_history
 
 class MeasurementTools:
     """Outils pour les calculs de mesures"""
@@ -101,8 +102,19 @@ class MeasurementTools:
         
         return value
     
+    @staticmethod
+    def screen_to_page(points: List[Tuple[float, float]], zoom: float) -> List[Tuple[float, float]]:
+        """Convertit des coordonnées écran (pixels au zoom donné) en points PDF"""
+        zoom = zoom or 1.0
+        return [(p[0] / zoom, p[1] / zoom) for p in points]
+    
+    @staticmethod
+    def page_to_screen(points: List[Tuple[float, float]], zoom: float) -> List[Tuple[float, float]]:
+        """Convertit des points PDF en coordonnées écran au zoom donné"""
+        return [(p[0] * zoom, p[1] * zoom) for p in points]
+    
     def apply_calibration(self, pixel_value: float, calibration: Dict) -> float:
-        """Applique la calibration pour convertir des pixels en unités réelles"""
+        """Applique la calibration pour convertir des points PDF en unités réelles"""
         cal_value = calibration.get('value', 1.0)
         return pixel_value * cal_value
     
@@ -118,59 +130,101 @@ class MeasurementTools:
             # Unités linéaires
             return f"{value:.{precision}f} {unit}"
     
-    def calculate_totals(self, measurements: List[Dict], catalog: Optional[object] = None) -> List[Dict]:
-        """Calcule les totaux par produit"""
+    def calculate_totals(self, measurements: List[Dict], catalog: Optional[object] = None,
+                         page_aggregates: Optional[List[Dict]] = None,
+                         as_of=None, price_index: Optional[PriceIndex] = None) -> List[Dict]:
+        """Calcule les totaux par produit, formatés pour l'affichage
+        
+        Mêmes paramètres que product_totals ; les montants sont du texte
+        ("12.34$" ou 'N/D').
+        """
+        return self.format_totals(
+            self.product_totals(measurements, catalog, page_aggregates, as_of, price_index)
+        )
+    
+    def product_totals(self, measurements: List[Dict], catalog: Optional[object] = None,
+                       page_aggregates: Optional[List[Dict]] = None,
+                       as_of=None, price_index: Optional[PriceIndex] = None) -> List[Dict]:
+        """Calcule les totaux par produit (valeurs numériques)
+        
+        page_aggregates : agrégats des pages non chargées d'un projet ouvert
+        paresseusement (voir utils.lazy_project.unloaded_aggregates).
+        as_of : date des prix (historique du catalogue) au lieu des prix
+        actuels ; price_index permet de réutiliser le même index pour
+        chiffrer plusieurs projets.
+        """
         totals = {}
+        product_cache = {}
         
-        for measurement in measurements:
-            product = measurement.get('product', {})
-            product_name = product.get('name')
-            
-            if not product_name:
-                continue
-            
-            # Obtenir les détails du produit
-            category = product.get('category')
-            product_data = None
-            if catalog and category:
-                product_data = catalog.get_product(category, product_name)
-            
+        def add_quantity(product_name, category, unit, value, count):
             if product_name not in totals:
+                # Obtenir les détails du produit
+                key = (category, product_name)
+                if key not in product_cache:
+                    product_cache[key] = (
+                        catalog.get_product(category, product_name) if catalog and category else None
+                    )
+                product_data = product_cache[key]
                 totals[product_name] = {
                     'name': product_name,
                     'category': category,
                     'quantity': 0,
-                    'unit': measurement.get('unit', ''),
-                    'measurements': [],
+                    'unit': unit,
+                    'count': 0,
                     'price_unit': product_data.get('price_unit', '') if product_data else '',
                     'unit_price': product_data.get('price', 0) if product_data else 0
                 }
-            
-            # Ajouter la mesure
-            value = measurement.get('value', 0)
             totals[product_name]['quantity'] += value
-            totals[product_name]['measurements'].append({
-                'label': measurement.get('label', 'Sans nom'),
-                'value': value,
-                'type': measurement.get('type', '')
-            })
+            totals[product_name]['count'] += count
         
-        # Calculer les prix totaux
-        result = []
-        for product_name, data in totals.items():
-            total_price = data['quantity'] * data['unit_price']
+        for measurement in measurements:
+            product = measurement.get('product', {})
+            product_name = product.get('name')
             
-            result.append({
-                'Produit': product_name,
-                'Catégorie': data['category'] or 'Non catégorisé',
-                'Quantité': f"{data['quantity']:.2f}",
-                'Unité': data['unit'],
-                'Prix unitaire': f"{data['unit_price']:.2f}$" if data['unit_price'] > 0 else 'N/D',
-                'Prix total': f"{total_price:.2f}$" if total_price > 0 else 'N/D',
-                'Nb mesures': len(data['measurements'])
-            })
-        
-        return result
+            if not product_name:
+                continue
+            
+            add_quantity(product_name, product.get('category'), measurement.get('unit', ''),
+                         measurement.get('value', 0), 1)
+        
+        # Pages non chargées : totaux précalculés, sans lire la géométrie
+        for aggregate in page_aggregates or []:
+            for item in aggregate.get('products', []):
+                add_quantity(item['name'], item.get('category'), item.get('unit', ''),
+                             item.get('quantity', 0), item.get('count', 0))
+        
+        # Prix à la date demandée : une seule recherche pour tous les produits
+        if as_of is not None and totals:
+            if price_index is None:
+                price_index = PriceIndex({
+                    key: price_history(data) for key, data in product_cache.items() if data
+                })
+            keys = [(data['category'], name) for name, data in totals.items()]
+            for data, price in zip(totals.values(), price_index.lookup(keys, as_of)):
+                data['unit_price'] = float(price)
+        
+        # Calculer les prix totaux
+        for data in totals.values():
+            data['total_price'] = data['quantity'] * data['unit_price']
+        return list(totals.values())
+    
+    @staticmethod
+    def format_totals(totals: List[Dict]) -> List[Dict]:
+        """Lignes d'affichage des totaux (tableau, exports, rapport)"""
+        return [{
+            'Produit': data['name'],
+            'Catégorie': data['category'] or 'Non catégorisé',
+            'Quantité': f"{data['quantity']:.2f}",
+            'Unité': data['unit'],
+            'Prix unitaire': f"{data['unit_price']:.2f}$" if data['unit_price'] > 0 else 'N/D',
+            'Prix total': f"{data['total_price']:.2f}$" if data['total_price'] > 0 else 'N/D',
+            'Nb mesures': data['count']
+        } for data in totals]
+    
+    @staticmethod
+    def grand_total(totals: List[Dict]) -> float:
+        """Total général des totaux numériques de product_totals"""
+        return sum(data['total_price'] for data in totals)
     
     def find_snap_point(self, cursor: Tuple[float, float], points: List[Tuple[float, float]], 
                        lines: List[Dict], threshold: float = 10) -> Optional[Tuple[float, float]]:
@@ -0,0 +1,255 @@
+import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import fitz  # PyMuPDF
+
+# En dessous de ce nombre de mesures, le coût de démarrage des processus
+# dépasse le gain : les annotations sont construites dans le processus courant
+PARALLEL_MIN_MEASUREMENTS = 2000
+
+# Épaisseur du trait et opacité par type de mesure
+STYLES = {
+    'distance': {'width': 1.5, 'opacity': 0.9},
+    'angle': {'width': 1.5, 'opacity': 0.9},
+    'area': {'width': 1.0, 'opacity': 0.35},
+    'perimeter': {'width': 1.5, 'opacity': 0.6},
+    'calibration': {'width': 1.5, 'opacity': 0.9}
+}
+
+LABEL_FONT_SIZE = 8
+LABEL_OPACITY = 0.85
+
+# Références résolues au moment de l'écriture dans le document
+_AP_REF = '@AP@'
+_PAGE_REF = '@PAGE@'
+_FONT_REF = '@FONT@'
+
+def _hex_to_rgb(color: Optional[str], default: Tuple[float, float, float] = (0, 0, 0)):
+    """Convertit '#RRGGBB' en couleur PDF (composantes de 0 à 1)"""
+    try:
+        return tuple(int(color[i:i + 2], 16) / 255 for i in (1, 3, 5))
+    except (TypeError, ValueError, IndexError):
+        return default
+
+def _label_text(measurement: Dict) -> str:
+    """Texte de l'étiquette : nom, produit et valeur"""
+    label = measurement.get('label', '')
+    product_name = (measurement.get('product') or {}).get('name', '')
+    text = " - ".join(part for part in (label, product_name) if part)
+    value = measurement.get('value')
+    if value is not None and measurement.get('type') != 'calibration':
+        text = f"{text}\n{value:.2f} {measurement.get('unit', '')}".strip()
+    return text
+
+def _num(value: float) -> str:
+    return f"{value:.2f}".rstrip('0').rstrip('.') or '0'
+
+def _nums(values) -> str:
+    return " ".join(_num(v) for v in values)
+
+def _text_string(text: str) -> str:
+    """Chaîne de texte PDF (UTF-16BE en hexadécimal, accents compris)"""
+    return "<FEFF" + text.encode('utf-16-be').hex().upper() + ">"
+
+def _winansi_string(text: str) -> str:
+    """Chaîne pour la police Helvetica standard (WinAnsiEncoding)"""
+    return "<" + text.encode('cp1252', errors='replace').hex().upper() + ">"
+
+@lru_cache(maxsize=None)
+def _char_width(char: str) -> float:
+    """Largeur d'un caractère Helvetica pour une taille de police de 1"""
+    return fitz.get_text_length(char, fontname='helv', fontsize=1)
+
+def _text_width(text: str, size: float) -> float:
+    return sum(_char_width(char) for char in text) * size
+
+def _transform(matrix: Tuple, x: float, y: float) -> Tuple[float, float]:
+    a, b, c, d, e, f = matrix
+    return (x * a + y * c + e, x * b + y * d + f)
+
+def _bounds(points: List[Tuple[float, float]], margin: float = 0) -> Tuple:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+
+def _annotation(subtype: str, rect: Tuple, entries: str, resources: str, stream: str) -> Tuple[str, str, bytes]:
+    """Sources de l'annotation et de son apparence (formulaire XObject)"""
+    rect_str = _nums(rect)
+    annot = (f"<< /Type /Annot /Subtype /{subtype} /Rect [{rect_str}] /F 4 /P {_PAGE_REF} "
+             f"{entries} /AP << /N {_AP_REF} >> >>")
+    appearance = f"<< /Type /XObject /Subtype /Form /BBox [{rect_str}] /Resources {resources} >>"
+    return annot, appearance, stream.encode('ascii')
+
+def _shape_annotation(m: Dict, points: List[Tuple[float, float]], to_pdf: Tuple) -> Tuple[str, str, bytes]:
+    """Ligne, polyligne ou polygone selon le type de mesure"""
+    m_type = m.get('type')
+    product = m.get('product') or {}
+    color = _nums(_hex_to_rgb(product.get('color') or m.get('color')))
+    style = STYLES.get(m_type, {'width': 1.5, 'opacity': 0.8})
+    width = _num(style['width'])
+    opacity = _num(style['opacity'])
+
+    pdf_points = [_transform(to_pdf, x, y) for x, y in points]
+    closed = m_type in ('area', 'perimeter') and len(points) >= 3
+    filled = m_type == 'area' and len(points) >= 3
+
+    path = f"{_nums(pdf_points[0])} m " + " ".join(f"{_nums(p)} l" for p in pdf_points[1:])
+    paint = "b" if filled else ("s" if closed else "S")
+    stream = f"q /GS0 gs {color} RG {color} rg {width} w {path} {paint} Q"
+    resources = f"<< /ExtGState << /GS0 << /CA {opacity} /ca {opacity} >> >> >>"
+
+    coords = " ".join(_nums(p) for p in pdf_points)
+    if len(pdf_points) == 2:
+        subtype, geometry = 'Line', f"/L [{coords}]"
+    else:
+        subtype, geometry = ('Polygon' if closed else 'PolyLine'), f"/Vertices [{coords}]"
+    entries = (f"{geometry} /C [{color}] /CA {opacity} /BS << /W {width} >> "
+               f"/T {_text_string(product.get('name', ''))} /Contents {_text_string(_label_text(m))}")
+    if filled:
+        entries += f" /IC [{color}]"
+    return _annotation(subtype, _bounds(pdf_points, style['width']), entries, resources, stream)
+
+def _label_annotation(m: Dict, points: List[Tuple[float, float]], to_pdf: Tuple,
+                      rotation: int) -> Optional[Tuple[str, str, bytes]]:
+    """Étiquette texte (FreeText) centrée sur la mesure
+
+    Dessinée dans l'espace affiché puis transformée (cm) vers l'espace PDF :
+    le texte reste droit à l'écran quelle que soit la rotation de la page.
+    """
+    text = _label_text(m)
+    if not text:
+        return None
+    color = _nums(_hex_to_rgb((m.get('product') or {}).get('color') or m.get('color')))
+    size = LABEL_FONT_SIZE
+
+    lines = text.split('\n')
+    widths = [_text_width(line, size) for line in lines]
+    box_w = max(widths) + 4
+    box_h = len(lines) * size * 1.2 + 3
+    cx = sum(p[0] for p in points) / len(points)
+    cy = sum(p[1] for p in points) / len(points)
+    x0, y0 = cx - box_w / 2, cy - box_h / 2
+
+    ops = [f"q {_nums(to_pdf)} cm /GS0 gs 1 1 1 rg {_nums((x0, y0, box_w, box_h))} re f",
+           f"BT /Helv {size} Tf {color} rg"]
+    for i, (line, line_w) in enumerate(zip(lines, widths)):
+        ty = y0 + 1.5 + size * 1.2 * (i + 1) - size * 0.25
+        ops.append(f"1 0 0 -1 {_num(cx - line_w / 2)} {_num(ty)} Tm {_winansi_string(line)} Tj")
+    ops.append("ET Q")
+
+    corners = [_transform(to_pdf, x, y) for x, y in
+               ((x0, y0), (x0 + box_w, y0), (x0, y0 + box_h), (x0 + box_w, y0 + box_h))]
+    resources = (f"<< /Font << /Helv {_FONT_REF} >> "
+                 f"/ExtGState << /GS0 << /CA {LABEL_OPACITY} /ca {LABEL_OPACITY} >> >> >>")
+    entries = (f"/Contents {_text_string(text)} /DA (/Helv {size} Tf {color} rg) "
+               f"/Q 1 /Rotate {rotation} /CA {LABEL_OPACITY}")
+    return _annotation('FreeText', _bounds(corners), entries, resources, " ".join(ops))
+
+def build_page_annotations(measurements: List[Dict], to_pdf: Tuple,
+                           rotation: int = 0) -> List[Tuple[str, str, bytes]]:
+    """Construit les annotations d'une page (sans accès au document)
+
+    to_pdf transforme les points des mesures (points PDF de la page affichée)
+    en coordonnées de l'espace PDF : derotation_matrix de la page suivie de
+    l'inverse de sa transformation_matrix.
+    """
+    annotations = []
+    for m in measurements:
+        points = [tuple(p) for p in m.get('points', [])]
+        if len(points) < 2:
+            continue
+        annotations.append(_shape_annotation(m, points, to_pdf))
+        label = _label_annotation(m, points, to_pdf, rotation)
+        if label:
+            annotations.append(label)
+    return annotations
+
+def _build_pages_worker(pages: List[Tuple[int, List[Dict], Tuple, int]]) -> List[Tuple[int, List]]:
+    """Construit les annotations d'un lot de pages dans un processus séparé"""
+    return [(page, build_page_annotations(items, to_pdf, rotation))
+            for page, items, to_pdf, rotation in pages]
+
+def write_page_annotations(doc, page, annotations: List[Tuple[str, str, bytes]], font_xref: int):
+    """Écrit les annotations d'une page en un lot
+
+    L'API haut niveau (add_*_annot puis update) reparcourt toutes les
+    annotations de la page à chaque ajout ; ici les objets sont créés
+    directement et le tableau /Annots de la page est écrit une seule fois.
+    """
+    if not annotations:
+        return
+    page_ref = f"{page.xref} 0 R"
+    font_ref = f"{font_xref} 0 R"
+    xrefs = [xref for xref, _type, _id in page.annot_xrefs()]
+    for annot, appearance, stream in annotations:
+        ap_xref = doc.get_new_xref()
+        doc.update_object(ap_xref, appearance.replace(_FONT_REF, font_ref))
+        doc.update_stream(ap_xref, stream)
+        xref = doc.get_new_xref()
+        doc.update_object(xref, annot.replace(_PAGE_REF, page_ref).replace(_AP_REF, f"{ap_xref} 0 R"))
+        xrefs.append(xref)
+    doc.xref_set_key(page.xref, "Annots", "[" + " ".join(f"{x} 0 R" for x in xrefs) + "]")
+
+def _split_pages(jobs: List[Tuple], parts: int) -> List[List[Tuple]]:
+    """Répartit les pages en lots de charge équivalente"""
+    batches = [[] for _ in range(parts)]
+    loads = [0] * parts
+    for job in sorted(jobs, key=lambda job: len(job[1]), reverse=True):
+        i = loads.index(min(loads))
+        batches[i].append(job)
+        loads[i] += len(job[1])
+    return [batch for batch in batches if batch]
+
+def export_annotated_pdf(pdf_path: str, measurements: List[Dict], output_path: str,
+                         workers: Optional[int] = None) -> int:
+    """Écrit une copie du PDF avec les mesures en annotations vectorielles
+
+    Les annotations sont construites page par page, en parallèle dans un
+    pool de processus pour les gros projets, puis écrites dans une copie du
+    PDF source : le contenu des pages n'est ni rastérisé ni dupliqué.
+    Retourne le nombre de mesures annotées.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        by_page = {}
+        for m in measurements:
+            page = m.get('page', 0)
+            if 0 <= page < len(doc) and len(m.get('points', [])) >= 2:
+                by_page.setdefault(page, []).append({
+                    'type': m.get('type'),
+                    'points': m['points'],
+                    'label': m.get('label', ''),
+                    'value': m.get('value'),
+                    'unit': m.get('unit', ''),
+                    'color': m.get('color'),
+                    'product': {k: v for k, v in (m.get('product') or {}).items()
+                                if k in ('name', 'color')}
+                })
+
+        jobs = []
+        for page_number, items in by_page.items():
+            page = doc[page_number]
+            to_pdf = tuple(page.derotation_matrix * ~page.transformation_matrix)
+            jobs.append((page_number, items, to_pdf, page.rotation))
+
+        count = sum(len(items) for items in by_page.values())
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        if workers <= 1 or count < PARALLEL_MIN_MEASUREMENTS:
+            results = _build_pages_worker(jobs)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = [result for batch in pool.map(_build_pages_worker, _split_pages(jobs, workers))
+                           for result in batch]
+
+        # Police Helvetica standard partagée par toutes les étiquettes
+        font_xref = doc.get_new_xref()
+        doc.update_object(font_xref, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                     "/Encoding /WinAnsiEncoding >>")
+        for page_number, annotations in sorted(results, key=lambda result: result[0]):
+            write_page_annotations(doc, doc[page_number], annotations, font_xref)
+
+        doc.save(output_path, garbage=1, deflate=True, use_objstms=1)
+        return count
+    finally:
+        doc.close()
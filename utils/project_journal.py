@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from utils.tak_format import is_binary_project, load_snapshot, read_header, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class ProjectJournal:
+    """Journal en ajout seul des modifications d'un projet .tak
+
+    Chaque ajout, modification ou suppression de mesure est écrit comme une
+    ligne JSON dans '<projet>.tak.journal'. L'état est reconstruit en rejouant
+    le journal sur le dernier instantané, et une compaction en arrière-plan
+    réécrit l'instantané puis tronque le journal.
+
+    Plusieurs sessions (ou processus) peuvent écrire le même journal : les
+    écritures se font sous un verrou de fichier ('<projet>.tak.journal.lock')
+    et le numéro de séquence est relu du fichier si un autre écrivain l'a
+    modifié depuis la dernière écriture de cette instance.
+    """
+
+    def __init__(self, snapshot_path: str, compact_every: int = 500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + '.journal'
+        self.lock_path = self.journal_path + '.lock'
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._compaction_thread = None
+        with self._locked():
+            self._seq, self._pending = self._scan_journal()
+            self._signature = self._journal_signature()
+
+    @contextmanager
+    def _locked(self):
+        """Verrou des écritures du journal, entre threads et entre processus"""
+        with self._lock:
+            directory = os.path.dirname(self.lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.lock_path, 'a+b') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _journal_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Identifie l'état du journal sur disque (fichier remplacé ou allongé)"""
+        try:
+            stat = os.stat(self.journal_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _sync_seq(self):
+        """Relit le journal si un autre écrivain l'a modifié (appelé sous le verrou)"""
+        signature = self._journal_signature()
+        if signature != self._signature:
+            seq, self._pending = self._scan_journal()
+            self._seq = max(self._seq, seq) if signature is None else seq
+            self._signature = signature
+
+    def _scan_journal(self):
+        """Retourne le dernier numéro de séquence et le nombre d'entrées du journal"""
+        last_seq = 0
+        count = 0
+        for record in self._read_records():
+            last_seq = max(last_seq, record.get('seq', 0))
+            count += 1
+
+        # Le journal peut être vide juste après une compaction
+        snapshot_seq = self._read_snapshot_seq()
+        return max(last_seq, snapshot_seq), count
+
+    def _read_snapshot_seq(self) -> int:
+        """Lit le numéro de séquence enregistré dans l'instantané"""
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        try:
+            if is_binary_project(self.snapshot_path):
+                return read_header(self.snapshot_path).get('journal_seq', 0)
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('journal_seq', 0)
+        except Exception:
+            return 0
+
+    def _read_records(self) -> List[Dict]:
+        """Lit les entrées du journal en ignorant une dernière ligne incomplète"""
+        records = []
+        if not os.path.exists(self.journal_path):
+            return records
+
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Écriture interrompue : les entrées suivantes sont ignorées
+                    break
+        return records
+
+    def append(self, op: str, measurement_id: Optional[str] = None,
+               data: Optional[Dict] = None):
+        """Ajoute une entrée au journal (coût proportionnel à la modification)"""
+        self.append_many([(op, measurement_id, data)])
+
+    def append_many(self, entries: List[Tuple[str, Optional[str], Optional[Dict]]]):
+        """Ajoute plusieurs entrées au journal avec une seule synchronisation disque"""
+        if not entries:
+            return
+
+        with self._locked():
+            self._sync_seq()
+            timestamp = datetime.now().isoformat()
+            lines = []
+            for op, measurement_id, data in entries:
+                self._seq += 1
+                record = {
+                    'seq': self._seq,
+                    'op': op,
+                    'id': measurement_id,
+                    'data': data,
+                    'ts': timestamp
+                }
+                lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._signature = self._journal_signature()
+            self._pending += len(entries)
+            needs_compaction = self._pending >= self.compact_every
+
+        if needs_compaction:
+            self.compact_in_background()
+
+    @staticmethod
+    def make_entry(op: str, data: Optional[Dict] = None) -> Tuple[str, Optional[str], Optional[Dict]]:
+        """Construit une entrée (op, id, données) pour append_many"""
+        if op == 'delete':
+            return (op, data.get('id'), None)
+        if op in ('add', 'update'):
+            return (op, data.get('id'), data)
+        if op == 'project':
+            return (op, None, data)
+        return (op, None, None)
+
+    def log_add(self, measurement: Dict):
+        """Journalise l'ajout d'une mesure"""
+        self.append('add', measurement.get('id'), measurement)
+
+    def log_update(self, measurement: Dict):
+        """Journalise la modification d'une mesure"""
+        self.append('update', measurement.get('id'), measurement)
+
+    def log_delete(self, measurement_id: str):
+        """Journalise la suppression d'une mesure"""
+        self.append('delete', measurement_id)
+
+    def log_clear(self):
+        """Journalise la suppression de toutes les mesures"""
+        self.append('clear')
+
+    def log_project(self, fields: Dict):
+        """Journalise une modification des champs du projet (calibration, etc.)"""
+        self.append('project', data=fields)
+
+    def replay(self, project_data: Dict, upto_seq: Optional[int] = None) -> Dict:
+        """Applique les entrées du journal postérieures à l'instantané
+
+        Une entrée qui vise une mesure absente de l'instantané est signalée
+        puis ignorée : le reste du journal est rejoué et le projet reste
+        ouvrable.
+        """
+        snapshot_seq = project_data.get('journal_seq', 0)
+        measurements = project_data.setdefault('measurements', [])
+        index = {m.get('id'): i for i, m in enumerate(measurements)}
+
+        for record in self._read_records():
+            if record.get('seq', 0) <= snapshot_seq:
+                continue
+            if upto_seq is not None and record.get('seq', 0) > upto_seq:
+                break
+
+            op = record.get('op')
+            m_id = record.get('id')
+            if op == 'add':
+                index[m_id] = len(measurements)
+                measurements.append(record['data'])
+            elif op in ('update', 'delete'):
+                # Une mesure absente signifie que l'instantané ne correspond pas au journal
+                if m_id not in index:
+                    print(f"Journal incohérent {self.journal_path}: mesure {m_id} introuvable, "
+                          f"entrée ignorée: {json.dumps(record, ensure_ascii=False)}")
+                elif op == 'update':
+                    measurements[index[m_id]] = record['data']
+                else:
+                    measurements[index.pop(m_id)] = None
+            elif op == 'clear':
+                measurements[:] = []
+                index = {}
+            elif op == 'project':
+                project_data.update(record.get('data') or {})
+
+            project_data['journal_seq'] = record.get('seq', 0)
+
+        project_data['measurements'] = [m for m in measurements if m is not None]
+        return project_data
+
+    def compact(self) -> bool:
+        """Réécrit l'instantané à partir du disque puis tronque le journal
+
+        La compaction se fait sous le verrou de fichier : un autre écrivain
+        ne peut ni ajouter d'entrée entre la relecture et la troncature, ni
+        compacter en même temps. Les ajouts attendent la fin de la
+        compaction (ils se font hors du chemin du rerun).
+        """
+        try:
+            with self._locked():
+                self._sync_seq()
+                upto_seq = self._seq
+
+                # Reconstruction depuis le disque : aucun accès à l'état en mémoire
+                project_data = {}
+                binary = True
+                if os.path.exists(self.snapshot_path):
+                    binary = is_binary_project(self.snapshot_path)
+                    project_data = load_snapshot(self.snapshot_path)
+                project_data = self.replay(project_data, upto_seq)
+                project_data['journal_seq'] = upto_seq
+
+                # L'instantané conserve son format (JSON ou binaire)
+                write_snapshot(self.snapshot_path, project_data, binary=binary)
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self._signature = None
+                self._pending = 0
+
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la compaction du journal: {str(e)}")
+            return False
+
+    def compact_in_background(self):
+        """Lance la compaction dans un thread si aucune n'est en cours"""
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self._compaction_thread.start()
+
+    def reset(self, snapshot_seq: int = 0):
+        """Vide le journal après l'écriture complète d'un instantané"""
+        with self._locked():
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._seq = max(self._seq, snapshot_seq)
+            self._signature = None
+            self._pending = 0
+
+    @property
+    def has_pending(self) -> bool:
+        """Indique si des entrées attendent d'être compactées dans l'instantané"""
+        return self._pending > 0
+
+    @property
+    def sequence(self) -> int:
+        """Dernier numéro de séquence attribué (par cette instance ou un autre écrivain)"""
+        with self._locked():
+            self._sync_seq()
+            return self._seq
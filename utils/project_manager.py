@@ -1,29 +1,135 @@
+import argparse
+import io
 import json
 import os
+import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 import streamlit as st
+from utils.project_journal import ProjectJournal
+from utils.tak_format import encode_project, is_binary_project, load_snapshot, read_header, write_snapshot
+from utils.pdf_annotator import export_annotated_pdf
+from utils.report_generator import REPORTLAB_AVAILABLE, build_report
+from utils.export_stream import XLSX_AVAILABLE, write_csv, write_xlsx
+from models.project_context import ProjectContextBuilder
+from utils.recent_projects import get_recent_projects_registry
+from utils.lazy_project import hydrate_all, hydrate_page, make_lazy_state
+from utils.sqlite_project_store import SQLiteProjectBackend, is_sqlite_project
+
+# Espace de coordonnées des mesures : points PDF, indépendants du zoom d'affichage
+COORDINATE_SPACE = 'pdf_points'
+
+# Zoom par défaut du visualiseur, utilisé quand un ancien projet ne l'a pas enregistré
+LEGACY_VIEWER_ZOOM = 1.5
 
 class ProjectManager:
     """Gestionnaire pour sauvegarder et charger les projets"""
     
-    def __init__(self):
-        self.recent_file = "recent.json"
+    def __init__(self, binary_format: bool = True, user: Optional[str] = None):
+        self.binary_format = binary_format
         self.max_recent = 10
+        self.recent_projects = get_recent_projects_registry(user, max_recent=self.max_recent)
+        self.recent_file = self.recent_projects.recent_file
+        self.journals = {}
+        self.backends = {}
+        self.active_journal = None
+        self.project_store = None
+        # Résumé du projet pour le contexte de l'assistant IA
+        self.context_builder = ProjectContextBuilder()
+    
+    def attach_store(self, project_store):
+        """Confie les écritures à un ProjectStore (autosauvegarde en arrière-plan)"""
+        self.project_store = project_store
+    
+    def get_backend(self, filepath: str) -> SQLiteProjectBackend:
+        """Retourne le stockage SQLite d'un projet .takdb"""
+        if filepath not in self.backends:
+            self.backends[filepath] = SQLiteProjectBackend(filepath)
+        return self.backends[filepath]
+    
+    def get_journal(self, filepath: str) -> ProjectJournal:
+        """Retourne le journal associé à un fichier projet"""
+        if filepath not in self.journals:
+            self.journals[filepath] = ProjectJournal(filepath)
+        return self.journals[filepath]
+    
+    def discard_journal(self, filepath: str):
+        """Supprime le journal d'un fichier remplacé par un nouvel instantané"""
+        if is_sqlite_project(filepath):
+            # Une base SQLite n'a pas de journal séparé
+            backend = self.backends.pop(filepath, None)
+            if backend is not None and self.active_journal is backend:
+                self.active_journal = None
+            return
+        journal = self.journals.pop(filepath, None) or ProjectJournal(filepath)
+        journal.reset()
+        if self.active_journal is journal:
+            self.active_journal = None
+    
+    def log_measurement_change(self, op: str, measurement: Optional[Dict] = None):
+        """Journalise une modification de mesure du projet actif (O(modification))"""
+        self.context_builder.apply(op, measurement)
+        if self.project_store:
+            # L'écriture disque se fait dans le thread de l'autosauvegarde
+            self.project_store.record(op, measurement, mirror=self.active_journal)
+            return
+        if not self.active_journal:
+            return
+        try:
+            if op == 'add':
+                self.active_journal.log_add(measurement)
+            elif op == 'update':
+                self.active_journal.log_update(measurement)
+            elif op == 'delete':
+                self.active_journal.log_delete(measurement.get('id'))
+            elif op == 'clear':
+                self.active_journal.log_clear()
+        except Exception as e:
+            st.error(f"Erreur lors de la journalisation: {str(e)}")
+    
+    def log_project_change(self, fields: Dict):
+        """Journalise une modification des champs du projet actif"""
+        if self.project_store:
+            self.project_store.record_project(fields, mirror=self.active_journal)
+        elif self.active_journal:
+            try:
+                self.active_journal.log_project(fields)
+            except Exception as e:
+                st.error(f"Erreur lors de la journalisation: {str(e)}")
     
     def save_project(self, filepath: str, project_data: Dict) -> bool:
-        """Sauvegarde un projet au format .tak"""
+        """Sauvegarde un instantané complet du projet (.tak ou .takdb)
+        
+        Les modifications courantes passent par le journal
+        (log_measurement_change) ; cet instantané complet sert de compaction.
+        """
         try:
+            # Un projet ouvert paresseusement est complété avant l'écriture
+            hydrate_all(project_data)
+            self.ensure_measurement_ids(project_data)
+            
             # Ajouter les métadonnées
+            project_data['coordinate_space'] = COORDINATE_SPACE
             project_data['metadata'] = {
-                'version': '2.0',
+                'version': '3.0',
                 'created': datetime.now().isoformat(),
                 'app': 'TAKEOFF AI Streamlit'
             }
             
-            # Sauvegarder en JSON
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(project_data, f, indent=2, ensure_ascii=False)
+            if is_sqlite_project(filepath):
+                backend = self.get_backend(filepath)
+                backend.write_project(project_data)
+                self.active_journal = backend
+                self.add_recent_project(filepath)
+                return True
+            
+            journal = self.get_journal(filepath)
+            project_data['journal_seq'] = journal.sequence
+            
+            # Sauvegarder (binaire compressé ou JSON, écriture atomique) puis vider le journal
+            write_snapshot(filepath, project_data, binary=self.binary_format)
+            journal.reset(project_data['journal_seq'])
+            self.active_journal = journal
             
             # Ajouter aux projets récents
             self.add_recent_project(filepath)
@@ -33,99 +139,230 @@ class ProjectManager:
             st.error(f"Erreur lors de la sauvegarde: {str(e)}")
             return False
     
-    def load_project(self, filepath: str) -> Optional[Dict]:
-        """Charge un projet depuis un fichier .tak"""
+    def load_project(self, filepath: str, lazy: bool = False) -> Optional[Dict]:
+        """Charge un projet depuis un fichier .tak ou .takdb
+        
+        Avec lazy=True, seuls l'en-tête, la calibration et les agrégats par page
+        sont lus ; les mesures d'une page sont chargées à son affichage
+        (voir utils.lazy_project). Les formats sans accès direct par page
+        (JSON, binaire v1) ou avec un journal non compacté sont chargés en entier.
+        """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                project_data = json.load(f)
+            if lazy:
+                project_data = self._load_lazy(filepath)
+                if project_data is not None:
+                    self.add_recent_project(filepath)
+                    return project_data
             
-            # Vérifier la version
-            metadata = project_data.get('metadata', {})
-            version = metadata.get('version', '1.0')
+            if is_sqlite_project(filepath):
+                backend = self.get_backend(filepath)
+                project_data = backend.read_project()
+                self.active_journal = backend
+            else:
+                project_data = self.load_migrated_snapshot(filepath)
+                
+                # Rejouer les modifications journalisées depuis le dernier instantané
+                journal = self.get_journal(filepath)
+                project_data = journal.replay(project_data)
+                self.active_journal = journal
             
             # Ajouter aux projets récents
             self.add_recent_project(filepath)
             
             return project_data
         except Exception as e:
+            if not os.path.exists(filepath):
+                self.recent_projects.remove(filepath)
             st.error(f"Erreur lors du chargement: {str(e)}")
             return None
     
-    def get_recent_projects(self) -> List[str]:
-        """Retourne la liste des projets récents"""
-        if os.path.exists(self.recent_file):
-            try:
-                with open(self.recent_file, 'r', encoding='utf-8') as f:
-                    recent = json.load(f)
-                    # Filtrer les fichiers qui existent encore
-                    return [p for p in recent if os.path.exists(p)]
-            except:
-                return []
-        return []
+    def _load_lazy(self, filepath: str) -> Optional[Dict]:
+        """Lit l'en-tête d'un projet ; None si le chargement paresseux est impossible"""
+        if is_sqlite_project(filepath):
+            backend = self.get_backend(filepath)
+            project_data = backend.read_header()
+            if project_data.get('coordinate_space') != COORDINATE_SPACE:
+                return None
+            project_data['measurements'] = []
+            project_data['lazy'] = make_lazy_state(
+                filepath, 'sqlite', backend.get_page_counts(), backend.page_aggregates()
+            )
+            self.active_journal = backend
+            return project_data
+        
+        if not is_binary_project(filepath):
+            return None
+        header = read_header(filepath)
+        journal = self.get_journal(filepath)
+        # Fichier écrit avant l'attribution des identifiants à l'encodage :
+        # chargement complet, qui enregistre les identifiants
+        if (header.get('coordinate_space') != COORDINATE_SPACE or not header.get('measurement_ids')
+                or 'page_aggregates' not in header or journal.has_pending):
+            return None
+        
+        page_table = header.pop('pages', [])
+        header.pop('products', None)
+        header.pop('measurement_ids', None)
+        project_data = header
+        project_data['measurements'] = []
+        project_data['lazy'] = make_lazy_state(
+            filepath, 'binary',
+            {entry[0]: entry[1] for entry in page_table},
+            project_data.pop('page_aggregates')
+        )
+        self.active_journal = journal
+        return project_data
     
-    def add_recent_project(self, filepath: str):
-        """Ajoute un projet à la liste des récents"""
-        recent = self.get_recent_projects()
+    def encode_project(self, project_data: Dict) -> bytes:
+        """Encode un projet en .tak pour le téléchargement"""
+        hydrate_all(project_data)
+        if not self.binary_format:
+            project_data = {k: v for k, v in project_data.items() if k != 'lazy'}
+            return json.dumps(project_data, indent=2, ensure_ascii=False).encode('utf-8')
+        buffer = io.BytesIO()
+        encode_project(project_data, buffer)
+        return buffer.getvalue()
+    
+    def convert_to_sqlite(self, tak_path: str, db_path: Optional[str] = None) -> Optional[str]:
+        """Convertit un projet .tak (JSON) en base SQLite .takdb"""
+        try:
+            project_data = self.load_migrated_snapshot(tak_path)
+            project_data = self.get_journal(tak_path).replay(project_data)
+            project_data.pop('journal_seq', None)
+            
+            db_path = db_path or os.path.splitext(tak_path)[0] + '.takdb'
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            self.backends.pop(db_path, None)
+            self.get_backend(db_path).write_project(project_data)
+            return db_path
+        except Exception as e:
+            st.error(f"Erreur lors de la conversion SQLite: {str(e)}")
+            return None
+    
+    def hydrate_page(self, project_data: Dict, page: int) -> int:
+        """Charge les mesures d'une page d'un projet ouvert paresseusement"""
+        try:
+            return hydrate_page(project_data, page)
+        except Exception as e:
+            st.error(f"Erreur lors du chargement de la page: {str(e)}")
+            return 0
+    
+    def load_migrated_snapshot(self, filepath: str) -> Dict:
+        """Lit l'instantané d'un projet .tak, migré et réenregistré si nécessaire
+        
+        Le journal référence les mesures par identifiant et enregistre des
+        coordonnées en points PDF : l'instantané est donc migré et ses
+        identifiants écrits sur disque avant tout rejeu.
+        """
+        # Lecture transparente des formats binaire et JSON
+        project_data = load_snapshot(filepath)
+        measurements = project_data.get('measurements', [])
+        if (project_data.get('coordinate_space') == COORDINATE_SPACE
+                and all(m.get('id') for m in measurements)):
+            return project_data
         
-        # Retirer si déjà présent
-        if filepath in recent:
-            recent.remove(filepath)
+        # Migrer les anciens projets (coordonnées en pixels écran)
+        project_data = self.migrate_to_page_coordinates(project_data)
+        self.ensure_measurement_ids(project_data)
+        write_snapshot(filepath, project_data, binary=is_binary_project(filepath))
+        return project_data
+    
+    def ensure_measurement_ids(self, project_data: Dict):
+        """Attribue un identifiant stable aux mesures qui n'en ont pas"""
+        for m in project_data.get('measurements', []):
+            if not m.get('id'):
+                m['id'] = uuid.uuid4().hex
+    
+    def migrate_to_page_coordinates(self, project_data: Dict) -> Dict:
+        """Convertit un projet en pixels écran vers des coordonnées en points PDF
         
-        # Ajouter en début
-        recent.insert(0, filepath)
+        Les anciens projets stockaient les points en pixels avec le 'zoom_level'
+        du visualiseur. Le zoom d'origine est conservé dans 'source_zoom' pour
+        que la conversion reste réversible.
+        """
+        if project_data.get('coordinate_space') == COORDINATE_SPACE:
+            return project_data
         
-        # Limiter le nombre
-        recent = recent[:self.max_recent]
+        measurements = project_data.get('measurements', [])
+        for m in measurements:
+            zoom = m.pop('zoom_level', None) or LEGACY_VIEWER_ZOOM
+            m['points'] = [(p[0] / zoom, p[1] / zoom) for p in m.get('points', [])]
+            m['source_zoom'] = zoom
         
-        # Sauvegarder
-        try:
-            with open(self.recent_file, 'w', encoding='utf-8') as f:
-                json.dump(recent, f, indent=2)
-        except:
-            pass
+        # La calibration était exprimée par pixel au zoom de la mesure :
+        # on la ramène par point PDF avec le zoom des mesures existantes
+        calibration = project_data.get('calibration')
+        if calibration and 'value' in calibration:
+            cal_zoom = measurements[0]['source_zoom'] if measurements else LEGACY_VIEWER_ZOOM
+            calibration['value'] = calibration['value'] * cal_zoom
+            calibration['source_zoom'] = cal_zoom
+        
+        project_data['coordinate_space'] = COORDINATE_SPACE
+        return project_data
+    
+    def get_recent_projects(self) -> List[str]:
+        """Retourne la liste des projets récents (servie depuis la mémoire)"""
+        return self.recent_projects.list()
+    
+    def add_recent_project(self, filepath: str):
+        """Ajoute un projet à la liste des récents"""
+        self.recent_projects.add(filepath)
     
     def clear_recent_projects(self):
         """Efface la liste des projets récents"""
-        try:
-            if os.path.exists(self.recent_file):
-                os.remove(self.recent_file)
-        except:
-            pass
+        self.recent_projects.clear()
     
-    def export_to_csv(self, measurements: List[Dict], filepath: str) -> bool:
-        """Exporte les mesures au format CSV"""
+    def export_to_csv(self, measurements: List[Dict], filepath: str, compress: bool = False) -> bool:
+        """Exporte les mesures au format CSV (écriture par blocs, gzip optionnel)"""
         try:
-            import csv
-            
-            with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                if measurements:
-                    # En-têtes
-                    fieldnames = ['Type', 'Nom', 'Valeur', 'Unité', 'Page', 
-                                 'Produit', 'Catégorie', 'Prix unitaire', 'Quantité']
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    
-                    # Données
-                    for m in measurements:
-                        product = m.get('product', {})
-                        row = {
-                            'Type': m.get('type', ''),
-                            'Nom': m.get('label', ''),
-                            'Valeur': f"{m.get('value', 0):.2f}",
-                            'Unité': m.get('unit', ''),
-                            'Page': m.get('page', 0) + 1,
-                            'Produit': product.get('name', ''),
-                            'Catégorie': product.get('category', ''),
-                            'Prix unitaire': f"{product.get('price', 0):.2f}",
-                            'Quantité': f"{m.get('value', 0):.2f}"
-                        }
-                        writer.writerow(row)
-            
+            write_csv(measurements, filepath, compress=compress)
             return True
         except Exception as e:
             st.error(f"Erreur lors de l'export CSV: {str(e)}")
             return False
     
+    def export_to_xlsx(self, measurements: List[Dict], filepath: str,
+                       totals: Optional[List[Dict]] = None) -> bool:
+        """Exporte les mesures au format XLSX (une feuille par page et les totaux)"""
+        if not XLSX_AVAILABLE:
+            st.error("Export XLSX indisponible : installez xlsxwriter")
+            return False
+        try:
+            write_xlsx(measurements, filepath, totals)
+            return True
+        except Exception as e:
+            st.error(f"Erreur lors de l'export XLSX: {str(e)}")
+            return False
+    
+    def export_annotated_pdf(self, project_data: Dict, filepath: str) -> bool:
+        """Exporte une copie du PDF avec les mesures en annotations vectorielles"""
+        pdf_path = project_data.get('pdf_path')
+        if not pdf_path or not os.path.exists(pdf_path):
+            st.error("Le PDF d'origine est introuvable")
+            return False
+        try:
+            export_annotated_pdf(pdf_path, project_data.get('measurements', []), filepath)
+            return True
+        except Exception as e:
+            st.error(f"Erreur lors de l'export PDF annoté: {str(e)}")
+            return False
+    
+    def export_pdf_report(self, project_data: Dict, filepath: str, totals: List[Dict]) -> bool:
+        """Exporte le rapport d'estimation PDF (garde, totaux, vignettes annotées)
+        
+        totals : totaux numériques de MeasurementTools.product_totals
+        """
+        if not REPORTLAB_AVAILABLE:
+            st.error("Rapport PDF indisponible : installez reportlab")
+            return False
+        try:
+            build_report(project_data, totals, filepath)
+            return True
+        except Exception as e:
+            st.error(f"Erreur lors de la génération du rapport PDF: {str(e)}")
+            return False
+    
     def export_to_txt(self, project_data: Dict, measurements: List[Dict], 
                      catalog, filepath: str) -> bool:
         """Exporte le projet au format texte"""
@@ -206,4 +443,19 @@ class ProjectManager:
             return True
         except Exception as e:
             st.error(f"Erreur lors de l'export JSON: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+def main(argv: Optional[List[str]] = None):
+    """Conversion en ligne de commande : python -m utils.project_manager plans.tak"""
+    parser = argparse.ArgumentParser(description="Convertit des projets .tak en bases SQLite .takdb")
+    parser.add_argument('projects', nargs='+', help="Projets .tak à convertir")
+    args = parser.parse_args(argv)
+
+    manager = ProjectManager()
+    for tak_path in args.projects:
+        db_path = manager.convert_to_sqlite(tak_path)
+        if db_path:
+            print(f"{tak_path} -> {db_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+import atexit
+import copy
+import hashlib
+import os
+import threading
+import time
+import uuid
+import weakref
+from typing import Dict, List, Optional, Tuple
+from utils.lazy_project import hydrate_all
+from utils.project_journal import ProjectJournal
+from utils.tak_format import load_snapshot, write_snapshot
+
+# Âge au-delà duquel une autosauvegarde abandonnée est supprimée (secondes)
+AUTOSAVE_MAX_AGE = 7 * 24 * 3600
+
+# Signal de vie d'une session : fichier .alive touché au plus toutes les
+# HEARTBEAT_INTERVAL secondes ; la session est active tant qu'il a moins de
+# AUTOSAVE_LIVE_TIMEOUT secondes
+HEARTBEAT_INTERVAL = 60.0
+AUTOSAVE_LIVE_TIMEOUT = 10 * 60.0
+
+def owner_key(owner: str) -> str:
+    """Préfixe de fichier d'un client (jeton haché : pas d'adresse ni de nom en clair)"""
+    return hashlib.sha256(owner.encode('utf-8')).hexdigest()[:16]
+
+def snapshot_copy(project_data: Dict) -> Dict:
+    """Copie du projet pour le thread d'écriture
+
+    Le thread d'écriture ne modifie que la liste des mesures et l'état
+    paresseux ; les mesures et les champs du projet sont copiés en surface,
+    sans deepcopy de tout le projet sur le chemin du rerun.
+    """
+    data = {k: (dict(v) if isinstance(v, dict) else v)
+            for k, v in project_data.items() if k not in ('measurements', 'lazy')}
+    data['measurements'] = [dict(m) for m in project_data.get('measurements', [])]
+    lazy = project_data.get('lazy')
+    if lazy:
+        data['lazy'] = dict(lazy, hydrated=list(lazy['hydrated']))
+    return data
+
+class _AutosaveWriter:
+    """Thread d'écriture unique, partagé par les autosauvegardes de toutes les sessions
+
+    Chaque ProjectStore garde sa file de modifications ; le thread écrit
+    celles dont le délai d'inactivité est écoulé. Seuls les ProjectStore
+    ayant des modifications en attente sont référencés ici : une session
+    fermée ne laisse ni thread ni objet derrière elle.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self._dirty: Dict[int, 'ProjectStore'] = {}
+        self._open = weakref.WeakSet()
+        self._thread = None
+
+    def register(self, store: 'ProjectStore'):
+        with self.cond:
+            self._open.add(store)
+
+    def unregister(self, store: 'ProjectStore'):
+        with self.cond:
+            self._open.discard(store)
+
+    def close_all(self, timeout: float = 5.0):
+        """Écrit les modifications en attente de toutes les sessions (arrêt du serveur)"""
+        with self.cond:
+            stores = list(self._open)
+        for store in stores:
+            store.close(timeout)
+
+    def mark_dirty(self, store: 'ProjectStore'):
+        """Appelé avec self.cond acquis"""
+        self._dirty[id(store)] = store
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+            self._thread.start()
+        self.cond.notify_all()
+
+    def _run(self):
+        """Boucle du thread d'écriture avec regroupement des modifications"""
+        while True:
+            with self.cond:
+                while True:
+                    now = time.monotonic()
+                    due = [store for store in self._dirty.values() if store._deadline() <= now]
+                    if due:
+                        break
+                    deadlines = [store._deadline() for store in self._dirty.values()]
+                    self.cond.wait(min(deadlines) - now if deadlines else None)
+
+                work = []
+                for store in due:
+                    del self._dirty[id(store)]
+                    work.append((store, store._take()))
+
+            for store, batch in work:
+                store._write_safely(batch)
+
+_writer = _AutosaveWriter()
+atexit.register(_writer.close_all)
+
+def is_live(snapshot_path: str) -> bool:
+    """Session d'autosauvegarde active d'après l'âge de son signal de vie"""
+    try:
+        return time.time() - os.path.getmtime(snapshot_path + '.alive') < AUTOSAVE_LIVE_TIMEOUT
+    except OSError:
+        return False
+
+class ProjectStore:
+    """Sauvegarde automatique du projet avec suivi des modifications
+
+    Les modifications sont mises en file sur le chemin du rerun (copie de la
+    seule mesure modifiée) puis écrites par le thread d'écriture partagé
+    après un délai d'inactivité. L'instantané est écrit par renommage
+    atomique et le journal d'autosauvegarde permet de proposer la
+    récupération du projet au client (owner) qui l'a écrit.
+
+    heartbeat(), appelé à chaque rerun, signale que la session est active :
+    son autosauvegarde n'est alors ni supprimée ni retirée après une
+    récupération par un autre onglet.
+    """
+
+    def __init__(self, owner: str, autosave_dir: str = "autosave", debounce: float = 2.0,
+                 max_delay: float = 10.0, max_age: float = AUTOSAVE_MAX_AGE):
+        self.autosave_dir = autosave_dir
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_age = max_age
+        self.owner = owner_key(owner)
+        self.session_id = uuid.uuid4().hex
+        self.snapshot_path = os.path.join(autosave_dir, f"{self.owner}-{self.session_id}.tak")
+        self.heartbeat_path = self.snapshot_path + '.alive'
+        self._heartbeat_at = None
+        self.journal = None
+        self.last_flush = None
+        self.last_error = None
+
+        # État partagé avec le thread d'écriture, protégé par sa condition
+        self._cond = _writer.cond
+        self._pending = []
+        self._first_change = None
+        self._last_change = None
+        self._flushing = False
+        _writer.register(self)
+
+    @property
+    def is_dirty(self) -> bool:
+        """Indique si des modifications n'ont pas encore été écrites"""
+        with self._cond:
+            return bool(self._pending) or self._flushing
+
+    def heartbeat(self):
+        """Signale que la session est active (au plus une écriture par HEARTBEAT_INTERVAL)"""
+        now = time.monotonic()
+        if self._heartbeat_at is not None and now - self._heartbeat_at < HEARTBEAT_INTERVAL:
+            return
+        self._heartbeat_at = now
+        try:
+            os.makedirs(self.autosave_dir, exist_ok=True)
+            with open(self.heartbeat_path, 'a'):
+                pass
+            os.utime(self.heartbeat_path, None)
+        except OSError as e:
+            print(f"Erreur lors du signal de vie de l'autosauvegarde: {str(e)}")
+
+    def start(self, project_data: Dict):
+        """Commence le suivi d'un projet en planifiant un instantané complet"""
+        self._enqueue(('snapshot', snapshot_copy(project_data), None))
+
+    def record(self, op: str, measurement: Optional[Dict] = None,
+               mirror: Optional[ProjectJournal] = None):
+        """Marque une modification de mesure (non bloquant)"""
+        data = copy.deepcopy(measurement) if measurement is not None else None
+        self._enqueue((op, data, mirror))
+
+    def record_project(self, fields: Dict, mirror: Optional[ProjectJournal] = None):
+        """Marque une modification des champs du projet (calibration, etc.)"""
+        self._enqueue(('project', copy.deepcopy(fields), mirror))
+
+    def _enqueue(self, item):
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_change = now
+            self._last_change = now
+            self._pending.append(item)
+            _writer.mark_dirty(self)
+
+    def _deadline(self) -> float:
+        """Attendre une pause dans les modifications, sans dépasser max_delay"""
+        return min(self._last_change + self.debounce, self._first_change + self.max_delay)
+
+    def _take(self) -> List:
+        """Retire le lot en attente (appelé par le thread d'écriture, condition acquise)"""
+        batch = self._pending
+        self._pending = []
+        self._flushing = True
+        return batch
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Attend l'écriture des modifications en attente (fermeture, tests)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # Forcer l'écriture immédiate sans attendre le délai d'inactivité
+            if self._pending:
+                self._first_change = float('-inf')
+                self._cond.notify_all()
+            while self._pending or self._flushing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Écrit les modifications en attente ; la session cesse d'être active"""
+        flushed = self.flush(timeout)
+        _writer.unregister(self)
+        try:
+            os.remove(self.heartbeat_path)
+        except OSError:
+            pass
+        return flushed
+
+    def _write_safely(self, batch: List):
+        try:
+            self._write_batch(batch)
+            self.last_flush = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Erreur lors de la sauvegarde automatique: {str(e)}")
+        finally:
+            with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+
+    def _write_batch(self, batch: List):
+        """Écrit un lot de modifications (exécuté dans le thread d'écriture)"""
+        os.makedirs(self.autosave_dir, exist_ok=True)
+
+        # Entrées regroupées par journal : une seule synchronisation disque chacun
+        entries = {}
+
+        def write_entries():
+            for journal, journal_entries in entries.items():
+                journal.append_many(journal_entries)
+            entries.clear()
+
+        for op, data, mirror in batch:
+            if op == 'snapshot':
+                write_entries()
+                # Un projet ouvert paresseusement est lu en entier ici, hors du rerun
+                hydrate_all(data)
+                data['journal_seq'] = 0
+                data['autosave_session'] = self.session_id
+                write_snapshot(self.snapshot_path, data)
+                if self.journal:
+                    self.journal.reset()
+                self.journal = ProjectJournal(self.snapshot_path)
+                continue
+
+            if self.journal is None:
+                self.journal = ProjectJournal(self.snapshot_path)
+
+            entry = ProjectJournal.make_entry(op, data)
+            for journal in (self.journal, mirror):
+                if journal is not None:
+                    entries.setdefault(journal, []).append(entry)
+
+        write_entries()
+
+    def find_recovery(self) -> Optional[Tuple[str, Dict]]:
+        """Dernière autosauvegarde non vide d'une autre session du même client
+
+        Une session encore active est proposée aussi : après un
+        rafraîchissement, l'ancienne session du même onglet reste en
+        mémoire quelque temps. Retourne (chemin de l'autosauvegarde,
+        projet) ; le projet n'est restauré que si l'utilisateur l'accepte,
+        et l'autosauvegarde est ensuite retirée avec discard().
+        """
+        self._prune()
+        for snapshot_path in self._list_sessions():
+            try:
+                project_data = load_snapshot(snapshot_path)
+                project_data = ProjectJournal(snapshot_path).replay(project_data)
+            except Exception as e:
+                print(f"Autosauvegarde illisible {snapshot_path}: {str(e)}")
+                continue
+            # Chaque session écrit un instantané vide au démarrage : rien à proposer
+            if not project_data.get('measurements'):
+                continue
+            project_data.pop('autosave_session', None)
+            project_data.pop('journal_seq', None)
+            return snapshot_path, project_data
+        return None
+
+    def discard(self, snapshot_path: str):
+        """Supprime une autosauvegarde récupérée ou refusée (sauf session active)"""
+        if snapshot_path == self.snapshot_path or is_live(snapshot_path):
+            return
+        for filepath in (snapshot_path, snapshot_path + '.journal', snapshot_path + '.journal.lock',
+                         snapshot_path + '.alive'):
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _last_modified(path: str) -> float:
+        mtime = os.path.getmtime(path)
+        for related in (path + '.journal', path + '.alive'):
+            if os.path.exists(related):
+                mtime = max(mtime, os.path.getmtime(related))
+        return mtime
+
+    def _list_sessions(self, all_owners: bool = False) -> List[str]:
+        """Liste les instantanés d'autosauvegarde du client, du plus récent au plus ancien"""
+        if not os.path.isdir(self.autosave_dir):
+            return []
+        prefix = '' if all_owners else f"{self.owner}-"
+        paths = []
+        for name in os.listdir(self.autosave_dir):
+            path = os.path.join(self.autosave_dir, name)
+            if name.endswith('.tak') and name.startswith(prefix) and path != self.snapshot_path:
+                paths.append(path)
+
+        def last_modified(path):
+            try:
+                return self._last_modified(path)
+            except OSError:
+                return 0.0
+
+        return sorted(paths, key=last_modified, reverse=True)
+
+    def _prune(self):
+        """Supprime les autosauvegardes abandonnées depuis plus de max_age
+
+        Une session dont le signal de vie est récent n'est jamais supprimée,
+        quel que soit l'âge de son instantané.
+        """
+        limit = time.time() - self.max_age
+        for path in self._list_sessions(all_owners=True):
+            if is_live(path):
+                continue
+            try:
+                if self._last_modified(path) >= limit:
+                    continue
+            except OSError:
+                continue
+            for filepath in (path, path + '.journal', path + '.journal.lock', path + '.alive'):
+                try:
+                    os.remove(filepath)
+                except OSError:
+                    pass
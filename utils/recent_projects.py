@@ -0,0 +1,178 @@
+import getpass
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+class RecentProjects:
+    """Registre en mémoire des projets récents d'un utilisateur
+
+    La liste est lue une fois puis servie depuis la mémoire. Le fichier
+    n'est relu que si sa date de modification change (autre session ou
+    autre processus), et l'existence des projets n'est revérifiée qu'après
+    check_interval secondes : un rerun ne coûte aucun accès disque.
+    """
+
+    def __init__(self, recent_file: str, max_recent: int = 10,
+                 check_interval: float = 30.0, legacy_file: Optional[str] = None):
+        self.recent_file = recent_file
+        self.max_recent = max_recent
+        self.check_interval = check_interval
+        self.legacy_file = legacy_file
+        self._lock = threading.Lock()
+        self._entries = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.recent_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_file(self) -> List[str]:
+        for path in (self.recent_file, self.legacy_file):
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    recent = json.load(f)
+                if isinstance(recent, list):
+                    return [p for p in recent if isinstance(p, str)]
+            except (OSError, ValueError):
+                pass
+        return []
+
+    def _write_file(self, entries: List[str]):
+        """Écrit la liste via un fichier temporaire renommé atomiquement"""
+        directory = os.path.dirname(self.recent_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.recent_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.recent_file)
+            self._mtime = self._file_mtime()
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _refresh(self, force_check: bool = False):
+        """Recharge le fichier s'il a changé et filtre les projets supprimés"""
+        now = time.monotonic()
+        if self._entries is not None and not force_check and now - self._checked_at < self.check_interval:
+            return
+
+        mtime = self._file_mtime()
+        if self._entries is None or mtime != self._mtime:
+            self._entries = self._read_file()
+            self._mtime = mtime
+        self._entries = [p for p in self._entries if os.path.exists(p)]
+        self._checked_at = now
+
+    def list(self) -> List[str]:
+        """Retourne la liste des projets récents"""
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def add(self, filepath: str):
+        """Place un projet en tête de la liste"""
+        with self._lock:
+            self._refresh(force_check=True)
+            entries = [p for p in self._entries if p != filepath]
+            entries.insert(0, filepath)
+            self._entries = entries[:self.max_recent]
+            self._write_file(self._entries)
+
+    def remove(self, filepath: str):
+        """Retire un projet de la liste (fichier introuvable, etc.)"""
+        with self._lock:
+            self._refresh()
+            if filepath in self._entries:
+                self._entries = [p for p in self._entries if p != filepath]
+                self._write_file(self._entries)
+
+    def clear(self):
+        """Efface la liste des projets récents"""
+        with self._lock:
+            # Liste vide plutôt que suppression : l'ancien recent.json n'est pas repris
+            self._entries = []
+            self._checked_at = time.monotonic()
+            self._write_file(self._entries)
+
+# Registres partagés par les sessions du processus, un par utilisateur ; les
+# moins récemment utilisés sont oubliés (leur fichier reste sur disque)
+MAX_REGISTRIES = 256
+_registries: Dict[str, RecentProjects] = OrderedDict()
+_registries_lock = threading.Lock()
+
+# Listes d'un client inactif depuis plus longtemps supprimées (secondes)
+RECENT_MAX_AGE = 90 * 24 * 3600
+PRUNE_INTERVAL = 3600.0
+_pruned_at: Dict[str, float] = {}
+
+def current_user() -> str:
+    """Utilisateur du processus, pour les outils en ligne de commande
+
+    L'application web passe l'identité de chaque client (voir
+    app.get_client_token) : le compte qui exécute le serveur est le même
+    pour toutes les sessions.
+    """
+    user = os.environ.get('TAKEOFF_USER')
+    if not user:
+        try:
+            user = getpass.getuser()
+        except Exception:
+            user = 'default'
+    return user
+
+def prune_recent_files(recent_dir: str = "recent", max_age: float = RECENT_MAX_AGE):
+    """Supprime les listes des clients inactifs depuis plus de max_age secondes"""
+    if not os.path.isdir(recent_dir):
+        return
+    limit = time.time() - max_age
+    for name in os.listdir(recent_dir):
+        path = os.path.join(recent_dir, name)
+        try:
+            if name.endswith('.json') and os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+def get_recent_projects_registry(user: Optional[str] = None, recent_dir: str = "recent",
+                                 max_recent: int = 10) -> RecentProjects:
+    """Retourne le registre des projets récents d'un utilisateur
+
+    Sans user, la liste est celle de l'utilisateur du processus. Une liste
+    pas encore écrite reprend l'ancien fichier global recent.json. Ouvrir
+    le registre marque la liste comme utilisée ; les listes inutilisées
+    depuis RECENT_MAX_AGE sont supprimées (au plus une fois par heure).
+    """
+    user = user or current_user()
+    safe_user = re.sub(r'[^A-Za-z0-9_.-]', '_', user) or 'default'
+    recent_file = os.path.join(recent_dir, f"{safe_user}.json")
+    with _registries_lock:
+        now = time.monotonic()
+        if now - _pruned_at.get(recent_dir, -PRUNE_INTERVAL) >= PRUNE_INTERVAL:
+            _pruned_at[recent_dir] = now
+            prune_recent_files(recent_dir)
+        try:
+            os.utime(recent_file, None)
+        except OSError:
+            pass
+        registry = _registries.get(recent_file)
+        if registry is None:
+            registry = RecentProjects(recent_file, max_recent=max_recent, legacy_file="recent.json")
+            _registries[recent_file] = registry
+            while len(_registries) > MAX_REGISTRIES:
+                _registries.popitem(last=False)
+        else:
+            _registries.move_to_end(recent_file)
+        return registry
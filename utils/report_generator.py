@@ -0,0 +1,223 @@
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw
+from utils.measurement_tools import MeasurementTools
+
+try:
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+# Plus grand côté des vignettes, en pixels
+THUMBNAIL_SIZE = 1600
+THUMBNAIL_QUALITY = 80
+
+# Opacité du remplissage des surfaces sur les vignettes
+AREA_FILL_ALPHA = 70
+
+def _hex_to_rgb(color: Optional[str]) -> Tuple[int, int, int]:
+    try:
+        return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+    except (TypeError, ValueError, IndexError):
+        return (255, 0, 0)
+
+def render_thumbnail(pdf_path: str, page_number: int, measurements: List[Dict],
+                     output_path: str, size: int = THUMBNAIL_SIZE) -> str:
+    """Rend une page annotée en JPEG (exécuté dans un processus du pool)
+
+    Les points des mesures sont en points PDF : ils sont simplement mis à
+    l'échelle du rendu.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc[page_number]
+        zoom = size / max(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    finally:
+        doc.close()
+
+    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    for m in measurements:
+        points = [(p[0] * zoom, p[1] * zoom) for p in m.get('points', [])]
+        if len(points) < 2:
+            continue
+        rgb = _hex_to_rgb((m.get('product') or {}).get('color') or m.get('color'))
+        if m.get('type') == 'area' and len(points) >= 3:
+            draw.polygon(points, fill=rgb + (AREA_FILL_ALPHA,), outline=rgb + (255,))
+        elif m.get('type') == 'perimeter' and len(points) >= 3:
+            draw.line(points + [points[0]], fill=rgb + (255,), width=3)
+        else:
+            draw.line(points, fill=rgb + (255,), width=3)
+
+    image = Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+    image.save(output_path, "JPEG", quality=THUMBNAIL_QUALITY)
+    return output_path
+
+class EstimationReport:
+    """Rapport d'estimation PDF : page de garde, totaux et vignettes annotées
+
+    Les vignettes sont rendues dans un pool de processus avec un nombre
+    limité de rendus en attente ; chacune est placée dans le rapport dès
+    qu'elle est prête puis supprimée, sans garder toutes les images en
+    mémoire.
+    """
+
+    def __init__(self, project_data: Dict, totals: List[Dict], workers: Optional[int] = None):
+        """totals : totaux numériques de MeasurementTools.product_totals"""
+        if not REPORTLAB_AVAILABLE:
+            raise ImportError("Le module reportlab est requis pour le rapport PDF")
+        self.project_data = project_data
+        self.totals = totals
+        self.grand_total = MeasurementTools.grand_total(totals)
+        self.workers = workers or os.cpu_count() or 1
+        self.page_size = landscape(letter)
+        self.margin = 0.5 * inch
+
+    def build(self, output_path: str):
+        """Écrit le rapport complet dans output_path"""
+        pdf = canvas.Canvas(output_path, pagesize=self.page_size)
+        pdf.setTitle(f"Rapport d'estimation - {self.project_data.get('filename') or 'projet'}")
+        self._draw_cover(pdf)
+        self._draw_totals(pdf)
+        self._draw_thumbnails(pdf)
+        pdf.save()
+
+    def _draw_cover(self, pdf):
+        width, height = self.page_size
+        measurements = self.project_data.get('measurements', [])
+        calibration = self.project_data.get('calibration', {})
+
+        pdf.setFont("Helvetica-Bold", 28)
+        pdf.drawCentredString(width / 2, height - 2.2 * inch, "RAPPORT D'ESTIMATION")
+        pdf.setFont("Helvetica", 14)
+        pdf.drawCentredString(width / 2, height - 2.7 * inch, "TAKEOFF AI")
+
+        lines = [
+            f"Fichier PDF : {self.project_data.get('filename') or 'N/D'}",
+            f"Date : {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+            f"Pages : {self.project_data.get('total_pages', 0)}",
+            f"Nombre de mesures : {len(measurements)}",
+            f"Calibration : {calibration.get('value', 1.0):.4f} {calibration.get('unit', 'cm')} par point",
+            f"Total général : {self.grand_total:.2f}$"
+        ]
+        pdf.setFont("Helvetica", 12)
+        y = height - 3.8 * inch
+        for line in lines:
+            pdf.drawString(2.5 * inch, y, line)
+            y -= 0.3 * inch
+        pdf.showPage()
+
+    def _draw_totals(self, pdf):
+        """Totaux par catégorie puis par produit (lignes de MeasurementTools.format_totals)"""
+        width, height = self.page_size
+        columns = [('Produit', 0), ('Quantité', 4.2), ('Unité', 5.4), ('Prix unitaire', 6.4),
+                   ('Prix total', 7.8), ('Nb mesures', 9.0)]
+
+        def header(y):
+            pdf.setFont("Helvetica-Bold", 16)
+            pdf.drawString(self.margin, y, "Totaux par catégorie et par produit")
+            y -= 0.4 * inch
+            pdf.setFont("Helvetica-Bold", 10)
+            for title, x in columns:
+                pdf.drawString(self.margin + x * inch, y, title)
+            return y - 0.25 * inch
+
+        by_category = {}
+        for row in MeasurementTools.format_totals(self.totals):
+            by_category.setdefault(row.get('Catégorie') or 'Non catégorisé', []).append(row)
+
+        y = header(height - self.margin - 0.2 * inch)
+        for category in sorted(by_category):
+            rows = by_category[category]
+            if y < self.margin + 0.6 * inch:
+                pdf.showPage()
+                y = header(height - self.margin - 0.2 * inch)
+            pdf.setFont("Helvetica-Bold", 11)
+            pdf.drawString(self.margin, y, category)
+            y -= 0.22 * inch
+
+            pdf.setFont("Helvetica", 10)
+            for row in rows:
+                if y < self.margin:
+                    pdf.showPage()
+                    y = header(height - self.margin - 0.2 * inch)
+                    pdf.setFont("Helvetica", 10)
+                for title, x in columns:
+                    text = str(row.get(title, ''))
+                    if title == 'Produit':
+                        text = "  " + text[:60]
+                    pdf.drawString(self.margin + x * inch, y, text)
+                y -= 0.2 * inch
+            y -= 0.1 * inch
+
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.drawString(self.margin + 6.4 * inch, max(y, self.margin) - 0.1 * inch,
+                       f"TOTAL GÉNÉRAL : {self.grand_total:.2f}$")
+        pdf.showPage()
+
+    def _draw_thumbnails(self, pdf):
+        """Une page de rapport par page du plan, dans l'ordre des pages"""
+        pdf_path = self.project_data.get('pdf_path')
+        if not pdf_path or not os.path.exists(pdf_path):
+            return
+
+        by_page = {}
+        for m in self.project_data.get('measurements', []):
+            by_page.setdefault(m.get('page', 0), []).append(
+                {'type': m.get('type'), 'points': m.get('points', []), 'color': m.get('color'),
+                 'product': {'color': (m.get('product') or {}).get('color')}}
+            )
+        if not by_page:
+            return
+
+        tmp_dir = tempfile.mkdtemp(prefix="takeoff_report_")
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                # Fenêtre de rendus en attente : mémoire bornée, ordre conservé
+                pending = deque()
+                max_pending = self.workers * 2
+                for page in sorted(by_page):
+                    path = os.path.join(tmp_dir, f"page_{page}.jpg")
+                    pending.append((page, pool.submit(render_thumbnail, pdf_path, page, by_page[page], path)))
+                    if len(pending) >= max_pending:
+                        self._draw_thumbnail_page(pdf, *pending.popleft(), by_page)
+                while pending:
+                    self._draw_thumbnail_page(pdf, *pending.popleft(), by_page)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _draw_thumbnail_page(self, pdf, page: int, future, by_page: Dict[int, List[Dict]]):
+        width, height = self.page_size
+        path = future.result()
+
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(self.margin, height - self.margin - 0.1 * inch,
+                       f"Page {page + 1} - {len(by_page[page])} mesures")
+
+        with Image.open(path) as image:
+            img_w, img_h = image.size
+        box_w = width - 2 * self.margin
+        box_h = height - 2 * self.margin - 0.4 * inch
+        scale = min(box_w / img_w, box_h / img_h)
+        draw_w, draw_h = img_w * scale, img_h * scale
+        pdf.drawImage(path, self.margin + (box_w - draw_w) / 2, self.margin + (box_h - draw_h) / 2,
+                      draw_w, draw_h)
+        pdf.showPage()
+        os.remove(path)
+
+def build_report(project_data: Dict, totals: List[Dict], output_path: str,
+                 workers: Optional[int] = None) -> str:
+    """Génère le rapport d'estimation PDF"""
+    EstimationReport(project_data, totals, workers).build(output_path)
+    return output_path
@@ -0,0 +1,253 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS calibrations (
+    page INTEGER PRIMARY KEY,
+    value REAL NOT NULL,
+    unit TEXT NOT NULL,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    id TEXT PRIMARY KEY,
+    page INTEGER NOT NULL DEFAULT 0,
+    type TEXT,
+    label TEXT,
+    value REAL DEFAULT 0,
+    unit TEXT,
+    product_name TEXT,
+    product_category TEXT,
+    product_price REAL,
+    draw_order INTEGER DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_page ON measurements(page, draw_order);
+CREATE INDEX IF NOT EXISTS idx_measurements_type ON measurements(type);
+CREATE INDEX IF NOT EXISTS idx_measurements_product ON measurements(product_category, product_name);
+"""
+
+# Page réservée à la calibration globale du projet
+GLOBAL_CALIBRATION_PAGE = -1
+
+class SQLiteProjectBackend:
+    """Stockage d'un projet dans une base SQLite (.takdb)
+
+    Les mesures sont indexées par page, type et produit pour permettre
+    l'ouverture paresseuse, les requêtes par page et les totaux en SQL.
+    Expose la même interface d'écriture que ProjectJournal (log_add,
+    append_many, ...) pour recevoir les modifications de l'autosauvegarde.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Ouvre une connexion par opération (utilisable depuis plusieurs threads)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _measurement_row(m: Dict) -> Tuple:
+        product = m.get('product') or {}
+        return (
+            m.get('id'),
+            m.get('page', 0),
+            m.get('type'),
+            m.get('label'),
+            m.get('value', 0),
+            m.get('unit'),
+            product.get('name'),
+            product.get('category'),
+            product.get('price'),
+            m.get('draw_order', 0),
+            json.dumps(m, ensure_ascii=False)
+        )
+
+    def _upsert(self, conn, measurements: List[Dict]):
+        # Mise à jour en place : le rowid (ordre des mesures) est conservé
+        conn.executemany(
+            """INSERT INTO measurements
+               (id, page, type, label, value, unit, product_name, product_category,
+                product_price, draw_order, data)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET
+                   page = excluded.page, type = excluded.type, label = excluded.label,
+                   value = excluded.value, unit = excluded.unit,
+                   product_name = excluded.product_name,
+                   product_category = excluded.product_category,
+                   product_price = excluded.product_price,
+                   draw_order = excluded.draw_order, data = excluded.data""",
+            [self._measurement_row(m) for m in measurements]
+        )
+
+    def _set_fields(self, conn, fields: Dict):
+        fields = dict(fields)
+        calibration = fields.pop('calibration', None)
+        page_calibrations = fields.pop('page_calibrations', None)
+
+        if calibration:
+            self._set_calibration(conn, GLOBAL_CALIBRATION_PAGE, calibration)
+        if page_calibrations:
+            for page, cal in page_calibrations.items():
+                self._set_calibration(conn, int(page), cal)
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in fields.items()]
+        )
+
+    @staticmethod
+    def _set_calibration(conn, page: int, calibration: Dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO calibrations (page, value, unit, data) VALUES (?, ?, ?, ?)",
+            (page, calibration.get('value', 1.0), calibration.get('unit', 'cm'),
+             json.dumps(calibration, ensure_ascii=False))
+        )
+
+    def write_project(self, project_data: Dict):
+        """Écrit le projet complet (remplace le contenu existant)"""
+        fields = {k: v for k, v in project_data.items() if k != 'measurements'}
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM measurements")
+            conn.execute("DELETE FROM calibrations")
+            conn.execute("DELETE FROM metadata")
+            self._set_fields(conn, fields)
+            self._upsert(conn, project_data.get('measurements', []))
+
+    def read_header(self) -> Dict:
+        """Lit le projet sans les mesures (métadonnées et calibrations)"""
+        with self._connect() as conn:
+            project_data = {
+                key: json.loads(value)
+                for key, value in conn.execute("SELECT key, value FROM metadata")
+            }
+            page_calibrations = {}
+            for page, data in conn.execute("SELECT page, data FROM calibrations"):
+                if page == GLOBAL_CALIBRATION_PAGE:
+                    project_data['calibration'] = json.loads(data)
+                else:
+                    page_calibrations[page] = json.loads(data)
+            if page_calibrations:
+                project_data['page_calibrations'] = page_calibrations
+        return project_data
+
+    def read_project(self) -> Dict:
+        """Lit le projet complet"""
+        project_data = self.read_header()
+        with self._connect() as conn:
+            project_data['measurements'] = [
+                json.loads(data) for (data,) in
+                conn.execute("SELECT data FROM measurements ORDER BY rowid")
+            ]
+        return project_data
+
+    def get_page_measurements(self, page: int) -> List[Dict]:
+        """Retourne les mesures d'une page dans l'ordre de dessin"""
+        with self._connect() as conn:
+            return [
+                json.loads(data) for (data,) in conn.execute(
+                    "SELECT data FROM measurements WHERE page = ? ORDER BY draw_order, rowid",
+                    (page,)
+                )
+            ]
+
+    def get_page_counts(self) -> Dict[int, int]:
+        """Nombre de mesures par page"""
+        with self._connect() as conn:
+            return dict(conn.execute(
+                "SELECT page, COUNT(*) FROM measurements GROUP BY page"
+            ))
+
+    def page_aggregates(self) -> Dict[int, Dict]:
+        """Agrégats par page (types et produits), sans lire la géométrie"""
+        aggregates = {}
+        with self._connect() as conn:
+            for page, m_type, count in conn.execute(
+                "SELECT page, type, COUNT(*) FROM measurements GROUP BY page, type"
+            ):
+                page_agg = aggregates.setdefault(page, {'types': {}, 'products': []})
+                page_agg['types'][m_type or ''] = count
+
+            for page, name, category, unit, quantity, count, price in conn.execute(
+                """SELECT page, product_name, product_category, MIN(unit),
+                          SUM(value), COUNT(*), MAX(product_price)
+                   FROM measurements
+                   WHERE product_name IS NOT NULL AND product_name != ''
+                   GROUP BY page, product_category, product_name"""
+            ):
+                page_agg = aggregates.setdefault(page, {'types': {}, 'products': []})
+                page_agg['products'].append({
+                    'name': name,
+                    'category': category,
+                    'unit': unit or '',
+                    'quantity': quantity or 0,
+                    'count': count,
+                    'unit_price': price or 0
+                })
+        return aggregates
+
+    def append_many(self, entries: List[Tuple[str, Optional[str], Optional[Dict]]]):
+        """Applique un lot de modifications dans une seule transaction"""
+        if not entries:
+            return
+
+        with self._lock, self._connect() as conn:
+            for op, measurement_id, data in entries:
+                if op in ('add', 'update'):
+                    self._upsert(conn, [data])
+                elif op == 'delete':
+                    conn.execute("DELETE FROM measurements WHERE id = ?", (measurement_id,))
+                elif op == 'clear':
+                    conn.execute("DELETE FROM measurements")
+                elif op == 'project':
+                    self._set_fields(conn, data or {})
+
+    def log_add(self, measurement: Dict):
+        """Enregistre l'ajout d'une mesure"""
+        self.append_many([('add', measurement.get('id'), measurement)])
+
+    def log_update(self, measurement: Dict):
+        """Enregistre la modification d'une mesure"""
+        self.append_many([('update', measurement.get('id'), measurement)])
+
+    def log_delete(self, measurement_id: str):
+        """Enregistre la suppression d'une mesure"""
+        self.append_many([('delete', measurement_id, None)])
+
+    def log_clear(self):
+        """Enregistre la suppression de toutes les mesures"""
+        self.append_many([('clear', None, None)])
+
+    def log_project(self, fields: Dict):
+        """Enregistre une modification des champs du projet"""
+        self.append_many([('project', None, fields)])
+
+def is_sqlite_project(filepath: str) -> bool:
+    """Indique si un fichier projet est une base SQLite"""
+    if filepath.endswith('.takdb'):
+        return True
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read(16) == b'SQLite format 3\x00'
+    except OSError:
+        return False
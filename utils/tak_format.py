@@ -0,0 +1,269 @@
+import gzip
+import io
+import json
+import os
+import struct
+import sys
+import uuid
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+# En-tête des fichiers .tak binaires : signature + version du format
+# (v2 : en-tête puis un bloc gzip par page avec table d'offsets, accès direct)
+MAGIC = b'TAKB'
+FORMAT_VERSION = 2
+_PREFIX = struct.Struct('<4sH')
+_LENGTH = struct.Struct('<I')
+
+def is_binary_project(filepath: str) -> bool:
+    """Indique si un fichier .tak utilise l'encodage binaire"""
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def _pack_array(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _write_frame(stream, data: bytes):
+    stream.write(_LENGTH.pack(len(data)))
+    stream.write(data)
+
+def _read_frame(stream) -> bytes:
+    raw = stream.read(_LENGTH.size)
+    if len(raw) < _LENGTH.size:
+        raise EOFError("Fichier .tak binaire tronqué")
+    (length,) = _LENGTH.unpack(raw)
+    data = stream.read(length)
+    if len(data) < length:
+        raise EOFError("Fichier .tak binaire tronqué")
+    return data
+
+def _product_key(product: Dict) -> str:
+    """Clé d'identité d'un produit pour le dédoublonnage (valeurs listes ou dicts comprises)"""
+    return json.dumps(product, sort_keys=True, ensure_ascii=False)
+
+def compute_page_aggregates(measurements: List[Dict]) -> Dict:
+    """Agrège les mesures d'une page par type et par produit
+
+    Ces agrégats sont stockés dans l'en-tête pour afficher les totaux
+    sans décoder la géométrie des pages.
+    """
+    types = {}
+    products = {}
+    for m in measurements:
+        m_type = m.get('type', '')
+        types[m_type] = types.get(m_type, 0) + 1
+
+        product = m.get('product') or {}
+        name = product.get('name')
+        if not name:
+            continue
+        key = (product.get('category') or '', name)
+        if key not in products:
+            products[key] = {
+                'name': name,
+                'category': product.get('category', ''),
+                'unit': m.get('unit', ''),
+                'quantity': 0,
+                'count': 0,
+                'unit_price': product.get('price', 0)
+            }
+        products[key]['quantity'] += m.get('value', 0)
+        products[key]['count'] += 1
+
+    return {'types': types, 'products': list(products.values())}
+
+def _encode_page_block(items: List[Tuple[int, Dict]], product_refs: Dict[int, int]) -> bytes:
+    """Encode une page : attributs en JSON compact, coordonnées en colonnes"""
+    attributes = []
+    indexes = array('I')
+    point_counts = array('I')
+    coords = array('d')
+    for index, m in items:
+        indexes.append(index)
+        points = m.get('points', [])
+        point_counts.append(len(points))
+        for p in points:
+            coords.append(p[0])
+            coords.append(p[1])
+        attrs = {k: v for k, v in m.items() if k != 'points'}
+        if index in product_refs:
+            del attrs['product']
+            attrs['product_ref'] = product_refs[index]
+        attributes.append(attrs)
+
+    block = io.BytesIO()
+    _write_frame(block, json.dumps(attributes, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    _write_frame(block, _pack_array(indexes))
+    _write_frame(block, _pack_array(point_counts))
+    _write_frame(block, _pack_array(coords))
+    return block.getvalue()
+
+def encode_project(project_data: Dict, stream, compresslevel: int = 6):
+    """Encode un projet dans un flux binaire
+
+    Structure : signature, en-tête JSON compressé (champs du projet, table
+    des pages avec offsets, agrégats par page, produits dédoublonnés), puis
+    un bloc gzip indépendant par page. Dans chaque bloc, les attributs des
+    mesures sont en JSON compact et les coordonnées en colonnes de flottants
+    64 bits (sans perte). Une page se lit donc sans décoder les autres.
+
+    Les mesures sans identifiant en reçoivent un ici, écrit dans le fichier
+    (et dans project_data) : une page chargée plus tard garde les
+    identifiants référencés par le journal.
+    """
+    measurements = project_data.get('measurements', [])
+    for m in measurements:
+        if not m.get('id'):
+            m['id'] = uuid.uuid4().hex
+
+    # Regrouper par page en conservant la position d'origine de chaque mesure
+    by_page = {}
+    products = []
+    product_index = {}
+    product_refs = {}
+    for index, m in enumerate(measurements):
+        by_page.setdefault(m.get('page', 0), []).append((index, m))
+        product = m.get('product')
+        if product:
+            key = _product_key(product)
+            if key not in product_index:
+                product_index[key] = len(products)
+                products.append(product)
+            product_refs[index] = product_index[key]
+
+    blocks = []
+    page_table = []
+    page_aggregates = {}
+    offset = 0
+    for page in sorted(by_page):
+        items = by_page[page]
+        block = gzip.compress(_encode_page_block(items, product_refs), compresslevel=compresslevel)
+        blocks.append(block)
+        page_table.append([page, len(items), offset, len(block)])
+        page_aggregates[str(page)] = compute_page_aggregates([m for _index, m in items])
+        offset += len(block)
+
+    header = {k: v for k, v in project_data.items() if k not in ('measurements', 'lazy')}
+    header['pages'] = page_table
+    header['products'] = products
+    header['page_aggregates'] = page_aggregates
+    header['measurement_ids'] = True
+
+    stream.write(_PREFIX.pack(MAGIC, FORMAT_VERSION))
+    _write_frame(stream, gzip.compress(
+        json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+        compresslevel=compresslevel
+    ))
+    for block in blocks:
+        stream.write(block)
+
+def _read_header(stream) -> Dict:
+    """Lit la signature et l'en-tête ; le flux est ensuite au début des pages"""
+    prefix = stream.read(_PREFIX.size)
+    magic, version = _PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise ValueError("Ce fichier n'est pas un projet .tak binaire")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Version de format .tak non supportée: {version}")
+    return json.loads(gzip.decompress(_read_frame(stream)).decode('utf-8'))
+
+def _read_page_block(stream, products: List[Dict]) -> List[Tuple[int, Dict]]:
+    attributes = json.loads(_read_frame(stream).decode('utf-8'))
+    indexes = _unpack_array('I', _read_frame(stream))
+    point_counts = _unpack_array('I', _read_frame(stream))
+    coords = _unpack_array('d', _read_frame(stream))
+
+    # Reconstituer tous les couples (x, y) de la page en une seule passe
+    values = iter(coords.tolist())
+    points = list(zip(values, values))
+
+    items = []
+    offset = 0
+    for m, index, count in zip(attributes, indexes, point_counts):
+        m['points'] = points[offset:offset + count]
+        offset += count
+        if 'product_ref' in m:
+            m['product'] = dict(products[m.pop('product_ref')])
+        items.append((index, m))
+    return items
+
+def _iter_blocks(stream, header: Dict) -> Iterator[Tuple[int, List[Tuple[int, Dict]]]]:
+    """Parcourt les blocs de page dans l'ordre du fichier"""
+    products = header.get('products', [])
+    for entry in header.get('pages', []):
+        block = gzip.decompress(stream.read(entry[3]))
+        yield entry[0], _read_page_block(io.BytesIO(block), products)
+
+def read_header(filepath: str) -> Dict:
+    """Lit uniquement l'en-tête (champs du projet, pages et agrégats)"""
+    with open(filepath, 'rb') as f:
+        return _read_header(f)
+
+def read_page(filepath: str, page: int) -> List[Dict]:
+    """Lit les mesures d'une seule page (accès direct par la table d'offsets)"""
+    with open(filepath, 'rb') as f:
+        header = _read_header(f)
+        data_start = f.tell()
+        for entry in header.get('pages', []):
+            if entry[0] == page:
+                f.seek(data_start + entry[2])
+                block = gzip.decompress(f.read(entry[3]))
+                items = _read_page_block(io.BytesIO(block), header.get('products', []))
+                return [m for _index, m in items]
+    return []
+
+def iter_pages(filepath: str) -> Iterator[Tuple[int, List[Dict]]]:
+    """Décode le fichier page par page sans charger tout le projet en mémoire"""
+    with open(filepath, 'rb') as f:
+        header = _read_header(f)
+        for page, items in _iter_blocks(f, header):
+            yield page, [m for _index, m in items]
+
+def decode_project(stream) -> Dict:
+    """Décode un projet binaire complet en conservant l'ordre des mesures"""
+    header = _read_header(stream)
+    total = sum(entry[1] for entry in header.get('pages', []))
+    measurements = [None] * total
+    for _page, items in _iter_blocks(stream, header):
+        for index, m in items:
+            measurements[index] = m
+
+    for key in ('pages', 'products', 'page_aggregates', 'measurement_ids'):
+        header.pop(key, None)
+    header['measurements'] = measurements
+    return header
+
+def load_snapshot(filepath: str) -> Dict:
+    """Charge un instantané .tak, binaire ou JSON (anciens fichiers)"""
+    with open(filepath, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            f.seek(0)
+            return decode_project(f)
+        f.seek(0)
+        return json.loads(f.read().decode('utf-8'))
+
+def write_snapshot(filepath: str, project_data: Dict, binary: bool = True):
+    """Écrit un instantané .tak via un fichier temporaire renommé atomiquement"""
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        if binary:
+            encode_project(project_data, f)
+        else:
+            data = {k: v for k, v in project_data.items() if k != 'lazy'}
+            f.write(json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)